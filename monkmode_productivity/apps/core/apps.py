@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
+
+    def ready(self):
+        # Register cache invalidation receivers
+        from apps.core import signals  # noqa: F401
@@ -0,0 +1,286 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from apps.core.services.gemini_client import GeminiClient
+
+BENCHMARK_PAYLOAD = {
+    'contents': [{'role': 'user', 'parts': [{'text': 'Give me one line of motivation.'}]}],
+    'generationConfig': {'temperature': 0.7, 'maxOutputTokens': 64},
+}
+
+STREAM_CHUNKS = ['Stay ', 'focused ', 'and ', 'keep ', 'going.']
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers POSTs with a canned (or, for streamGenerateContent, streamed) response after a fixed delay"""
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+    # Headers and body go out in separate writes; don't let them wait on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+
+        if ':streamGenerateContent' in self.path:
+            self._stream()
+            return
+
+        time.sleep(self.server.latency)
+        body = json.dumps({
+            'candidates': [{'content': {'role': 'model', 'parts': [{'text': 'Stay focused.'}]}}]
+        }).encode('utf-8')
+
+        with self.server.lock:
+            self.server.in_flight -= 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self):
+        """Server-sent events in chunked encoding, one event per latency period, like ?alt=sse"""
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for word in STREAM_CHUNKS:
+                time.sleep(self.server.latency)
+                event = json.dumps({'candidates': [{'content': {'role': 'model', 'parts': [{'text': word}]}}]})
+                data = f"data: {event}\r\n\r\n".encode('utf-8')
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # The client stopped reading after the first chunk
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency):
+        super().__init__(address, StandInHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.connections = 0
+            self.requests = 0
+            # Streams a previous scenario abandoned may still be winding down
+            self.in_flight = getattr(self, 'in_flight', 0)
+            self.max_in_flight = self.in_flight
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the pooled Gemini client against a local stand-in server "
+        "(or --url), comparing it with one bare requests.post per call "
+        "and timing the first and last chunks of streamed replies. "
+        "With --serve, only run the stand-in server so GEMINI_API_URL can "
+        "point at it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Calls per scenario')
+        parser.add_argument('--threads', type=int, default=32, help='Concurrent callers')
+        parser.add_argument('--latency', type=float, default=50.0, help='Stand-in response delay in ms')
+        parser.add_argument('--concurrency', type=int, default=None, help='Client in-flight limit (default: setting)')
+        parser.add_argument('--rpm', type=int, default=60000, help='Client requests per minute for the run')
+        parser.add_argument('--url', help='Benchmark an already running server instead of the stand-in')
+        parser.add_argument('--serve', action='store_true', help='Only run the stand-in server')
+        parser.add_argument('--port', type=int, default=0, help='Stand-in server port (default: any free port)')
+        parser.add_argument('--json', dest='json_path', help='Also write results as JSON to this path')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['threads'] < 1:
+            raise CommandError('--requests and --threads must be positive')
+
+        server = None
+        url = options['url']
+        if not url:
+            server = StandInServer(('127.0.0.1', options['port']), options['latency'] / 1000.0)
+            url = f"http://127.0.0.1:{server.server_address[1]}/v1beta/models/stand-in:generateContent"
+
+            if options['serve']:
+                self.stdout.write(f"Stand-in Gemini server listening on {url}")
+                try:
+                    server.serve_forever()
+                except KeyboardInterrupt:
+                    pass
+                finally:
+                    server.server_close()
+                return
+
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        concurrency = options['concurrency'] or getattr(
+            settings, 'GEMINI_MAX_CONCURRENCY', GeminiClient.DEFAULT_MAX_CONCURRENCY
+        )
+        try:
+            with override_settings(
+                GEMINI_API_URL=url,
+                GEMINI_MAX_CONCURRENCY=concurrency,
+                GEMINI_REQUESTS_PER_MINUTE=options['rpm']
+            ):
+                GeminiClient.reset()
+                results = self._run_scenarios(url, server, options)
+        finally:
+            GeminiClient.reset()
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+
+        self._report(results, concurrency, options)
+
+    # Scenarios
+
+    def _run_scenarios(self, url, server, options):
+        def bare_post(payload):
+            response = requests.post(url, json=payload, timeout=30)
+            response.raise_for_status()
+            return response.json()
+
+        results = []
+        results.append(self._measure('bare requests.post', server, options, lambda: self._threaded(bare_post, options)))
+        results.append(self._measure(
+            'GeminiClient.generate (pooled)', server, options, lambda: self._threaded(self._generate, options)
+        ))
+        results.append(self._measure(
+            'GeminiClient.generate_many (async)', server, options, lambda: self._gathered(options)
+        ))
+        results.append(self._measure(
+            'GeminiClient.stream (first chunk)', server, options, lambda: self._threaded(self._first_chunk, options)
+        ))
+        results.append(self._measure(
+            'GeminiClient.stream (full reply)', server, options, lambda: self._threaded(self._full_stream, options)
+        ))
+        return results
+
+    @staticmethod
+    def _generate(payload):
+        # Measure throughput the way batch callers see it, waiting for slots
+        return GeminiClient.generate(payload, GeminiClient.BACKGROUND_ACQUIRE_TIMEOUT)
+
+    @staticmethod
+    def _first_chunk(payload):
+        with GeminiClient.stream(payload) as chunks:
+            return next(chunks)
+
+    @staticmethod
+    def _full_stream(payload):
+        with GeminiClient.stream(payload) as chunks:
+            return ''.join(chunks)
+
+    def _threaded(self, call, options):
+        def timed(_):
+            started = time.perf_counter()
+            try:
+                call(BENCHMARK_PAYLOAD)
+                return time.perf_counter() - started, None
+            except Exception as e:
+                return time.perf_counter() - started, str(e)
+
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            return list(executor.map(timed, range(options['requests'])))
+
+    def _gathered(self, options):
+        # All calls start together; per-call latency isn't observable, so report the batch time
+        started = time.perf_counter()
+        outcomes = async_to_sync(GeminiClient.generate_many)([BENCHMARK_PAYLOAD] * options['requests'])
+        elapsed = time.perf_counter() - started
+        return [
+            (elapsed, str(outcome) if isinstance(outcome, Exception) else None)
+            for outcome in outcomes
+        ]
+
+    def _measure(self, name, server, options, run):
+        if server is not None:
+            server.reset_stats()
+
+        started = time.perf_counter()
+        samples = run()
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, error in samples if error is None)
+        errors = [error for _, error in samples if error is not None]
+        if errors:
+            self.stderr.write(f"{name}: {len(errors)} errors, e.g. {errors[0]}")
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000, 2)
+
+        return {
+            'scenario': name,
+            'requests': options['requests'],
+            'errors': len(errors),
+            'wall_time_s': round(elapsed, 4),
+            'requests_per_s': round(options['requests'] / elapsed, 2),
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+            'connections_opened': server.connections if server is not None else None,
+            'max_in_flight': server.max_in_flight if server is not None else None,
+        }
+
+    # Reporting
+
+    def _report(self, results, concurrency, options):
+        header = (
+            f"{'scenario':<38}{'errors':>8}{'wall s':>9}{'req/s':>9}"
+            f"{'p50 ms':>9}{'p95 ms':>9}{'conns':>7}{'max in flight':>15}"
+        )
+        self.stdout.write('')
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in results:
+            self.stdout.write(
+                f"{row['scenario']:<38}{row['errors']:>8}{row['wall_time_s']:>9.3f}{row['requests_per_s']:>9.1f}"
+                f"{self._cell(row['p50_ms'], 9)}{self._cell(row['p95_ms'], 9)}"
+                f"{self._cell(row['connections_opened'], 7)}{self._cell(row['max_in_flight'], 15)}"
+            )
+
+        if options['json_path']:
+            payload = {
+                'parameters': {
+                    key: options[key] for key in ('requests', 'threads', 'latency', 'rpm', 'url')
+                },
+                'client_concurrency': concurrency,
+                'ran_at': timezone.now().isoformat(),
+                'results': results,
+            }
+            with open(options['json_path'], 'w') as f:
+                json.dump(payload, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['json_path']}"))
+
+    @staticmethod
+    def _cell(value, width):
+        return f"{'-' if value is None else value:>{width}}"
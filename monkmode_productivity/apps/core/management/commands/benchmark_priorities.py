@@ -0,0 +1,313 @@
+import json
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta, time as dt_time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.core.models import (
+    ActivityType, EnergyLog, MonkModeGoal, MonkModeObjective, MonkModePeriod,
+    ScheduledActivity, UserProductivityPattern
+)
+from apps.core.services.dependency_graph import DependencyGraphService
+from apps.core.services.energy_profile import EnergyProfileService
+from apps.core.services.priority_engine import PriorityEngine
+from apps.core.tasks import calculate_daily_priorities_for_active_users
+
+# (activity type, start hour, duration minutes, energy required) for each synthetic day
+DAY_TEMPLATE = [
+    ('Sleep', 0, 420, 1),
+    ('Mindfulness', 7, 15, 3),
+    ('Exercise', 7, 60, 7),
+    ('Deep Work', 9, 180, 8),
+    ('Cooking', 12, 30, 3),
+    ('Deep Work', 13, 180, 8),
+    ('Learning', 16, 60, 6),
+    ('Planning', 17, 30, 5),
+    ('Partner Time', 18, 120, 3),
+    ('Reflection', 20, 15, 2),
+]
+
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class QueryRecorder:
+    """Counts queries and rows written through an execute wrapper"""
+
+    def __init__(self):
+        self.queries = 0
+        self.rows_written = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        self.queries += 1
+        if sql.lstrip().upper().startswith(WRITE_PREFIXES):
+            rowcount = context['cursor'].rowcount
+            if rowcount and rowcount > 0:
+                self.rows_written += rowcount
+        return result
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the priority engine against a synthetic user population. "
+        "Data is seeded inside a transaction that is rolled back afterwards "
+        "unless --keep is given. Fixed seeds keep runs comparable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Synthetic users to seed')
+        parser.add_argument('--days', type=int, default=90, help='Days of schedule and energy history per user')
+        parser.add_argument('--sample', type=int, default=100, help='Users timed individually per scenario')
+        parser.add_argument('--shard-size', type=int, default=500, help='Shard size for the sweep scenario')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the synthetic data')
+        parser.add_argument('--json', dest='json_path', help='Also write results as JSON to this path')
+        parser.add_argument('--keep', action='store_true', help='Commit the synthetic data instead of rolling back')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['days'] < 1:
+            raise CommandError('--users and --days must be positive')
+
+        self.user_ids = []
+        self.goal_ids = []
+        try:
+            with transaction.atomic():
+                self._seed(options)
+                results = self._run_scenarios(options)
+                if not options['keep']:
+                    transaction.set_rollback(True)
+        finally:
+            # Cached profiles and graphs would otherwise outlive rolled-back rows
+            if not options['keep']:
+                self._invalidate_caches()
+
+        self._report(results, options)
+
+    # Seeding
+
+    def _seed(self, options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        today = now.date()
+        days = options['days']
+        tag = now.strftime('%Y%m%d%H%M%S')
+
+        self.stdout.write(f"Seeding {options['users']} users x {days} days...")
+        started = time.perf_counter()
+
+        activity_types = {}
+        for name in {name for name, _, _, _ in DAY_TEMPLATE}:
+            activity_types[name], _ = ActivityType.objects.get_or_create(name=name)
+
+        users = User.objects.bulk_create([
+            User(username=f'bench_{tag}_{index}') for index in range(options['users'])
+        ])
+        if users[0].pk is None:
+            users = list(User.objects.filter(username__startswith=f'bench_{tag}_').order_by('id'))
+
+        period_start = today - timedelta(days=days - 1)
+        period_end = today + timedelta(days=7)
+
+        goals = MonkModeGoal.objects.bulk_create([
+            MonkModeGoal(
+                user=user,
+                title='Benchmark goal',
+                description='Synthetic benchmark goal',
+                start_date=period_start,
+                end_date=period_end,
+                target_outcome='Benchmark',
+                current_status='active'
+            )
+            for user in users
+        ])
+        if goals[0].pk is None:
+            goals = list(MonkModeGoal.objects.filter(user__in=users).order_by('user_id'))
+
+        objectives = MonkModeObjective.objects.bulk_create([
+            MonkModeObjective(
+                goal=goal,
+                description=f'Objective {step}',
+                due_date=today + timedelta(days=rng.randint(1, 30)),
+                is_completed=rng.random() < 0.3
+            )
+            for goal in goals
+            for step in range(4)
+        ], batch_size=5000)
+        if objectives[0].pk is None:
+            objectives = list(MonkModeObjective.objects.filter(goal__in=goals).order_by('goal_id', 'id'))
+
+        # Each goal's objectives form a chain: objective n depends on n - 1
+        Dependency = MonkModeObjective.dependencies.through
+        Dependency.objects.bulk_create([
+            Dependency(from_monkmodeobjective_id=later.id, to_monkmodeobjective_id=earlier.id)
+            for earlier, later in zip(objectives, objectives[1:])
+            if earlier.goal_id == later.goal_id
+        ], batch_size=5000)
+
+        periods = MonkModePeriod.objects.bulk_create([
+            MonkModePeriod(
+                goal=goal,
+                period_name='Benchmark period',
+                start_date=period_start,
+                end_date=period_end,
+                is_active=True
+            )
+            for goal in goals
+        ])
+        if periods[0].pk is None:
+            periods = list(MonkModePeriod.objects.filter(goal__in=goals).order_by('goal_id'))
+
+        activity_batch = []
+        for period in periods:
+            for day in range(1, days + 8):
+                day_date = period_start + timedelta(days=day - 1)
+                for name, start_hour, duration, energy in DAY_TEMPLATE:
+                    is_completed = day_date < today and rng.random() < 0.7
+                    end_minutes = start_hour * 60 + duration
+                    completed_at = None
+                    if is_completed:
+                        completed_at = timezone.make_aware(
+                            timezone.datetime.combine(day_date, dt_time(min(23, end_minutes // 60)))
+                        )
+                    activity_batch.append(ScheduledActivity(
+                        monk_mode_period=period,
+                        activity_type=activity_types[name],
+                        day_of_period=day,
+                        start_time=dt_time(start_hour),
+                        end_time=dt_time(min(23, end_minutes // 60), end_minutes % 60 if end_minutes < 1440 else 59),
+                        duration_minutes=duration,
+                        description=f'{name} block',
+                        energy_required=energy,
+                        is_completed=is_completed,
+                        completed_at=completed_at,
+                        completion_quality=rng.randint(1, 5) if is_completed else None
+                    ))
+                if len(activity_batch) >= 10000:
+                    ScheduledActivity.objects.bulk_create(activity_batch)
+                    activity_batch = []
+        ScheduledActivity.objects.bulk_create(activity_batch)
+
+        energy_batch = []
+        for user in users:
+            for day in range(days):
+                for hour in (8, 13, 19):
+                    timestamp = now.replace(hour=hour, minute=0, second=0, microsecond=0) - timedelta(days=day)
+                    if timestamp > now:  # Later today hasn't happened yet
+                        continue
+                    energy_batch.append(EnergyLog(
+                        user=user,
+                        timestamp=timestamp,
+                        energy_level=rng.randint(1, 10),
+                        context_factors={'stress_level': rng.randint(1, 5)}
+                    ))
+            if len(energy_batch) >= 10000:
+                EnergyLog.objects.bulk_create(energy_batch)
+                energy_batch = []
+        EnergyLog.objects.bulk_create(energy_batch)
+
+        UserProductivityPattern.objects.bulk_create([
+            UserProductivityPattern(
+                user=user,
+                hour_of_day=start_hour,
+                activity_type=activity_types[name],
+                average_performance=rng.random(),
+                energy_level=rng.uniform(3, 9),
+                completion_rate=1.0,
+                sample_size=rng.randint(1, 30)
+            )
+            for user in users
+            for name, start_hour, _, _ in DAY_TEMPLATE[3:7]
+        ], batch_size=5000, ignore_conflicts=True)
+
+        for user in users:
+            PriorityEngine.rebuild_completion_stats(user)
+
+        self.user_ids = [user.id for user in users]
+        self.goal_ids = [goal.id for goal in goals]
+        self.stdout.write(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+    # Scenarios
+
+    @contextmanager
+    def _measure(self, name, user_count, results):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            yield
+        elapsed = time.perf_counter() - started
+        results.append({
+            'scenario': name,
+            'users': user_count,
+            'wall_time_s': round(elapsed, 4),
+            'ms_per_user': round(elapsed * 1000 / user_count, 3),
+            'queries': recorder.queries,
+            'queries_per_user': round(recorder.queries / user_count, 2),
+            'rows_written': recorder.rows_written,
+            'rows_written_per_user': round(recorder.rows_written / user_count, 2),
+        })
+
+    def _invalidate_caches(self):
+        for user_id in self.user_ids:
+            EnergyProfileService.invalidate(User(id=user_id))
+        for goal_id in self.goal_ids:
+            DependencyGraphService.invalidate(goal_id)
+
+    def _run_scenarios(self, options):
+        user_ids = self.user_ids
+        rng = random.Random(options['seed'])
+        sample_ids = sorted(rng.sample(user_ids, min(options['sample'], len(user_ids))))
+        sample_users = list(User.objects.filter(id__in=sample_ids).order_by('id'))
+        today = timezone.now().date()
+        shard_size = options['shard_size']
+        results = []
+
+        self._invalidate_caches()
+        with self._measure('calculate_daily_priorities (cold cache)', len(sample_users), results):
+            for user in sample_users:
+                PriorityEngine.calculate_daily_priorities(user, today)
+
+        with self._measure('calculate_daily_priorities (warm cache)', len(sample_users), results):
+            for user in sample_users:
+                PriorityEngine.calculate_daily_priorities(user, today)
+
+        with self._measure('get_focus_recommendations', len(sample_users), results):
+            for user in sample_users:
+                PriorityEngine.get_focus_recommendations(user, today)
+
+        # The beat task itself, so the sweep covers the horizon it actually scores
+        active_users = User.objects.filter(monk_mode_goals__current_status='active').distinct().count()
+        self._invalidate_caches()
+        with self._measure(f'sweep task (shards of {shard_size})', active_users, results):
+            calculate_daily_priorities_for_active_users(shard_size=shard_size)
+
+        return results
+
+    # Reporting
+
+    def _report(self, results, options):
+        header = f"{'scenario':<45}{'users':>8}{'wall s':>10}{'ms/user':>10}{'q/user':>9}{'rows/user':>11}"
+        self.stdout.write('')
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in results:
+            self.stdout.write(
+                f"{row['scenario']:<45}{row['users']:>8}{row['wall_time_s']:>10.3f}"
+                f"{row['ms_per_user']:>10.2f}{row['queries_per_user']:>9.2f}{row['rows_written_per_user']:>11.2f}"
+            )
+
+        if options['json_path']:
+            payload = {
+                'parameters': {
+                    key: options[key] for key in ('users', 'days', 'sample', 'shard_size', 'seed')
+                },
+                'database': connection.vendor,
+                'ran_at': timezone.now().isoformat(),
+                'results': results,
+            }
+            with open(options['json_path'], 'w') as f:
+                json.dump(payload, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['json_path']}"))
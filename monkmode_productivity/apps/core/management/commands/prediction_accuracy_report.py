@@ -0,0 +1,61 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.core.services.prediction_accuracy import PredictionAccuracyService
+
+
+class Command(BaseCommand):
+    help = (
+        "Report energy prediction accuracy (MAE by hour, confidence calibration) "
+        "for all users or one user, optionally backfilling actuals first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username to report on (default: all users)')
+        parser.add_argument('--days', type=int, default=30, help='Only predictions from the last N days')
+        parser.add_argument('--backfill', action='store_true', help='Match unscored predictions to readings first')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {options['user']}")
+
+        since = timezone.now() - timedelta(days=options['days'])
+
+        if options['backfill']:
+            updated = PredictionAccuracyService.backfill(
+                since=since, user_ids=[user.id] if user else None
+            )
+            self.stdout.write(f"Backfilled {updated} predictions")
+
+        report = PredictionAccuracyService.get_accuracy_report(user=user, since=since)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        scope = user.username if user else 'all users'
+        self.stdout.write(f"Energy prediction accuracy for {scope}, last {options['days']} days")
+        self.stdout.write(
+            f"  scored: {report['scored_predictions']}  MAE: {report['mae']}  "
+            f"bias: {report['bias']}  mean accuracy: {report['mean_accuracy']}"
+        )
+
+        self.stdout.write('\nMAE by hour')
+        for row in report['mae_by_hour']:
+            self.stdout.write(f"  {row['hour']:02d}:00  {row['mae']:>6.3f}  (n={row['count']})")
+
+        self.stdout.write('\nConfidence calibration')
+        for row in report['calibration']:
+            self.stdout.write(
+                f"  {row['confidence_bucket']:.1f}-{row['confidence_bucket'] + 0.1:.1f}  "
+                f"confidence {row['mean_confidence']:.3f}  accuracy {row['mean_accuracy']:.3f}  (n={row['count']})"
+            )
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-17 14:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_completion_stats(apps, schema_editor):
+    ScheduledActivity = apps.get_model('core', 'ScheduledActivity')
+    ActivityCompletionStats = apps.get_model('core', 'ActivityCompletionStats')
+
+    rows = ScheduledActivity.objects.order_by().values(
+        'monk_mode_period__goal__user_id', 'activity_type_id'
+    ).annotate(
+        scheduled=Count('id'),
+        completed=Count('id', filter=Q(is_completed=True)),
+    )
+    ActivityCompletionStats.objects.bulk_create(
+        [
+            ActivityCompletionStats(
+                user_id=row['monk_mode_period__goal__user_id'],
+                activity_type_id=row['activity_type_id'],
+                scheduled_count=row['scheduled'],
+                completed_count=row['completed'],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_stalepriorityday'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityCompletionStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scheduled_count', models.IntegerField(default=0)),
+                ('completed_count', models.IntegerField(default=0)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('activity_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.activitytype')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_completion_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'activity_type')},
+            },
+        ),
+        migrations.RunPython(backfill_completion_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-17 14:56
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def drop_duplicate_predictions(apps, schema_editor):
+    EnergyPrediction = apps.get_model('core', 'EnergyPrediction')
+
+    # Keep the most recent row for each (user, predicted_for)
+    latest_ids = EnergyPrediction.objects.order_by().values(
+        'user_id', 'predicted_for'
+    ).annotate(latest_id=Max('id')).values('latest_id')
+    EnergyPrediction.objects.exclude(id__in=latest_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_productivitypatternwatermark'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='energyprediction',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(drop_duplicate_predictions, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='energyprediction',
+            unique_together={('user', 'predicted_for')},
+        ),
+    ]
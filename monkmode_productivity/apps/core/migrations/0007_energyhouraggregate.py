@@ -0,0 +1,63 @@
+# Generated by Django 5.2.4 on 2026-10-17 14:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+import math
+
+# Ten-day half-life, matching EnergyAggregateService at the time of writing
+DECAY_PER_SECOND = math.log(2) / (10.0 * 24 * 60 * 60)
+
+
+def backfill_energy_aggregates(apps, schema_editor):
+    EnergyLog = apps.get_model('core', 'EnergyLog')
+    EnergyHourAggregate = apps.get_model('core', 'EnergyHourAggregate')
+
+    aggregates = []
+    current = None
+    for user_id, timestamp, energy_level in EnergyLog.objects.order_by(
+        'user_id', 'timestamp'
+    ).values_list('user_id', 'timestamp', 'energy_level').iterator():
+        if current is None or current.user_id != user_id:
+            current = EnergyHourAggregate(
+                user_id=user_id,
+                weighted_sums=[0.0] * 24,
+                weights=[0.0] * 24,
+                decayed_to=timestamp,
+            )
+            aggregates.append(current)
+
+        factor = math.exp(-DECAY_PER_SECOND * (timestamp - current.decayed_to).total_seconds())
+        current.weighted_sums = [value * factor for value in current.weighted_sums]
+        current.weights = [value * factor for value in current.weights]
+        current.decayed_to = timestamp
+
+        hour = timezone.localtime(timestamp).hour
+        current.weighted_sums[hour] += float(energy_level)
+        current.weights[hour] += 1.0
+
+    EnergyHourAggregate.objects.bulk_create(aggregates, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_energyprediction_unique_hour'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnergyHourAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weighted_sums', models.JSONField(default=list)),
+                ('weights', models.JSONField(default=list)),
+                ('decayed_to', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='energy_hour_aggregate', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(backfill_energy_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-17 14:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_context_factors(apps, schema_editor):
+    EnergyLog = apps.get_model('core', 'EnergyLog')
+    EnergyContextFactor = apps.get_model('core', 'EnergyContextFactor')
+
+    batch = []
+    for log_id, user_id, timestamp, energy_level, context_factors in EnergyLog.objects.order_by().values_list(
+        'id', 'user_id', 'timestamp', 'energy_level', 'context_factors'
+    ).iterator():
+        for factor, value in (context_factors or {}).items():
+            if value is not None:
+                batch.append(EnergyContextFactor(
+                    energy_log_id=log_id,
+                    user_id=user_id,
+                    timestamp=timestamp,
+                    energy_level=energy_level,
+                    factor=str(factor)[:100],
+                    value=str(value)[:255],
+                ))
+        if len(batch) >= 1000:
+            EnergyContextFactor.objects.bulk_create(batch)
+            batch = []
+    EnergyContextFactor.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_energyhouraggregate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnergyContextFactor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('energy_level', models.IntegerField()),
+                ('factor', models.CharField(max_length=100)),
+                ('value', models.CharField(max_length=255)),
+                ('energy_log', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='factors', to='core.energylog')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='energy_context_factors', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'factor', 'value', 'timestamp'], name='core_energy_user_id_b1e68b_idx'), models.Index(fields=['user', 'timestamp', 'energy_level'], name='core_energy_user_id_187488_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_context_factors, migrations.RunPython.noop),
+    ]
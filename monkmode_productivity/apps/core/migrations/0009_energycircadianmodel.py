@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-17 15:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_energycontextfactor'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnergyCircadianModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('coefficients', models.JSONField(default=list)),
+                ('r_squared', models.FloatField(default=0.0)),
+                ('sample_count', models.IntegerField(default=0)),
+                ('fitted_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='energy_circadian_model', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-17 15:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_energycircadianmodel'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnergyLogRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=10)),
+                ('period_start', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('min_level', models.IntegerField()),
+                ('max_level', models.IntegerField()),
+                ('factor_counts', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='energy_log_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'period_start'], name='core_energy_user_id_4482e2_idx')],
+                'unique_together': {('user', 'granularity', 'period_start')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 15:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_energylogrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productivitypatternwatermark',
+            name='overlap_activity_ids',
+            field=models.JSONField(default=list),
+        ),
+    ]
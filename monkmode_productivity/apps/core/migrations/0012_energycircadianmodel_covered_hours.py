@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 15:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_productivitypatternwatermark_overlap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='energycircadianmodel',
+            name='covered_hours',
+            field=models.JSONField(default=list),
+        ),
+    ]
@@ -173,7 +173,7 @@ class AIPromptHistory(models.Model):
     
     # V2 Enhancements
     session_id = models.CharField(max_length=100, null=True, blank=True)
-    message_type = models.CharField(max_length=50, default='chat')  # chat, plan_generation, priority_request
+    message_type = models.CharField(max_length=50, default='chat')  # chat, plan_generation, priority_request, motivation, weekly_review
     
     class Meta:
         ordering = ['timestamp']
@@ -309,6 +309,17 @@ class TaskPriorityScore(models.Model):
     def __str__(self):
         return f"Priority: {self.final_score:.2f} - {self.scheduled_activity}"
 
+class StalePriorityDay(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stale_priority_days')
+    target_date = models.DateField()
+    marked_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['user', 'target_date']
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.target_date} (stale since {self.marked_at})"
+
 class UserProductivityPattern(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='productivity_patterns')
     hour_of_day = models.IntegerField(validators=[MinValueValidator(0), MaxValueValidator(23)])
@@ -325,6 +336,34 @@ class UserProductivityPattern(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.hour_of_day}:00 - {self.activity_type.name}"
 
+class ActivityCompletionStats(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity_completion_stats')
+    activity_type = models.ForeignKey(ActivityType, on_delete=models.CASCADE)
+    scheduled_count = models.IntegerField(default=0)
+    completed_count = models.IntegerField(default=0)
+    last_updated = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['user', 'activity_type']
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.activity_type.name} - {self.completed_count}/{self.scheduled_count}"
+    
+    @property
+    def completion_rate(self):
+        if self.scheduled_count == 0:
+            return None
+        return self.completed_count / self.scheduled_count
+
+class ProductivityPatternWatermark(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='productivity_pattern_watermark')
+    processed_through = models.DateTimeField(null=True, blank=True)  # completed_at of the last folded activity
+    overlap_activity_ids = models.JSONField(default=list)  # Folded activities completed in the overlap window before processed_through
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user.username} - patterns through {self.processed_through}"
+
 class EnergyLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='energy_logs')
     timestamp = models.DateTimeField()
@@ -339,6 +378,73 @@ class EnergyLog(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.timestamp} - Energy: {self.energy_level}"
 
+class EnergyContextFactor(models.Model):
+    """One row per context factor of an EnergyLog, so factors can be counted in SQL"""
+    energy_log = models.ForeignKey(EnergyLog, on_delete=models.CASCADE, related_name='factors')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='energy_context_factors')
+    timestamp = models.DateTimeField()  # Copied from the log
+    energy_level = models.IntegerField()  # Copied from the log
+    factor = models.CharField(max_length=100)
+    value = models.CharField(max_length=255)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'factor', 'value', 'timestamp']),
+            models.Index(fields=['user', 'timestamp', 'energy_level']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.factor}: {self.value} (energy {self.energy_level})"
+
+class EnergyLogRollup(models.Model):
+    """Compacted energy logs for one user over an hour or a day, kept after the raw logs age out"""
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='energy_log_rollups')
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    period_start = models.DateTimeField()
+    count = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)  # Sum of energy levels, so means combine exactly
+    min_level = models.IntegerField()
+    max_level = models.IntegerField()
+    # {factor: {value: {energy_level: count}}}
+    factor_counts = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['user', 'granularity', 'period_start']
+        indexes = [
+            models.Index(fields=['user', 'period_start']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.granularity} from {self.period_start} ({self.count} logs)"
+
+class EnergyHourAggregate(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='energy_hour_aggregate')
+    weighted_sums = models.JSONField(default=list)  # 24 slots of decayed sum(energy_level * weight)
+    weights = models.JSONField(default=list)  # 24 slots of decayed sum(weight)
+    decayed_to = models.DateTimeField(null=True, blank=True)  # Both arrays are decayed to this instant
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user.username} - energy aggregate decayed to {self.decayed_to}"
+
+class EnergyCircadianModel(models.Model):
+    """Per-user harmonic energy model: coefficients for daily and weekly sin/cos terms"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='energy_circadian_model')
+    coefficients = models.JSONField(default=list)
+    r_squared = models.FloatField(default=0.0)  # Weighted fit quality on the training readings
+    sample_count = models.IntegerField(default=0)
+    covered_hours = models.JSONField(default=list)  # Local hours of day the training readings fall in
+    fitted_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user.username} - circadian model (R² {self.r_squared:.2f}, n={self.sample_count})"
+
 class EnergyPrediction(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='energy_predictions')
     predicted_for = models.DateTimeField()
@@ -347,6 +453,10 @@ class EnergyPrediction(models.Model):
     actual_energy = models.FloatField(null=True, blank=True)
     prediction_accuracy = models.FloatField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['user', 'predicted_for']
     
     def __str__(self):
         return f"{self.user.username} - {self.predicted_for} - Predicted: {self.predicted_energy}"
@@ -0,0 +1,172 @@
+from django.core.cache import cache
+import hashlib
+import json
+import logging
+import math
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+class AIResponseCacheService:
+    """
+    Shared cache of Gemini responses for one-shot generations (motivation,
+    weekly review, priority recommendations).
+    
+    Entries are keyed on a hash of the normalized request payload and the
+    message type and expire after a per-type TTL. Responses are stored only
+    in a ring of MAX_ENTRIES slots: each write takes the next slot from an
+    atomic counter, overwriting the slot written longest ago, and the
+    payload key holds just a (slot, sequence) pointer that a read checks
+    against the slot. Concurrent writers can't push the count past the bound.
+    
+    Eviction approximates LRU: a hit on an entry more than half the ring old
+    rewrites it into a fresh slot, keeping its original expiry, so responses
+    that are read often outlive ones nobody reads. Younger hits write
+    nothing. Pointer keys are not counted against the bound, but each
+    expires with the response it points to and is only a small tuple.
+    
+    Hits and misses are counted per type. Free-form chat and plan generation
+    are never cached.
+    """
+    
+    TTLS = {
+        'priority_request': 60 * 60,  # 1 hour; the day's activities change as they're completed
+        'motivation': 60 * 60 * 6,  # 6 hours
+        'weekly_review': 60 * 60 * 24,  # 1 day
+    }
+    MAX_ENTRIES = 500
+    
+    SEQUENCE_KEY = 'ai_response:sequence'
+    SLOT_KEY = 'ai_response:slot:{slot}'
+    STATS_KEY = 'ai_response:stats:{message_type}:{outcome}'
+    
+    # The clock time in the system prompt changes every minute but not the answer
+    VOLATILE_LINE = re.compile(r'^\s*Current time:.*$', re.MULTILINE)
+    
+    @staticmethod
+    def is_cacheable(message_type):
+        return message_type in AIResponseCacheService.TTLS
+    
+    @staticmethod
+    def _normalize_text(text):
+        text = AIResponseCacheService.VOLATILE_LINE.sub('', text)
+        return ' '.join(text.split())
+    
+    @staticmethod
+    def make_key(payload, message_type):
+        """Hash of the payload with whitespace and volatile lines normalized away"""
+        normalized = {
+            **payload,
+            'contents': [
+                {
+                    'role': content.get('role'),
+                    'parts': [
+                        AIResponseCacheService._normalize_text(part.get('text', ''))
+                        for part in content.get('parts', [])
+                    ]
+                }
+                for content in payload.get('contents', [])
+            ]
+        }
+        digest = hashlib.sha256(
+            json.dumps(normalized, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        ).hexdigest()
+        return f"ai_response:{message_type}:{digest}"
+    
+    @staticmethod
+    def get(payload, message_type):
+        """Cached response for a payload, or None; counts the hit or miss"""
+        if not AIResponseCacheService.is_cacheable(message_type):
+            return None
+        
+        key = AIResponseCacheService.make_key(payload, message_type)
+        try:
+            response = None
+            pointer = cache.get(key)
+            if pointer is not None:
+                slot, sequence = pointer
+                stored = cache.get(AIResponseCacheService.SLOT_KEY.format(slot=slot))
+                # The slot may since have been taken by a newer response
+                if stored is not None and stored[0] == sequence:
+                    response = stored[1]
+                    AIResponseCacheService._promote(key, stored)
+        except Exception as e:
+            logger.warning(f"Error reading AI response cache: {str(e)}")
+            return None
+        
+        AIResponseCacheService._count(message_type, 'hits' if response is not None else 'misses')
+        return response
+    
+    @staticmethod
+    def set(payload, message_type, response):
+        """Store a response under its type's TTL in the next ring slot"""
+        if not AIResponseCacheService.is_cacheable(message_type):
+            return
+        
+        key = AIResponseCacheService.make_key(payload, message_type)
+        expires_at = time.time() + AIResponseCacheService.TTLS[message_type]
+        try:
+            AIResponseCacheService._store(key, response, expires_at)
+        except Exception as e:
+            logger.warning(f"Error writing AI response cache: {str(e)}")
+    
+    @staticmethod
+    def _store(key, response, expires_at):
+        """Write a response into the next ring slot and point its key at it"""
+        ttl = math.ceil(expires_at - time.time())
+        if ttl <= 0:
+            return
+        
+        # incr is atomic, so concurrent writers get distinct sequence numbers
+        cache.add(AIResponseCacheService.SEQUENCE_KEY, 0, None)
+        sequence = cache.incr(AIResponseCacheService.SEQUENCE_KEY)
+        slot = sequence % AIResponseCacheService.MAX_ENTRIES
+        
+        cache.set(AIResponseCacheService.SLOT_KEY.format(slot=slot), (sequence, response, expires_at), ttl)
+        cache.set(key, (slot, sequence), ttl)
+    
+    @staticmethod
+    def _promote(key, stored):
+        """Move a hit that is due for eviction soon into a fresh slot"""
+        sequence, response, expires_at = stored
+        try:
+            latest = cache.get(AIResponseCacheService.SEQUENCE_KEY) or 0
+            # Throttled: entries in the newer half of the ring are left alone
+            if latest - sequence >= AIResponseCacheService.MAX_ENTRIES // 2:
+                AIResponseCacheService._store(key, response, expires_at)
+        except Exception as e:
+            logger.warning(f"Error promoting AI response cache entry: {str(e)}")
+    
+    @staticmethod
+    def _count(message_type, outcome):
+        key = AIResponseCacheService.STATS_KEY.format(message_type=message_type, outcome=outcome)
+        try:
+            cache.add(key, 0, None)
+            cache.incr(key)
+        except Exception as e:
+            logger.warning(f"Error counting AI response cache {outcome}: {str(e)}")
+    
+    @staticmethod
+    def get_stats():
+        """Hit and miss counts with hit rate, per cacheable message type"""
+        keys = {
+            AIResponseCacheService.STATS_KEY.format(message_type=message_type, outcome=outcome): (message_type, outcome)
+            for message_type in AIResponseCacheService.TTLS
+            for outcome in ('hits', 'misses')
+        }
+        try:
+            counts = cache.get_many(list(keys))
+        except Exception as e:
+            logger.warning(f"Error reading AI response cache stats: {str(e)}")
+            counts = {}
+        
+        stats = {message_type: {'hits': 0, 'misses': 0} for message_type in AIResponseCacheService.TTLS}
+        for key, count in counts.items():
+            message_type, outcome = keys[key]
+            stats[message_type][outcome] = count
+        
+        for entry in stats.values():
+            lookups = entry['hits'] + entry['misses']
+            entry['hit_rate'] = entry['hits'] / lookups if lookups else 0.0
+        return stats
@@ -1,11 +1,13 @@
 import json
 import requests
-from django.conf import settings
 from django.utils import timezone
 from apps.core.models import (
     AIPromptHistory, MonkModeGoal, MonkModePeriod, ScheduledActivity, 
     ActivityType, UserDailyLog, SupportContact
 )
+from apps.core.services.ai_response_cache import AIResponseCacheService
+from apps.core.services.gemini_client import GeminiClient
+from apps.core.services.priority_engine import PriorityEngine
 from datetime import datetime, timedelta
 import logging
 
@@ -17,79 +19,24 @@ class AIService:
     and intelligent recommendations using Google Gemini API.
     """
     
-    GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
-    
     @staticmethod
-    def send_message_to_gemini(user_id, goal_id, message_text, chat_history=None, message_type='chat'):
-        """Send message to Gemini API with enhanced context"""
+    def send_message_to_gemini(user_id, goal_id, message_text, chat_history=None, message_type='chat',
+                               acquire_timeout=None):
+        """
+        Send message to Gemini API with enhanced context. acquire_timeout is
+        passed to GeminiClient.generate; background callers set it longer.
+        """
         try:
-            from django.contrib.auth.models import User
-            user = User.objects.get(id=user_id)
-            goal = MonkModeGoal.objects.get(id=goal_id, user=user) if goal_id else None
-            
-            # Save user message to history
-            user_prompt = AIPromptHistory.objects.create(
-                user=user,
-                monk_mode_goal=goal,
-                role='user',
-                message_text=message_text,
-                message_type=message_type
-            )
-            
-            # Build comprehensive context
-            context = AIService._build_user_context(user, goal)
-            
-            # Get conversation history - FIXED: No negative indexing
-            if chat_history is None:
-                chat_history_qs = AIPromptHistory.objects.filter(
-                    user=user,
-                    monk_mode_goal=goal
-                ).order_by('-timestamp')[:10]  # Get last 10 messages
-                
-                # Convert to list and reverse for chronological order
-                chat_history = list(chat_history_qs)
-                chat_history.reverse()
-            
-            # Build system prompt
-            system_prompt = AIService._build_system_prompt(context, message_type)
-            
-            # Build conversation for Gemini
-            conversation = AIService._build_gemini_conversation(
-                system_prompt, chat_history, message_text
+            user, goal, user_prompt, conversation = AIService._prepare_turn(
+                user_id, goal_id, message_text, chat_history, message_type
             )
             
-            # Call Gemini API
-            response = AIService._call_gemini_api(conversation)
+            # Call Gemini API (one-shot generations may be served from cache)
+            response = AIService._call_gemini_api(conversation, message_type, acquire_timeout)
             
             if response and 'candidates' in response and len(response['candidates']) > 0:
                 ai_response = response['candidates'][0]['content']['parts'][0]['text']
-                
-                # Save AI response
-                ai_prompt = AIPromptHistory.objects.create(
-                    user=user,
-                    monk_mode_goal=goal,
-                    role='model',
-                    message_text=ai_response,
-                    message_type=message_type
-                )
-                
-                # Check if response contains structured plan
-                plan_generated = False
-                monk_mode_period_id = None
-                
-                if AIService._contains_structured_plan(ai_response):
-                    period = AIService._parse_and_create_plan(user, goal, ai_response)
-                    if period:
-                        plan_generated = True
-                        monk_mode_period_id = period.id
-                
-                return {
-                    'ai_response': ai_response,
-                    'plan_generated': plan_generated,
-                    'monk_mode_period_id': monk_mode_period_id,
-                    'conversation_id': user_prompt.id,
-                    'status': 'success'
-                }
+                return AIService._finish_turn(user, goal, user_prompt, ai_response, message_type)
             else:
                 logger.error(f"Invalid response from Gemini API: {response}")
                 return {
@@ -97,7 +44,7 @@ class AIService:
                     'plan_generated': False,
                     'status': 'error'
                 }
-                
+        
         except Exception as e:
             logger.error(f"Error in send_message_to_gemini: {str(e)}")
             return {
@@ -106,6 +53,120 @@ class AIService:
                 'status': 'error'
             }
     
+    @staticmethod
+    def stream_message_to_gemini(user_id, goal_id, message_text, on_text, message_type='chat'):
+        """
+        Like send_message_to_gemini, but reads the reply from the streaming
+        endpoint and passes each text chunk to on_text as it arrives. The full
+        reply is saved and checked for a plan once the stream ends.
+        """
+        try:
+            user, goal, user_prompt, conversation = AIService._prepare_turn(
+                user_id, goal_id, message_text, None, message_type
+            )
+            
+            chunks = []
+            with GeminiClient.stream(AIService._build_payload(conversation)) as stream:
+                for text in stream:
+                    chunks.append(text)
+                    on_text(text)
+            
+            ai_response = ''.join(chunks)
+            if not ai_response:
+                logger.error("Empty streamed response from Gemini API")
+                return {
+                    'ai_response': "I'm experiencing technical difficulties. Please try again.",
+                    'plan_generated': False,
+                    'status': 'error'
+                }
+            
+            return AIService._finish_turn(user, goal, user_prompt, ai_response, message_type)
+        
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Gemini streaming request failed: {str(e)}")
+            return {
+                'ai_response': "I'm experiencing technical difficulties. Please try again.",
+                'plan_generated': False,
+                'status': 'error'
+            }
+        except Exception as e:
+            logger.error(f"Error in stream_message_to_gemini: {str(e)}")
+            return {
+                'ai_response': "I'm sorry, I encountered an error. Please try again.",
+                'plan_generated': False,
+                'status': 'error'
+            }
+    
+    @staticmethod
+    def _prepare_turn(user_id, goal_id, message_text, chat_history, message_type):
+        """Save the user's message and build the Gemini conversation for it"""
+        from django.contrib.auth.models import User
+        user = User.objects.get(id=user_id)
+        goal = MonkModeGoal.objects.get(id=goal_id, user=user) if goal_id else None
+        
+        # Save user message to history
+        user_prompt = AIPromptHistory.objects.create(
+            user=user,
+            monk_mode_goal=goal,
+            role='user',
+            message_text=message_text,
+            message_type=message_type
+        )
+        
+        # Build comprehensive context
+        context = AIService._build_user_context(user, goal)
+        
+        # Get conversation history - FIXED: No negative indexing
+        if chat_history is None:
+            chat_history_qs = AIPromptHistory.objects.filter(
+                user=user,
+                monk_mode_goal=goal
+            ).order_by('-timestamp')[:10]  # Get last 10 messages
+            
+            # Convert to list and reverse for chronological order
+            chat_history = list(chat_history_qs)
+            chat_history.reverse()
+        
+        # Build system prompt
+        system_prompt = AIService._build_system_prompt(context, message_type)
+        
+        # Build conversation for Gemini
+        conversation = AIService._build_gemini_conversation(
+            system_prompt, chat_history, message_text
+        )
+        
+        return user, goal, user_prompt, conversation
+    
+    @staticmethod
+    def _finish_turn(user, goal, user_prompt, ai_response, message_type):
+        """Save the model's reply, create any plan it contains and build the result"""
+        # Save AI response
+        AIPromptHistory.objects.create(
+            user=user,
+            monk_mode_goal=goal,
+            role='model',
+            message_text=ai_response,
+            message_type=message_type
+        )
+        
+        # Check if response contains structured plan
+        plan_generated = False
+        monk_mode_period_id = None
+        
+        if AIService._contains_structured_plan(ai_response):
+            period = AIService._parse_and_create_plan(user, goal, ai_response)
+            if period:
+                plan_generated = True
+                monk_mode_period_id = period.id
+        
+        return {
+            'ai_response': ai_response,
+            'plan_generated': plan_generated,
+            'monk_mode_period_id': monk_mode_period_id,
+            'conversation_id': user_prompt.id,
+            'status': 'success'
+        }
+    
     @staticmethod
     def _build_user_context(user, goal=None):
         """Build comprehensive user context for AI"""
@@ -179,7 +240,7 @@ class AIService:
         Current time: {context['current_time']}
         """
         
-        if message_type == 'chat':
+        if message_type in ['chat', 'motivation', 'weekly_review']:
             return base_prompt + """
             Your role is to:
             1. Provide motivational support and guidance
@@ -274,30 +335,40 @@ class AIService:
         return conversation
     
     @staticmethod
-    def _call_gemini_api(conversation):
-        """Make API call to Gemini with enhanced error handling"""
-        try:
-            headers = {
-                'Content-Type': 'application/json',
-            }
-            
-            url = f"{AIService.GEMINI_API_URL}?key={settings.GEMINI_API_KEY}"
-            
-            payload = {
-                **conversation,
-                "generationConfig": {
-                    "temperature": 0.7,
-                    "topK": 40,
-                    "topP": 0.95,
-                    "maxOutputTokens": 2048,
-                }
+    def _build_payload(conversation):
+        """Request body for a conversation with the shared generation settings"""
+        return {
+            **conversation,
+            "generationConfig": {
+                "temperature": 0.7,
+                "topK": 40,
+                "topP": 0.95,
+                "maxOutputTokens": 2048,
             }
+        }
+    
+    @staticmethod
+    def _call_gemini_api(conversation, message_type=None, acquire_timeout=None):
+        """
+        Make API call to Gemini with enhanced error handling.
+        
+        Responses for cacheable message types are served from and stored in
+        AIResponseCacheService, keyed on the normalized payload. Requests go
+        through the pooled, rate-limited GeminiClient.
+        """
+        try:
+            payload = AIService._build_payload(conversation)
             
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
-            response.raise_for_status()
+            cached = AIResponseCacheService.get(payload, message_type)
+            if cached is not None:
+                return cached
             
-            return response.json()
+            result = GeminiClient.generate(payload, acquire_timeout)
+            if result.get('candidates'):
+                AIResponseCacheService.set(payload, message_type, result)
             
+            return result
+        
         except requests.exceptions.Timeout as e:
             logger.error(f"Gemini API timeout: {str(e)}")
             return None
@@ -355,6 +426,7 @@ class AIService:
             )
             
             # Create scheduled activities
+            scheduled_type_counts = {}
             for daily_schedule in plan_data['daily_schedules']:
                 day_number = daily_schedule['day_number']
                 
@@ -393,13 +465,16 @@ class AIService:
                             description=activity_data.get('description', ''),
                             energy_required=activity_data.get('energy_required', 5)
                         )
+                        scheduled_type_counts[activity_type.id] = scheduled_type_counts.get(activity_type.id, 0) + 1
                     except Exception as activity_error:
                         logger.warning(f"Error creating activity: {str(activity_error)}")
                         continue
             
+            PriorityEngine.record_activities_scheduled(user, scheduled_type_counts)
+            
             logger.info(f"Successfully created MonkModePeriod {period.id} for user {user.id}")
             return period
-            
+        
         except json.JSONDecodeError as e:
             logger.error(f"JSON decode error: {str(e)}")
             return None
@@ -467,16 +542,16 @@ class AIService:
             4. Any schedule adjustments you recommend
             """
             
-            # Get AI response
+            # Get AI response; one-shot, so earlier chat turns aren't replayed
             response = AIService.send_message_to_gemini(
-                user.id, None, priority_message, message_type='priority_request'
+                user.id, None, priority_message, chat_history=[], message_type='priority_request'
             )
             
             if response['status'] == 'success':
                 return response['ai_response']
             else:
                 return "Unable to generate priority recommendations at this time."
-                
+        
         except Exception as e:
             logger.error(f"Error generating priority recommendations: {str(e)}")
             return "Error generating priority recommendations."
@@ -512,21 +587,21 @@ class AIService:
                 """
             
             response = AIService.send_message_to_gemini(
-                user.id, context.get('goal_id'), base_message, message_type='chat'
+                user.id, context.get('goal_id'), base_message, chat_history=[], message_type='motivation'
             )
             
             if response['status'] == 'success':
                 return response['ai_response']
             else:
                 return "Stay strong! Every step forward, no matter how small, brings you closer to your goals."
-                
+        
         except Exception as e:
             logger.error(f"Error generating motivational message: {str(e)}")
             return "Keep pushing forward! You've got this!"
     
     @staticmethod
-    def generate_weekly_review_insights(user):
-        """Generate AI insights for weekly review"""
+    def generate_weekly_review_insights(user, acquire_timeout=None):
+        """Generate AI insights for weekly review; acquire_timeout as for send_message_to_gemini"""
         try:
             # Get past week's data
             week_start = timezone.now().date() - timedelta(days=7)
@@ -586,14 +661,15 @@ class AIService:
             """
             
             response = AIService.send_message_to_gemini(
-                user.id, None, review_message, message_type='chat'
+                user.id, None, review_message, chat_history=[], message_type='weekly_review',
+                acquire_timeout=acquire_timeout
             )
             
             if response['status'] == 'success':
                 return response['ai_response']
             else:
                 return "Great work this week! Keep building on your progress."
-                
+        
         except Exception as e:
             logger.error(f"Error generating weekly review insights: {str(e)}")
             return "Unable to generate weekly insights at this time."
@@ -637,7 +713,7 @@ class AIService:
                 
                 You've got this. One moment at a time. 💪
                 """
-                
+        
         except Exception as e:
             logger.error(f"Error generating emergency motivation: {str(e)}")
             return "You're stronger than you know. This difficult moment will pass. Keep going - one step at a time. 💙"
\ No newline at end of file
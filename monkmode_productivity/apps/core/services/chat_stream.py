@@ -0,0 +1,120 @@
+from django.core.cache import cache
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+class ChatStreamService:
+    """
+    State of AI chat turns answered in the background.
+    
+    The web request only enqueues a turn; a Celery worker streams the reply
+    from Gemini and writes the text received so far into a cache entry that
+    web and workers share. The chat page polls that entry, so no web worker
+    waits on the model. A turn moves from pending through
+    streaming to done or error and expires after TURN_TIMEOUT.
+    """
+    
+    TURN_TIMEOUT = 60 * 10  # 10 minutes
+    # Workers write at most this often; later chunks are batched into the next write
+    FLUSH_INTERVAL = 0.05
+    
+    PENDING = 'pending'
+    STREAMING = 'streaming'
+    DONE = 'done'
+    ERROR = 'error'
+    FINISHED = (DONE, ERROR)
+    
+    ERROR_MESSAGE = "I'm sorry, I encountered an error. Please try again."
+    
+    @staticmethod
+    def _cache_key(turn_id):
+        return f"ai_chat_turn:{turn_id}"
+    
+    @staticmethod
+    def start_turn(user_id, goal_id, message_text):
+        """Record a pending turn, enqueue it for a worker and return its id"""
+        from apps.core.tasks import process_ai_chat_turn
+        
+        turn_id = uuid.uuid4().hex
+        cache.set(
+            ChatStreamService._cache_key(turn_id),
+            {
+                'user_id': user_id,
+                'status': ChatStreamService.PENDING,
+                'text': '',
+                'plan_generated': False,
+                'monk_mode_period_id': None,
+            },
+            ChatStreamService.TURN_TIMEOUT
+        )
+        try:
+            process_ai_chat_turn.delay(turn_id, user_id, goal_id, message_text)
+        except Exception:
+            ChatStreamService.fail_turn(turn_id, user_id)
+            raise
+        return turn_id
+    
+    @staticmethod
+    def run_turn(turn_id, user_id, goal_id, message_text):
+        """Stream the reply for a turn into its cache entry; called by the worker"""
+        from apps.core.services.ai_service import AIService
+        
+        key = ChatStreamService._cache_key(turn_id)
+        state = cache.get(key) or {
+            'user_id': user_id,
+            'text': '',
+            'plan_generated': False,
+            'monk_mode_period_id': None,
+        }
+        state['status'] = ChatStreamService.STREAMING
+        chunks = []
+        last_flush = 0.0
+        
+        def flush():
+            state['text'] = ''.join(chunks)
+            try:
+                cache.set(key, state, ChatStreamService.TURN_TIMEOUT)
+            except Exception as e:
+                logger.warning(f"Error updating AI chat turn {turn_id}: {str(e)}")
+        
+        def on_text(text):
+            nonlocal last_flush
+            chunks.append(text)
+            now = time.monotonic()
+            if now - last_flush >= ChatStreamService.FLUSH_INTERVAL:
+                flush()
+                last_flush = now
+        
+        result = AIService.stream_message_to_gemini(user_id, goal_id, message_text, on_text)
+        
+        if result.get('status') == 'success':
+            state['status'] = ChatStreamService.DONE
+            state['plan_generated'] = result['plan_generated']
+            state['monk_mode_period_id'] = result['monk_mode_period_id']
+            chunks = [result['ai_response']]
+        else:
+            # Keep whatever arrived before the failure and append the apology
+            state['status'] = ChatStreamService.ERROR
+            chunks.append(('\n\n' if chunks else '') + result['ai_response'])
+        
+        flush()
+        return state
+    
+    @staticmethod
+    def fail_turn(turn_id, user_id):
+        """Mark a turn as failed so clients stop waiting on it"""
+        key = ChatStreamService._cache_key(turn_id)
+        state = cache.get(key) or {'user_id': user_id, 'text': '', 'plan_generated': False, 'monk_mode_period_id': None}
+        state['status'] = ChatStreamService.ERROR
+        state['text'] = (state['text'] + '\n\n' if state['text'] else '') + ChatStreamService.ERROR_MESSAGE
+        cache.set(key, state, ChatStreamService.TURN_TIMEOUT)
+    
+    @staticmethod
+    def get_turn(turn_id, user_id):
+        """State of a turn owned by the user, or None if unknown or expired"""
+        state = cache.get(ChatStreamService._cache_key(turn_id))
+        if state is None or state.get('user_id') != user_id:
+            return None
+        return state
@@ -0,0 +1,216 @@
+from django.utils import timezone
+from apps.core.models import EnergyLog, EnergyCircadianModel
+from datetime import timedelta
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+class CircadianModelService:
+    """
+    Fits a small harmonic model of each user's energy by time of day and
+    day of week:
+    
+        energy(t) = b0 + b1 sin(d) + b2 cos(d) + b3 sin(2d) + b4 cos(2d)
+                       + b5 sin(w) + b6 cos(w)
+    
+    where d is the phase within the day and w the phase within the week.
+    The fit is recency-weighted least squares solved from the 7x7 normal
+    equations in plain Python, so only the coefficients are stored and a
+    prediction for any timestamp is a closed-form evaluation.
+    
+    Readings bunched into a few hours of the day leave the curve free to
+    swing elsewhere, so the ridge grows as hour coverage shrinks (pulling
+    the harmonics towards the mean) and hours far from any reading get a
+    lower confidence. Models not refitted for MAX_MODEL_AGE, i.e. users who
+    stopped logging, are not served.
+    """
+    
+    FIT_WINDOW_DAYS = 180
+    HALF_LIFE_DAYS = 10.0
+    MIN_SAMPLES = 10
+    # Small ridge term keeps sparse histories (e.g. a single logging hour) solvable
+    RIDGE = 1e-3
+    # Extra ridge for readings in a single hour, tapering off to none at WELL_COVERED_HOURS
+    SPARSE_RIDGE = 0.5
+    WELL_COVERED_HOURS = 12
+    
+    # Hours within this distance of a reading count as covered
+    NEARBY_HOURS = 2
+    # Confidence multiplier for hours with no reading nearby
+    UNCOVERED_CONFIDENCE_FACTOR = 0.5
+    MAX_MODEL_AGE = timedelta(days=14)
+    
+    @staticmethod
+    def _features(timestamp):
+        """Harmonic design row for a timestamp, in the user's local time"""
+        local = timezone.localtime(timestamp)
+        hours = local.hour + local.minute / 60.0
+        day_phase = 2 * math.pi * hours / 24.0
+        week_phase = 2 * math.pi * (local.weekday() + hours / 24.0) / 7.0
+        return [
+            1.0,
+            math.sin(day_phase), math.cos(day_phase),
+            math.sin(2 * day_phase), math.cos(2 * day_phase),
+            math.sin(week_phase), math.cos(week_phase),
+        ]
+    
+    @staticmethod
+    def evaluate(coefficients, timestamp):
+        """Predicted energy (clamped to 1-10) for a timestamp"""
+        features = CircadianModelService._features(timestamp)
+        value = sum(c * x for c, x in zip(coefficients, features))
+        return max(1.0, min(10.0, value))
+    
+    @staticmethod
+    def confidence(model, timestamp):
+        """Confidence in a model's prediction for a timestamp, lower far from any reading"""
+        confidence = min(0.9, 0.3 + 0.6 * model.r_squared)
+        
+        hour = timezone.localtime(timestamp).hour
+        is_covered = any(
+            min(abs(hour - covered), 24 - abs(hour - covered)) <= CircadianModelService.NEARBY_HOURS
+            for covered in model.covered_hours
+        )
+        if not is_covered:
+            confidence *= CircadianModelService.UNCOVERED_CONFIDENCE_FACTOR
+        return confidence
+    
+    @staticmethod
+    def get_model(user):
+        """The user's model if refitted recently, or None"""
+        return CircadianModelService.get_models([user.id]).get(user.id)
+    
+    @staticmethod
+    def get_models(user_ids):
+        """Recently refitted models for many users, keyed by user id"""
+        return {
+            model.user_id: model
+            for model in EnergyCircadianModel.objects.filter(
+                user_id__in=user_ids,
+                fitted_at__gte=timezone.now() - CircadianModelService.MAX_MODEL_AGE
+            )
+        }
+    
+    @staticmethod
+    def fit_users(user_ids):
+        """
+        Fit and store models for a shard of users from one log query.
+        Returns the number of models written.
+        """
+        now = timezone.now()
+        decay = math.log(2) / (CircadianModelService.HALF_LIFE_DAYS * 24 * 60 * 60)
+        
+        readings_by_user = {}
+        for user_id, timestamp, energy_level in EnergyLog.objects.filter(
+            user_id__in=user_ids,
+            timestamp__gte=now - timedelta(days=CircadianModelService.FIT_WINDOW_DAYS)
+        ).order_by().values_list('user_id', 'timestamp', 'energy_level'):
+            readings_by_user.setdefault(user_id, []).append((timestamp, energy_level))
+        
+        models = []
+        for user_id, readings in readings_by_user.items():
+            if len(readings) < CircadianModelService.MIN_SAMPLES:
+                continue
+            
+            weighted = [
+                (
+                    CircadianModelService._features(timestamp),
+                    float(energy_level),
+                    math.exp(-decay * max(0.0, (now - timestamp).total_seconds()))
+                )
+                for timestamp, energy_level in readings
+            ]
+            covered_hours = sorted({timezone.localtime(timestamp).hour for timestamp, _ in readings})
+            ridge = CircadianModelService.RIDGE + CircadianModelService.SPARSE_RIDGE * max(
+                0.0, 1 - (len(covered_hours) - 1) / (CircadianModelService.WELL_COVERED_HOURS - 1)
+            )
+            fit = CircadianModelService._fit(weighted, ridge)
+            if fit is None:
+                continue
+            
+            coefficients, r_squared = fit
+            models.append(EnergyCircadianModel(
+                user_id=user_id,
+                coefficients=coefficients,
+                r_squared=r_squared,
+                sample_count=len(readings),
+                covered_hours=covered_hours
+            ))
+        
+        EnergyCircadianModel.objects.bulk_create(
+            models,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['coefficients', 'r_squared', 'sample_count', 'covered_hours', 'fitted_at']
+        )
+        return len(models)
+    
+    @staticmethod
+    def _fit(weighted, ridge=None):
+        """Weighted ridge least squares over (features, target, weight); returns (coefficients, R²)"""
+        if ridge is None:
+            ridge = CircadianModelService.RIDGE
+        size = len(weighted[0][0])
+        xtx = [[0.0] * size for _ in range(size)]
+        xty = [0.0] * size
+        weight_total = 0.0
+        target_total = 0.0
+        
+        for features, target, weight in weighted:
+            weight_total += weight
+            target_total += weight * target
+            for i in range(size):
+                wxi = weight * features[i]
+                xty[i] += wxi * target
+                for j in range(i, size):
+                    xtx[i][j] += wxi * features[j]
+        
+        if weight_total <= 0:
+            return None
+        
+        for i in range(size):
+            for j in range(i):
+                xtx[i][j] = xtx[j][i]
+            # Ridge on the harmonic terms only, scaled to the data's weight
+            if i > 0:
+                xtx[i][i] += ridge * weight_total
+        
+        coefficients = CircadianModelService._solve(xtx, xty)
+        if coefficients is None:
+            return None
+        
+        mean = target_total / weight_total
+        residual = total = 0.0
+        for features, target, weight in weighted:
+            fitted = sum(c * x for c, x in zip(coefficients, features))
+            residual += weight * (target - fitted) ** 2
+            total += weight * (target - mean) ** 2
+        
+        r_squared = 1.0 - residual / total if total > 0 else 0.0
+        return coefficients, max(0.0, r_squared)
+    
+    @staticmethod
+    def _solve(matrix, vector):
+        """Gaussian elimination with partial pivoting; None if singular"""
+        size = len(vector)
+        rows = [matrix[i][:] + [vector[i]] for i in range(size)]
+        
+        for column in range(size):
+            pivot = max(range(column, size), key=lambda r: abs(rows[r][column]))
+            if abs(rows[pivot][column]) < 1e-12:
+                return None
+            rows[column], rows[pivot] = rows[pivot], rows[column]
+            
+            for r in range(column + 1, size):
+                factor = rows[r][column] / rows[column][column]
+                if factor:
+                    for c in range(column, size + 1):
+                        rows[r][c] -= factor * rows[column][c]
+        
+        solution = [0.0] * size
+        for r in range(size - 1, -1, -1):
+            solution[r] = (
+                rows[r][size] - sum(rows[r][c] * solution[c] for c in range(r + 1, size))
+            ) / rows[r][r]
+        return solution
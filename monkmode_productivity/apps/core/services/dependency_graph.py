@@ -0,0 +1,136 @@
+from django.core.cache import cache
+from apps.core.models import MonkModeObjective
+import logging
+
+logger = logging.getLogger(__name__)
+
+class DependencyGraphService:
+    """
+    Dependency graph over a goal's objectives (MonkModeObjective.dependencies),
+    analysed once and cached until the goal's objectives or edges change.
+    """
+    
+    CACHE_TIMEOUT = 60 * 60 * 24  # 24 hours
+    
+    @staticmethod
+    def _cache_key(goal_id):
+        return f"objective_graph:{goal_id}"
+    
+    @staticmethod
+    def get_graph(goal):
+        """Get the cached dependency analysis for a single goal"""
+        return DependencyGraphService.get_graphs([goal.id])[goal.id]
+    
+    @staticmethod
+    def get_graphs(goal_ids):
+        """Get dependency analyses for many goals, building only the cache misses"""
+        keys = {DependencyGraphService._cache_key(goal_id): goal_id for goal_id in goal_ids}
+        
+        graphs = {}
+        try:
+            for key, graph in cache.get_many(list(keys)).items():
+                graphs[keys[key]] = graph
+        except Exception as e:
+            logger.warning(f"Error reading dependency graphs from cache: {str(e)}")
+        
+        missing_ids = [goal_id for goal_id in goal_ids if goal_id not in graphs]
+        if missing_ids:
+            built = DependencyGraphService._build_graphs(missing_ids)
+            try:
+                cache.set_many(
+                    {DependencyGraphService._cache_key(goal_id): graph for goal_id, graph in built.items()},
+                    DependencyGraphService.CACHE_TIMEOUT
+                )
+            except Exception as e:
+                logger.warning(f"Error caching dependency graphs: {str(e)}")
+            graphs.update(built)
+        
+        return graphs
+    
+    @staticmethod
+    def invalidate(goal_id):
+        """Drop a goal's cached graph after its objectives or dependencies change"""
+        try:
+            cache.delete(DependencyGraphService._cache_key(goal_id))
+        except Exception as e:
+            logger.warning(f"Error invalidating dependency graph for goal {goal_id}: {str(e)}")
+    
+    @staticmethod
+    def _build_graphs(goal_ids):
+        """Load objectives and edges for many goals in two queries and analyse each"""
+        objectives_by_goal = {goal_id: {} for goal_id in goal_ids}
+        for row in MonkModeObjective.objects.filter(goal_id__in=goal_ids).values(
+            'id', 'goal_id', 'is_completed'
+        ):
+            objectives_by_goal[row['goal_id']][row['id']] = row['is_completed']
+        
+        # Through rows point from the dependent objective to its prerequisite
+        edges_by_goal = {goal_id: [] for goal_id in goal_ids}
+        Dependency = MonkModeObjective.dependencies.through
+        for goal_id, dependent_id, prerequisite_id in Dependency.objects.filter(
+            from_monkmodeobjective__goal_id__in=goal_ids
+        ).values_list(
+            'from_monkmodeobjective__goal_id', 'from_monkmodeobjective_id', 'to_monkmodeobjective_id'
+        ):
+            edges_by_goal[goal_id].append((dependent_id, prerequisite_id))
+        
+        return {
+            goal_id: DependencyGraphService.analyze(objectives_by_goal[goal_id], edges_by_goal[goal_id])
+            for goal_id in goal_ids
+        }
+    
+    @staticmethod
+    def analyze(completion_by_objective, edges):
+        """
+        Analyse one goal's graph.
+        
+        completion_by_objective maps objective id to is_completed; edges are
+        (dependent_id, prerequisite_id) pairs. Edges to objectives outside the
+        goal are ignored. Returns whether the goal models any dependencies and
+        how many open objectives there are and are currently blocked: waiting
+        on an open prerequisite, or caught in (or behind) a cycle.
+        
+        Scheduled activities aren't linked to objectives, so only these
+        goal-level counts reach the priority score; per-objective results such
+        as topological order or critical path would have no reader.
+        """
+        nodes = set(completion_by_objective)
+        prerequisites = {node: set() for node in nodes}
+        dependents = {node: set() for node in nodes}
+        for dependent_id, prerequisite_id in edges:
+            if dependent_id in nodes and prerequisite_id in nodes and dependent_id != prerequisite_id:
+                prerequisites[dependent_id].add(prerequisite_id)
+                dependents[prerequisite_id].add(dependent_id)
+        
+        # Kahn's algorithm; anything left unvisited sits on or behind a cycle
+        remaining = {node: len(prerequisites[node]) for node in nodes}
+        ready = [node for node, count in remaining.items() if count == 0]
+        acyclic = set()
+        while ready:
+            node = ready.pop()
+            acyclic.add(node)
+            for dependent_id in dependents[node]:
+                remaining[dependent_id] -= 1
+                if remaining[dependent_id] == 0:
+                    ready.append(dependent_id)
+        
+        open_ids = [node for node in nodes if not completion_by_objective[node]]
+        blocked_open = [
+            node for node in open_ids
+            if node not in acyclic or any(
+                not completion_by_objective[prerequisite_id] for prerequisite_id in prerequisites[node]
+            )
+        ]
+        
+        return {
+            'has_dependencies': any(prerequisites.values()),
+            'open_count': len(open_ids),
+            'blocked_open_count': len(blocked_open),
+        }
+    
+    @staticmethod
+    def blocking_pressure(graph):
+        """Share of open objectives currently waiting on others (0.0 - 1.0)"""
+        if not graph or not graph['open_count']:
+            return 0.0
+        return graph['blocked_open_count'] / graph['open_count']
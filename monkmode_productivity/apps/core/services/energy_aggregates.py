@@ -0,0 +1,113 @@
+from django.db import transaction
+from django.utils import timezone
+from apps.core.models import EnergyHourAggregate
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+class EnergyAggregateService:
+    """
+    Per-user hour-of-day energy aggregates with exponential recency decay,
+    maintained as readings are logged so predictions never scan raw logs.
+    """
+    
+    # A reading counts half as much after this many days
+    HALF_LIFE_DAYS = 10.0
+    DECAY_PER_SECOND = math.log(2) / (HALF_LIFE_DAYS * 24 * 60 * 60)
+    
+    # Hours whose decayed weight falls below this are treated as having no data
+    MIN_WEIGHT = 0.05
+    
+    @staticmethod
+    def record_readings(user, readings):
+        """Fold (timestamp, energy_level) readings into the user's aggregate"""
+        try:
+            with transaction.atomic():
+                # Row lock serialises concurrent readings for the same user
+                aggregate, _ = EnergyHourAggregate.objects.select_for_update().get_or_create(
+                    user=user
+                )
+                EnergyAggregateService._fold(aggregate, readings)
+                aggregate.save()
+            return aggregate
+            
+        except Exception as e:
+            logger.error(f"Error updating energy aggregate for user {user.id}: {str(e)}")
+            return None
+    
+    @staticmethod
+    def _fold(aggregate, readings):
+        """Apply readings to an aggregate in memory"""
+        weighted_sums = aggregate.weighted_sums or [0.0] * 24
+        weights = aggregate.weights or [0.0] * 24
+        decayed_to = aggregate.decayed_to
+        
+        for timestamp, energy_level in readings:
+            if decayed_to is None:
+                decayed_to = timestamp
+            
+            if timestamp > decayed_to:
+                # Age everything to the newer reading
+                factor = EnergyAggregateService._decay_factor(decayed_to, timestamp)
+                weighted_sums = [value * factor for value in weighted_sums]
+                weights = [value * factor for value in weights]
+                decayed_to = timestamp
+                weight = 1.0
+            else:
+                # Late readings enter already aged
+                weight = EnergyAggregateService._decay_factor(timestamp, decayed_to)
+            
+            hour = timezone.localtime(timestamp).hour
+            weighted_sums[hour] += float(energy_level) * weight
+            weights[hour] += weight
+        
+        aggregate.weighted_sums = weighted_sums
+        aggregate.weights = weights
+        aggregate.decayed_to = decayed_to
+    
+    @staticmethod
+    def _decay_factor(since, until):
+        return math.exp(-EnergyAggregateService.DECAY_PER_SECOND * (until - since).total_seconds())
+    
+    @staticmethod
+    def get_hourly_estimates(user, now=None):
+        """
+        Read the user's aggregate as {hour: (decayed mean energy, weight at now)}.
+        
+        One row read regardless of history length; hours without enough
+        weight are omitted.
+        """
+        return EnergyAggregateService.get_hourly_estimates_for_users([user.id], now).get(user.id, {})
+    
+    @staticmethod
+    def get_hourly_estimates_for_users(user_ids, now=None):
+        """Hourly estimates for many users from one query, keyed by user id"""
+        if now is None:
+            now = timezone.now()
+        
+        try:
+            estimates_by_user = {}
+            for aggregate in EnergyHourAggregate.objects.filter(
+                user_id__in=user_ids,
+                decayed_to__isnull=False
+            ):
+                # The mean is unaffected by decay; only the weight needs ageing to now
+                age_factor = EnergyAggregateService._decay_factor(
+                    aggregate.decayed_to, max(now, aggregate.decayed_to)
+                )
+                
+                estimates = {}
+                for hour in range(24):
+                    weight = aggregate.weights[hour]
+                    if weight * age_factor >= EnergyAggregateService.MIN_WEIGHT:
+                        estimates[hour] = (aggregate.weighted_sums[hour] / weight, weight * age_factor)
+                
+                if estimates:
+                    estimates_by_user[aggregate.user_id] = estimates
+            
+            return estimates_by_user
+            
+        except Exception as e:
+            logger.error(f"Error reading energy aggregates: {str(e)}")
+            return {}
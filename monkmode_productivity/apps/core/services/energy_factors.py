@@ -0,0 +1,146 @@
+from django.db.models import Count, Sum
+from apps.core.models import EnergyContextFactor
+from apps.core.services.energy_rollup import EnergyRollupService
+import logging
+
+logger = logging.getLogger(__name__)
+
+class EnergyFactorService:
+    """
+    Context-factor analytics backed by EnergyContextFactor rows, which are
+    written alongside each EnergyLog and counted with database aggregates.
+    Windows reaching past raw retention add the per-level factor histograms
+    kept on energy log rollups.
+    """
+    
+    BOOSTER_MIN_ENERGY = 7
+    DRAIN_MAX_ENERGY = 4
+    
+    @staticmethod
+    def record_factors(energy_logs):
+        """Write factor rows for newly created energy logs in one bulk insert"""
+        try:
+            EnergyContextFactor.objects.bulk_create([
+                EnergyContextFactor(
+                    energy_log=energy_log,
+                    user_id=energy_log.user_id,
+                    timestamp=energy_log.timestamp,
+                    energy_level=energy_log.energy_level,
+                    factor=str(factor)[:100],
+                    value=str(value)[:255]
+                )
+                for energy_log in energy_logs
+                for factor, value in (energy_log.context_factors or {}).items()
+                if value is not None
+            ], batch_size=1000)
+        except Exception as e:
+            logger.error(f"Error recording energy context factors: {str(e)}")
+    
+    @staticmethod
+    def _label(factor, value):
+        # The activity before a reading is shown by name alone
+        if factor == 'activity_before':
+            return value
+        return f"{factor}: {value}"
+    
+    @staticmethod
+    def analyze_boosters_and_drains(user, start, end=None, limit=5):
+        """Most frequent factors on high-energy (boosters) and low-energy (drains) logs"""
+        try:
+            factors = EnergyContextFactor.objects.filter(user=user, timestamp__gte=start)
+            if end is not None:
+                factors = factors.filter(timestamp__lt=end)
+            
+            rollup_levels = {}
+            if EnergyRollupService.covers(start):
+                rollup_levels = EnergyRollupService.get_factor_levels(
+                    EnergyRollupService.get_rollups(user, start, end)
+                )
+            
+            def top(queryset, matches):
+                rows = queryset.values('factor', 'value').annotate(
+                    count=Count('id')
+                ).order_by('-count', 'factor', 'value')
+                if not rollup_levels:
+                    rows = rows[:limit]
+                
+                counts = {(row['factor'], row['value']): row['count'] for row in rows}
+                for key, levels in rollup_levels.items():
+                    count = sum(n for level, n in levels.items() if matches(level))
+                    if count:
+                        counts[key] = counts.get(key, 0) + count
+                
+                ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+                return [
+                    f"{EnergyFactorService._label(factor, value)} ({count}x)"
+                    for (factor, value), count in ranked
+                ]
+            
+            return {
+                'boosters': top(
+                    factors.filter(energy_level__gte=EnergyFactorService.BOOSTER_MIN_ENERGY),
+                    lambda level: level >= EnergyFactorService.BOOSTER_MIN_ENERGY
+                ),
+                'drains': top(
+                    factors.filter(energy_level__lte=EnergyFactorService.DRAIN_MAX_ENERGY),
+                    lambda level: level <= EnergyFactorService.DRAIN_MAX_ENERGY
+                )
+            }
+            
+        except Exception as e:
+            logger.error(f"Error analyzing context factors: {str(e)}")
+            return {'boosters': [], 'drains': []}
+    
+    @staticmethod
+    def get_factor_energy(user, factor, value=None, start=None, end=None):
+        """
+        Average energy when a factor takes a value, over an optional window.
+        
+        With value given, returns that value's average and reading count; without
+        it, returns one entry per recorded value, most frequent first.
+        """
+        try:
+            factors = EnergyContextFactor.objects.filter(user=user, factor=factor)
+            if value is not None:
+                factors = factors.filter(value=str(value))
+            if start is not None:
+                factors = factors.filter(timestamp__gte=start)
+            if end is not None:
+                factors = factors.filter(timestamp__lt=end)
+            
+            totals = {
+                row['value']: (row['readings'], row['energy_sum'])
+                for row in factors.values('value').annotate(
+                    readings=Count('id'),
+                    energy_sum=Sum('energy_level')
+                ).order_by()
+            }
+            
+            if EnergyRollupService.covers(start):
+                rollup_levels = EnergyRollupService.get_factor_levels(
+                    EnergyRollupService.get_rollups(user, start, end), factor
+                )
+                for (_, rollup_value), levels in rollup_levels.items():
+                    if value is not None and rollup_value != str(value):
+                        continue
+                    readings, energy_sum = totals.get(rollup_value, (0, 0))
+                    totals[rollup_value] = (
+                        readings + sum(levels.values()),
+                        energy_sum + sum(level * count for level, count in levels.items())
+                    )
+            
+            return [
+                {
+                    'factor': factor,
+                    'value': row_value,
+                    'average_energy': round(energy_sum / readings, 2),
+                    'readings': readings
+                }
+                for row_value, (readings, energy_sum) in sorted(
+                    totals.items(), key=lambda item: (-item[1][0], item[0])
+                )
+            ]
+            
+        except Exception as e:
+            logger.error(f"Error querying energy for factor {factor} for user {user.id}: {str(e)}")
+            return []
@@ -0,0 +1,89 @@
+from django.core.cache import cache
+from django.utils import timezone
+from django.db.models import Avg, Count
+from django.db.models.functions import ExtractHour
+from apps.core.models import EnergyLog
+from datetime import timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+class EnergyProfileService:
+    """
+    Per-user hour-of-day energy profile: 24 average slots with sample counts,
+    built from recent energy logs and cached until the user logs a new reading.
+    """
+    
+    WINDOW_DAYS = 30
+    CACHE_TIMEOUT = 60 * 60  # 1 hour
+    
+    @staticmethod
+    def _cache_key(user_id):
+        return f"energy_profile:{user_id}"
+    
+    @staticmethod
+    def get_profile(user):
+        """Get the cached energy profile for a single user"""
+        return EnergyProfileService.get_profiles([user.id])[user.id]
+    
+    @staticmethod
+    def get_profiles(user_ids):
+        """Get energy profiles for many users, building only the cache misses"""
+        keys = {EnergyProfileService._cache_key(user_id): user_id for user_id in user_ids}
+        
+        profiles = {}
+        try:
+            for key, profile in cache.get_many(list(keys)).items():
+                profiles[keys[key]] = profile
+        except Exception as e:
+            logger.warning(f"Error reading energy profiles from cache: {str(e)}")
+        
+        missing_ids = [user_id for user_id in user_ids if user_id not in profiles]
+        if missing_ids:
+            built = EnergyProfileService._build_profiles(missing_ids)
+            try:
+                cache.set_many(
+                    {EnergyProfileService._cache_key(user_id): profile for user_id, profile in built.items()},
+                    EnergyProfileService.CACHE_TIMEOUT
+                )
+            except Exception as e:
+                logger.warning(f"Error caching energy profiles: {str(e)}")
+            profiles.update(built)
+        
+        return profiles
+    
+    @staticmethod
+    def _build_profiles(user_ids):
+        """Build profiles for many users with one grouped query"""
+        profiles = {
+            user_id: {'averages': [None] * 24, 'samples': [0] * 24}
+            for user_id in user_ids
+        }
+        
+        for row in EnergyLog.objects.filter(
+            user_id__in=user_ids,
+            timestamp__gte=timezone.now() - timedelta(days=EnergyProfileService.WINDOW_DAYS)
+        ).annotate(
+            hour=ExtractHour('timestamp')
+        ).order_by().values('user_id', 'hour').annotate(
+            avg_energy=Avg('energy_level'),
+            samples=Count('id')
+        ):
+            profile = profiles[row['user_id']]
+            profile['averages'][row['hour']] = row['avg_energy']
+            profile['samples'][row['hour']] = row['samples']
+        
+        return profiles
+    
+    @staticmethod
+    def invalidate(user):
+        """Drop a user's cached profile after a new energy reading"""
+        try:
+            cache.delete(EnergyProfileService._cache_key(user.id))
+        except Exception as e:
+            logger.warning(f"Error invalidating energy profile for user {user.id}: {str(e)}")
+    
+    @staticmethod
+    def energy_at(profile, hour):
+        """Average logged energy for an hour, or None if there are no samples"""
+        return profile['averages'][hour]
@@ -0,0 +1,272 @@
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import ExtractHour, ExtractWeekDay, TruncHour
+from django.utils import timezone
+from apps.core.models import EnergyContextFactor, EnergyLog, EnergyLogRollup
+from datetime import timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+class EnergyRollupService:
+    """
+    Tiered retention for energy logs.
+    
+    Raw logs are kept for RAW_RETENTION_DAYS, which covers the circadian fit
+    window and prediction-accuracy matching. Older logs are compacted into
+    one hourly rollup per user and hour (count, sum, min, max and a per-level
+    histogram of every context factor value), and hourly rollups older than
+    HOURLY_RETENTION_DAYS are folded into daily ones. Every reading lives in
+    exactly one tier, so readers add the tiers together without overlap.
+    
+    Hour-of-day detail is only read by get_energy_insights, whose window is
+    capped at HOURLY_RETENTION_DAYS (its MAX_INSIGHT_DAYS). Daily rollups are
+    kept indefinitely: the factor analysis endpoint averages over a user's
+    whole history when no date window is given.
+    """
+    
+    RAW_RETENTION_DAYS = 180
+    HOURLY_RETENTION_DAYS = 365
+    WRITE_BATCH_SIZE = 1000
+    
+    @staticmethod
+    def raw_cutoff(now=None):
+        """Readings before this instant may have been compacted into rollups"""
+        now = now or timezone.now()
+        cutoff = now - timedelta(days=EnergyRollupService.RAW_RETENTION_DAYS)
+        return cutoff.replace(minute=0, second=0, microsecond=0)
+    
+    @staticmethod
+    def hourly_cutoff(now=None):
+        """Hourly rollups before this instant may have been folded into daily ones"""
+        now = now or timezone.now()
+        cutoff = timezone.localtime(now - timedelta(days=EnergyRollupService.HOURLY_RETENTION_DAYS))
+        return cutoff.replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    @staticmethod
+    def covers(start, now=None):
+        """Whether a window starting at start reaches back past raw retention"""
+        return start is None or start < EnergyRollupService.raw_cutoff(now)
+    
+    @staticmethod
+    def compact(now=None):
+        """
+        Roll aged raw logs into hourly rollups, then aged hourly rollups into
+        daily ones. Each day of data is compacted in its own transaction.
+        Returns the number of logs and hourly rollups compacted.
+        """
+        raw_cutoff = EnergyRollupService.raw_cutoff(now)
+        hourly_cutoff = EnergyRollupService.hourly_cutoff(now)
+        compacted = {'logs': 0, 'hourly_rollups': 0}
+        
+        # Each pass deletes what it compacted, so the oldest remaining row starts the next window
+        while True:
+            oldest = EnergyLog.objects.filter(timestamp__lt=raw_cutoff).aggregate(
+                oldest=Min('timestamp')
+            )['oldest']
+            if oldest is None:
+                break
+            start = oldest.replace(minute=0, second=0, microsecond=0)
+            end = min(start + timedelta(days=1), raw_cutoff)
+            with transaction.atomic():
+                compacted['logs'] += EnergyRollupService._rollup_logs(start, end)
+        
+        while True:
+            oldest = EnergyLogRollup.objects.filter(
+                granularity='hour',
+                period_start__lt=hourly_cutoff
+            ).aggregate(oldest=Min('period_start'))['oldest']
+            if oldest is None:
+                break
+            start = EnergyRollupService._day_start(oldest)
+            end = min(start + timedelta(days=1), hourly_cutoff)
+            with transaction.atomic():
+                compacted['hourly_rollups'] += EnergyRollupService._rollup_hours(start, end)
+        
+        return compacted
+    
+    @staticmethod
+    def _day_start(timestamp):
+        return timezone.localtime(timestamp).replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    @staticmethod
+    def _rollup_logs(start, end):
+        """Compact raw logs in [start, end) into hourly rollups and delete them"""
+        logs = EnergyLog.objects.filter(timestamp__gte=start, timestamp__lt=end)
+        
+        rollups = {}
+        for row in logs.order_by().values('user_id', period=TruncHour('timestamp')).annotate(
+            count=Count('id'),
+            total=Sum('energy_level'),
+            min_level=Min('energy_level'),
+            max_level=Max('energy_level')
+        ):
+            rollups[(row['user_id'], row['period'])] = EnergyLogRollup(
+                user_id=row['user_id'],
+                granularity='hour',
+                period_start=row['period'],
+                count=row['count'],
+                total=row['total'],
+                min_level=row['min_level'],
+                max_level=row['max_level'],
+                factor_counts={}
+            )
+        
+        for row in EnergyContextFactor.objects.filter(
+            timestamp__gte=start,
+            timestamp__lt=end
+        ).order_by().values(
+            'user_id', 'factor', 'value', 'energy_level', period=TruncHour('timestamp')
+        ).annotate(count=Count('id')):
+            rollup = rollups.get((row['user_id'], row['period']))
+            if rollup is None:
+                continue
+            levels = rollup.factor_counts.setdefault(row['factor'], {}).setdefault(row['value'], {})
+            level = str(row['energy_level'])
+            levels[level] = levels.get(level, 0) + row['count']
+        
+        compacted = sum(rollup.count for rollup in rollups.values())
+        EnergyRollupService._save_rollups('hour', rollups)
+        # Factor rows cascade with their logs
+        logs.delete()
+        return compacted
+    
+    @staticmethod
+    def _rollup_hours(start, end):
+        """Fold hourly rollups in [start, end) into daily rollups and delete them"""
+        hourly = EnergyLogRollup.objects.filter(
+            granularity='hour',
+            period_start__gte=start,
+            period_start__lt=end
+        )
+        
+        rollups = {}
+        folded = 0
+        for hour in hourly:
+            day = EnergyRollupService._day_start(hour.period_start)
+            rollup = rollups.get((hour.user_id, day))
+            if rollup is None:
+                rollups[(hour.user_id, day)] = EnergyLogRollup(
+                    user_id=hour.user_id,
+                    granularity='day',
+                    period_start=day,
+                    count=hour.count,
+                    total=hour.total,
+                    min_level=hour.min_level,
+                    max_level=hour.max_level,
+                    factor_counts=hour.factor_counts
+                )
+            else:
+                EnergyRollupService._merge(rollup, hour)
+            folded += 1
+        
+        EnergyRollupService._save_rollups('day', rollups)
+        hourly.delete()
+        return folded
+    
+    @staticmethod
+    def _merge(target, source):
+        """Add one rollup's counts into another in place"""
+        target.count += source.count
+        target.total += source.total
+        target.min_level = min(target.min_level, source.min_level)
+        target.max_level = max(target.max_level, source.max_level)
+        
+        factor_counts = target.factor_counts
+        for factor, values in source.factor_counts.items():
+            for value, levels in values.items():
+                merged = factor_counts.setdefault(factor, {}).setdefault(value, {})
+                for level, count in levels.items():
+                    merged[level] = merged.get(level, 0) + count
+        target.factor_counts = factor_counts
+    
+    @staticmethod
+    def _save_rollups(granularity, rollups):
+        """
+        Insert new rollups and add into existing ones, e.g. when old readings
+        were ingested after their period had already been compacted.
+        """
+        if not rollups:
+            return
+        
+        existing = EnergyLogRollup.objects.filter(
+            granularity=granularity,
+            user_id__in={user_id for user_id, _ in rollups},
+            period_start__in={period for _, period in rollups}
+        )
+        
+        updated = []
+        for rollup in existing:
+            new = rollups.pop((rollup.user_id, rollup.period_start), None)
+            if new is not None:
+                EnergyRollupService._merge(rollup, new)
+                updated.append(rollup)
+        
+        EnergyLogRollup.objects.bulk_update(
+            updated,
+            ['count', 'total', 'min_level', 'max_level', 'factor_counts', 'updated_at'],
+            batch_size=EnergyRollupService.WRITE_BATCH_SIZE
+        )
+        EnergyLogRollup.objects.bulk_create(
+            rollups.values(),
+            batch_size=EnergyRollupService.WRITE_BATCH_SIZE
+        )
+    
+    @staticmethod
+    def get_rollups(user, start=None, end=None):
+        """A user's rollups (both granularities) with periods starting in [start, end)"""
+        rollups = EnergyLogRollup.objects.filter(user=user).order_by()
+        if start is not None:
+            rollups = rollups.filter(period_start__gte=start)
+        if end is not None:
+            rollups = rollups.filter(period_start__lt=end)
+        return rollups
+    
+    @staticmethod
+    def get_summary(rollups):
+        """Reading count, energy sum, min and max across rollups"""
+        return rollups.aggregate(
+            total_logs=Sum('count'),
+            energy_sum=Sum('total'),
+            min_energy=Min('min_level'),
+            max_energy=Max('max_level')
+        )
+    
+    @staticmethod
+    def get_hourly_totals(rollups):
+        """{hour: (count, energy sum)}; daily rollups carry no hour and are left out"""
+        return {
+            row['hour']: (row['count'], row['energy_sum'])
+            for row in rollups.filter(granularity='hour').annotate(
+                hour=ExtractHour('period_start')
+            ).values('hour').annotate(count=Sum('count'), energy_sum=Sum('total'))
+        }
+    
+    @staticmethod
+    def get_weekday_totals(rollups):
+        """{weekday: (count, energy sum)} with ExtractWeekDay numbering (1 = Sunday)"""
+        return {
+            row['weekday']: (row['count'], row['energy_sum'])
+            for row in rollups.annotate(
+                weekday=ExtractWeekDay('period_start')
+            ).values('weekday').annotate(count=Sum('count'), energy_sum=Sum('total'))
+        }
+    
+    @staticmethod
+    def get_series(rollups):
+        """(period_start, count, energy sum) per rollup in time order"""
+        return list(rollups.order_by('period_start').values_list('period_start', 'count', 'total'))
+    
+    @staticmethod
+    def get_factor_levels(rollups, factor=None):
+        """Merged {(factor, value): {energy_level: count}} across rollups"""
+        merged = {}
+        for factor_counts in rollups.values_list('factor_counts', flat=True):
+            for name, values in factor_counts.items():
+                if factor is not None and name != factor:
+                    continue
+                for value, levels in values.items():
+                    target = merged.setdefault((name, value), {})
+                    for level, count in levels.items():
+                        target[int(level)] = target.get(int(level), 0) + count
+        return merged
@@ -1,17 +1,50 @@
 from django.utils import timezone
-from django.db.models import Avg, Count, Q
-from apps.core.models import EnergyLog, EnergyPrediction, UserDailyLog, ScheduledActivity
+from django.utils.dateparse import parse_datetime
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import ExtractHour, ExtractWeekDay, TruncHour
+from apps.core.models import EnergyLog, EnergyPrediction, UserDailyLog, ScheduledActivity, MonkModePeriod
+from apps.core.services.circadian_model import CircadianModelService
+from apps.core.services.energy_aggregates import EnergyAggregateService
+from apps.core.services.energy_factors import EnergyFactorService
+from apps.core.services.energy_rollup import EnergyRollupService
+from apps.core.services.energy_trend import EnergyTrendService
+from apps.core.services.schedule_context import ScheduleContextService
+from apps.core.services.energy_profile import EnergyProfileService
+from apps.core.services.priority_engine import PriorityEngine
 from datetime import datetime, timedelta
+import bisect
 import logging
 
 logger = logging.getLogger(__name__)
 
+WEEKDAY_NAMES = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+
 class EnergyManagementService:
     """
     Service for tracking, analyzing, and predicting user energy levels
     to optimize task scheduling and prevent burnout.
     """
     
+    # Stored predictions younger than this are served without recomputing
+    PREDICTION_FRESHNESS_TTL = timedelta(hours=1)
+    WRITE_BATCH_SIZE = 1000
+    
+    # Longest window get_energy_insights will aggregate over; hourly rollups are kept this long
+    MAX_INSIGHT_DAYS = EnergyRollupService.HOURLY_RETENTION_DAYS
+    
+    # Hours with less decayed reading weight than this defer to the circadian model
+    BUCKET_TRUST_WEIGHT = 3.0
+    
+    # Upper bound on readings accepted per batch, and tolerated client clock drift
+    MAX_BATCH_READINGS = 500
+    MAX_CLOCK_SKEW = timedelta(minutes=5)
+    
+    # The low-energy protocol looks this far ahead for a scheduled break
+    BREAK_LOOKAHEAD = timedelta(hours=2)
+    
+    # Energy points per hour across the recent readings that count as a steady decline
+    FALLING_ENERGY_SLOPE = -1.0
+    
     @staticmethod
     def log_energy_level(user, energy_level, context_factors=None, notes=""):
         """Log user's current energy level with enhanced validation"""
@@ -38,16 +71,7 @@ class EnergyManagementService:
                     logger.warning(f"Error getting recent activity: {str(e)}")
             
             # Clean and validate context factors
-            validated_context = {}
-            for key, value in context_factors.items():
-                if value is not None:
-                    # Convert numeric strings to proper types
-                    if isinstance(value, str) and value.isdigit():
-                        validated_context[key] = int(value)
-                    elif isinstance(value, str):
-                        validated_context[key] = str(value).strip()
-                    else:
-                        validated_context[key] = value
+            validated_context = EnergyManagementService._clean_context_factors(context_factors)
             
             energy_log = EnergyLog.objects.create(
                 user=user,
@@ -56,6 +80,9 @@ class EnergyManagementService:
                 context_factors=validated_context,
                 notes=notes or ""
             )
+            EnergyAggregateService.record_readings(user, [(energy_log.timestamp, energy_level)])
+            EnergyFactorService.record_factors([energy_log])
+            EnergyProfileService.invalidate(user)
             
             # Update daily log if exists
             today = timezone.now().date()
@@ -66,18 +93,18 @@ class EnergyManagementService:
             )
             
             # Update energy level based on time of day
-            current_hour = timezone.now().hour
-            if 5 <= current_hour <= 11:
-                daily_log.energy_level_morning = energy_level
-            elif 12 <= current_hour <= 17:
-                daily_log.energy_level_afternoon = energy_level
-            elif 18 <= current_hour <= 23:
-                daily_log.energy_level_evening = energy_level
+            slot = EnergyManagementService._daily_log_slot(timezone.now().hour)
+            if slot:
+                setattr(daily_log, slot, energy_level)
             
             daily_log.save()
             
+            # New readings change the energy-alignment priority factor
+            PriorityEngine.mark_priorities_stale(user)
+            
             # Trigger energy-based recommendations
-            EnergyManagementService._check_energy_alerts(user, energy_level)
+            trend = EnergyTrendService.record_readings(user, [(energy_log.timestamp, energy_level)])
+            EnergyManagementService._check_energy_alerts(user, energy_level, trend)
             
             return energy_log
             
@@ -86,8 +113,183 @@ class EnergyManagementService:
             return None
     
     @staticmethod
-    def _check_energy_alerts(user, energy_level):
-        """Check if energy level warrants alerts or recommendations"""
+    def log_energy_levels_batch(user, readings):
+        """
+        Log a batch of timestamped readings, e.g. replayed from an offline queue.
+        
+        Each reading is a dict with energy_level, timestamp (ISO string, aware
+        datetime, or omitted for now) and optional context_factors and notes.
+        Invalid readings are skipped and reported; valid ones are written with
+        one bulk insert, and aggregates, daily logs, priority staleness and
+        alerts are updated once for the batch. Returns (logs, errors) where
+        errors is a list of {'index', 'error'}.
+        """
+        now = timezone.now()
+        errors = []
+        valid = []
+        
+        for index, reading in enumerate(readings):
+            if not isinstance(reading, dict):
+                errors.append({'index': index, 'error': 'Reading must be an object'})
+                continue
+            
+            if reading.get('energy_level') is None:
+                errors.append({'index': index, 'error': 'Energy level is required'})
+                continue
+            try:
+                energy_level = int(reading['energy_level'])
+            except (ValueError, TypeError):
+                errors.append({'index': index, 'error': 'Energy level must be a number'})
+                continue
+            if not (1 <= energy_level <= 10):
+                errors.append({'index': index, 'error': 'Energy level must be between 1 and 10'})
+                continue
+            
+            timestamp = reading.get('timestamp') or now
+            if isinstance(timestamp, str):
+                try:
+                    timestamp = parse_datetime(timestamp)
+                except ValueError:
+                    # Well formed but impossible, e.g. February 30th
+                    timestamp = None
+            if not isinstance(timestamp, datetime):
+                errors.append({'index': index, 'error': 'Invalid timestamp'})
+                continue
+            if timezone.is_naive(timestamp):
+                timestamp = timezone.make_aware(timestamp)
+            if timestamp > now + EnergyManagementService.MAX_CLOCK_SKEW:
+                errors.append({'index': index, 'error': 'Timestamp is in the future'})
+                continue
+            
+            context_factors = reading.get('context_factors') or {}
+            if not isinstance(context_factors, dict):
+                errors.append({'index': index, 'error': 'Context factors must be an object'})
+                continue
+            
+            valid.append({
+                'timestamp': timestamp,
+                'energy_level': energy_level,
+                'context_factors': dict(context_factors),
+                'notes': str(reading.get('notes') or '')
+            })
+        
+        if not valid:
+            return [], errors
+        
+        try:
+            valid.sort(key=lambda reading: reading['timestamp'])
+            EnergyManagementService._fill_activity_before(user, valid)
+            
+            energy_logs = EnergyLog.objects.bulk_create([
+                EnergyLog(
+                    user=user,
+                    timestamp=reading['timestamp'],
+                    energy_level=reading['energy_level'],
+                    context_factors=EnergyManagementService._clean_context_factors(
+                        reading['context_factors']
+                    ),
+                    notes=reading['notes']
+                )
+                for reading in valid
+            ])
+            EnergyAggregateService.record_readings(
+                user, [(energy_log.timestamp, energy_log.energy_level) for energy_log in energy_logs]
+            )
+            EnergyFactorService.record_factors(energy_logs)
+            EnergyProfileService.invalidate(user)
+            
+            # Latest reading per day and time-of-day slot wins, as with single logs
+            slot_levels_by_date = {}
+            for energy_log in energy_logs:
+                local_time = timezone.localtime(energy_log.timestamp)
+                slot = EnergyManagementService._daily_log_slot(local_time.hour)
+                if slot:
+                    slot_levels_by_date.setdefault(local_time.date(), {})[slot] = energy_log.energy_level
+            
+            for log_date, slot_levels in slot_levels_by_date.items():
+                daily_log, _ = UserDailyLog.objects.get_or_create(
+                    user=user,
+                    log_date=log_date,
+                    defaults={}
+                )
+                for slot, energy_level in slot_levels.items():
+                    setattr(daily_log, slot, energy_level)
+                daily_log.save()
+            
+            # New readings change the energy-alignment priority factor
+            PriorityEngine.mark_priorities_stale(user)
+            
+            trend = EnergyTrendService.record_readings(
+                user, [(energy_log.timestamp, energy_log.energy_level) for energy_log in energy_logs]
+            )
+            
+            # Alerts only make sense for readings that are still current
+            latest = energy_logs[-1]
+            if latest.timestamp >= now - timedelta(hours=6):
+                EnergyManagementService._check_energy_alerts(user, latest.energy_level, trend)
+            
+            return energy_logs, errors
+        
+        except Exception as e:
+            logger.error(f"Error logging energy batch for user {user.id}: {str(e)}")
+            return [], errors + [{'index': None, 'error': 'Unable to save readings'}]
+    
+    @staticmethod
+    def _fill_activity_before(user, readings):
+        """Set activity_before from the activity that ended within 2 hours before each reading"""
+        missing = [reading for reading in readings if 'activity_before' not in reading['context_factors']]
+        if not missing:
+            return
+        
+        try:
+            ended = list(ScheduledActivity.objects.filter(
+                monk_mode_period__goal__user=user,
+                actual_end_time__gte=missing[0]['timestamp'] - timedelta(hours=2),
+                actual_end_time__lte=missing[-1]['timestamp']
+            ).order_by('actual_end_time').values_list('actual_end_time', 'activity_type__name'))
+            end_times = [end_time for end_time, _ in ended]
+            
+            for reading in missing:
+                position = bisect.bisect_right(end_times, reading['timestamp']) - 1
+                if position >= 0 and end_times[position] >= reading['timestamp'] - timedelta(hours=2):
+                    reading['context_factors']['activity_before'] = ended[position][1]
+        except Exception as e:
+            logger.warning(f"Error getting recent activities: {str(e)}")
+    
+    @staticmethod
+    def _clean_context_factors(context_factors):
+        """Drop empty factors and convert numeric strings to integers"""
+        validated_context = {}
+        for key, value in context_factors.items():
+            if value is not None:
+                # Convert numeric strings to proper types
+                if isinstance(value, str) and value.isdigit():
+                    validated_context[key] = int(value)
+                elif isinstance(value, str):
+                    validated_context[key] = str(value).strip()
+                else:
+                    validated_context[key] = value
+        return validated_context
+    
+    @staticmethod
+    def _daily_log_slot(hour):
+        """UserDailyLog energy field for an hour of day, or None overnight"""
+        if 5 <= hour <= 11:
+            return 'energy_level_morning'
+        elif 12 <= hour <= 17:
+            return 'energy_level_afternoon'
+        elif 18 <= hour <= 23:
+            return 'energy_level_evening'
+        return None
+    
+    @staticmethod
+    def _check_energy_alerts(user, energy_level, trend):
+        """
+        Check if energy level warrants alerts or recommendations.
+        
+        Rules read the rolling trend state maintained by EnergyTrendService,
+        so the check itself runs no queries.
+        """
         try:
             # Validate energy level is numeric
             if not isinstance(energy_level, (int, float)):
@@ -96,14 +298,10 @@ class EnergyManagementService:
             
             energy_level = float(energy_level)
             
-            # Get recent energy levels
-            recent_logs = EnergyLog.objects.filter(
-                user=user,
-                timestamp__gte=timezone.now() - timedelta(hours=6)
-            ).order_by('-timestamp')[:3]
+            # Last three readings from the past six hours, including this one
+            energy_trend = EnergyTrendService.recent_levels(trend)
             
-            if len(recent_logs) >= 2:
-                energy_trend = [float(log.energy_level) for log in recent_logs]
+            if len(energy_trend) >= 2:
                 avg_recent = sum(energy_trend) / len(energy_trend)
                 
                 # Check for concerning patterns
@@ -111,6 +309,13 @@ class EnergyManagementService:
                     EnergyManagementService._trigger_low_energy_protocol(user, energy_level)
                 elif energy_level >= 8 and avg_recent >= 7:
                     EnergyManagementService._suggest_high_energy_tasks(user, energy_level)
+                elif (
+                    len(energy_trend) >= EnergyTrendService.RECENT_READINGS
+                    and energy_level <= 5
+                    and trend['slope'] <= EnergyManagementService.FALLING_ENERGY_SLOPE
+                ):
+                    # Steady decline: act before energy bottoms out
+                    EnergyManagementService._trigger_low_energy_protocol(user, energy_level)
             
         except Exception as e:
             logger.error(f"Error checking energy alerts: {str(e)}")
@@ -127,17 +332,21 @@ class EnergyManagementService:
             ]
             
             # Check if it's time for a scheduled break
-            current_time = timezone.now().time()
+            now = timezone.now()
+            window_end = now + EnergyManagementService.BREAK_LOOKAHEAD
             
             try:
-                upcoming_activities = ScheduledActivity.objects.filter(
-                    monk_mode_period__goal__user=user,
-                    start_time__gte=current_time,
-                    start_time__lte=(timezone.now() + timedelta(hours=2)).time(),
-                    activity_type__name__icontains='break'
+                # The window can cross midnight, so load every day it touches
+                first_day = timezone.localtime(now).date()
+                last_day = timezone.localtime(window_end).date()
+                intervals = ScheduleContextService.build_intervals(
+                    EnergyManagementService._get_day_schedules(user, [
+                        first_day + timedelta(days=offset)
+                        for offset in range((last_day - first_day).days + 1)
+                    ])
                 )
                 
-                if not upcoming_activities.exists():
+                if not ScheduleContextService.has_break_between(intervals, now, window_end):
                     recommendations.append("📅 Consider scheduling a break in your next hour.")
             except Exception as e:
                 logger.warning(f"Error checking upcoming activities: {str(e)}")
@@ -194,117 +403,252 @@ class EnergyManagementService:
             return []
     
     @staticmethod
-    def predict_energy_levels(user, prediction_date=None, hours_ahead=24):
-        """Predict user's energy levels for upcoming hours"""
+    def get_energy_predictions(user, prediction_date=None, hours_ahead=24, max_age=None):
+        """
+        Read-only view of upcoming energy predictions.
+        
+        Serves the stored rows when every requested hour has a prediction
+        younger than max_age; otherwise falls back to predict_energy_levels.
+        """
+        if prediction_date is None:
+            prediction_date = timezone.now().date()
+        if max_age is None:
+            max_age = EnergyManagementService.PREDICTION_FRESHNESS_TTL
+        
         try:
-            if prediction_date is None:
-                prediction_date = timezone.now().date()
-            
-            # Get historical energy data
-            historical_data = EnergyLog.objects.filter(
+            prediction_times = EnergyManagementService._get_prediction_times(
+                prediction_date, hours_ahead
+            )
+            stored = list(EnergyPrediction.objects.filter(
                 user=user,
-                timestamp__gte=timezone.now() - timedelta(days=30)
-            ).order_by('timestamp')
+                predicted_for__in=prediction_times,
+                updated_at__gte=timezone.now() - max_age
+            ).order_by('predicted_for'))
             
-            if not historical_data.exists():
-                return EnergyManagementService._generate_default_predictions(
-                    user, prediction_date, hours_ahead
-                )
+            if len(stored) == len(prediction_times):
+                return stored
             
-            predictions = []
-            current_datetime = timezone.now().replace(
-                year=prediction_date.year,
-                month=prediction_date.month,
-                day=prediction_date.day,
-                minute=0,
-                second=0,
-                microsecond=0
-            )
+            return EnergyManagementService.predict_energy_levels(user, prediction_date, hours_ahead)
             
-            for hour_offset in range(hours_ahead):
-                prediction_time = current_datetime + timedelta(hours=hour_offset)
-                
-                # Get historical data for this hour of day
-                hour_data = historical_data.filter(
-                    timestamp__hour=prediction_time.hour
-                )
-                
-                if hour_data.exists():
-                    # Calculate weighted average based on recency
-                    energy_values = []
-                    weights = []
-                    
-                    for log in hour_data:
-                        days_ago = (timezone.now().date() - log.timestamp.date()).days
-                        weight = 1.0 / (1.0 + days_ago * 0.1)  # More recent = higher weight
-                        energy_values.append(float(log.energy_level))
-                        weights.append(weight)
-                    
-                    # Calculate weighted average
-                    total_weight = sum(weights)
-                    if total_weight > 0:
-                        predicted_energy = sum(e * w for e, w in zip(energy_values, weights)) / total_weight
-                    else:
-                        predicted_energy = sum(energy_values) / len(energy_values)
-                    
-                    confidence = min(0.95, len(hour_data) * 0.1)  # Higher confidence with more data
-                else:
-                    # Use default pattern if no historical data for this hour
-                    predicted_energy = EnergyManagementService._get_default_energy_for_hour(
+        except Exception as e:
+            logger.error(f"Error reading energy predictions for user {user.id}: {str(e)}")
+            return []
+    
+    @staticmethod
+    def predict_energy_levels(user, prediction_date=None, hours_ahead=24):
+        """
+        Predict user's energy levels for upcoming hours.
+        
+        Per-hour estimates come from the user's decayed hour aggregate (one
+        row, maintained by log_energy_level); hours with little data use the
+        nightly circadian model where one is fitted. The covered days' schedule
+        is read once. Every prediction is upserted in a single bulk write, so
+        recomputing an hour replaces its stored row until that hour starts.
+        """
+        try:
+            return EnergyManagementService.predict_energy_levels_for_users(
+                [user.id], prediction_date, hours_ahead
+            ).get(user.id, [])
+        
+        except Exception as e:
+            logger.error(f"Error predicting energy levels: {str(e)}")
+            return []
+    
+    @staticmethod
+    def predict_energy_levels_for_users(user_ids, prediction_date=None, hours_ahead=24):
+        """
+        Predict a chunk of users at once.
+        
+        Aggregates, circadian models and day schedules are loaded for the
+        whole chunk in a fixed number of queries, and every prediction is
+        written with one bulk upsert. Returns a dict of user id to predictions.
+        """
+        if prediction_date is None:
+            prediction_date = timezone.now().date()
+        
+        prediction_times = EnergyManagementService._get_prediction_times(
+            prediction_date, hours_ahead
+        )
+        estimates_by_user = EnergyAggregateService.get_hourly_estimates_for_users(user_ids)
+        models_by_user = CircadianModelService.get_models(user_ids)
+        
+        # Users on the default curve get no context adjustment, so skip their schedules
+        schedules_by_user = EnergyManagementService._get_day_schedules_for_users(
+            [user_id for user_id in user_ids if user_id in estimates_by_user or user_id in models_by_user],
+            {prediction_time.date() for prediction_time in prediction_times}
+        )
+        
+        predictions = []
+        for user_id in user_ids:
+            predictions.extend(EnergyManagementService._build_predictions(
+                user_id,
+                prediction_times,
+                estimates_by_user.get(user_id, {}),
+                models_by_user.get(user_id),
+                schedules_by_user.get(user_id, {})
+            ))
+        
+        predictions_by_user = {}
+        for prediction in EnergyManagementService._store_predictions(predictions):
+            predictions_by_user.setdefault(prediction.user_id, []).append(prediction)
+        
+        return predictions_by_user
+    
+    @staticmethod
+    def _build_predictions(user_id, prediction_times, hourly_estimates, circadian_model, schedules):
+        """Unsaved predictions for one user from preloaded inputs"""
+        predictions = []
+        
+        if not hourly_estimates and circadian_model is None:
+            # Generate default energy predictions for new users
+            for prediction_time in prediction_times:
+                predictions.append(EnergyPrediction(
+                    user_id=user_id,
+                    predicted_for=prediction_time,
+                    predicted_energy=EnergyManagementService._get_default_energy_for_hour(
                         prediction_time.hour
-                    )
-                    confidence = 0.3  # Low confidence for default predictions
-                
-                # Adjust based on context factors
-                predicted_energy = EnergyManagementService._adjust_for_context(
-                    user, predicted_energy, prediction_time
+                    ),
+                    confidence_score=0.4  # Moderate confidence for defaults
+                ))
+            return predictions
+        
+        # Schedule effects for every prediction hour in one sweep
+        schedule_effects = ScheduleContextService.schedule_effects(
+            ScheduleContextService.build_intervals(schedules), prediction_times
+        )
+        
+        for prediction_time in prediction_times:
+            estimate = hourly_estimates.get(prediction_time.hour)
+            
+            if estimate and (
+                circadian_model is None
+                or estimate[1] >= EnergyManagementService.BUCKET_TRUST_WEIGHT
+            ):
+                # Recency-weighted average; weight is the decayed reading count
+                predicted_energy, weight = estimate
+                confidence = min(0.95, weight * 0.1)  # Higher confidence with more data
+            elif circadian_model is not None:
+                # Sparse hour: evaluate the fitted daily/weekly curve instead
+                predicted_energy = CircadianModelService.evaluate(
+                    circadian_model.coefficients, prediction_time
                 )
-                
-                # Create prediction record
-                prediction = EnergyPrediction.objects.create(
-                    user=user,
-                    predicted_for=prediction_time,
-                    predicted_energy=predicted_energy,
-                    confidence_score=confidence
+                confidence = CircadianModelService.confidence(circadian_model, prediction_time)
+            else:
+                # Use default pattern if no historical data for this hour
+                predicted_energy = EnergyManagementService._get_default_energy_for_hour(
+                    prediction_time.hour
                 )
-                
-                predictions.append(prediction)
+                confidence = 0.3  # Low confidence for default predictions
             
-            return predictions
+            # Adjust based on context factors
+            predicted_energy = EnergyManagementService._apply_context_adjustments(
+                predicted_energy, prediction_time, schedule_effects[prediction_time]
+            )
             
-        except Exception as e:
-            logger.error(f"Error predicting energy levels: {str(e)}")
-            return []
+            predictions.append(EnergyPrediction(
+                user_id=user_id,
+                predicted_for=prediction_time,
+                predicted_energy=predicted_energy,
+                confidence_score=confidence
+            ))
+        
+        return predictions
     
     @staticmethod
-    def _generate_default_predictions(user, prediction_date, hours_ahead):
-        """Generate default energy predictions for new users"""
-        predictions = []
-        current_datetime = timezone.now().replace(
+    def _get_prediction_times(prediction_date, hours_ahead):
+        """
+        Hourly slots starting at the next hour on prediction_date. The hour
+        already under way is left alone: readings for it may be logged.
+        """
+        next_hour = timezone.now().replace(
             year=prediction_date.year,
             month=prediction_date.month,
             day=prediction_date.day,
             minute=0,
             second=0,
             microsecond=0
-        )
+        ) + timedelta(hours=1)
+        return [
+            next_hour + timedelta(hours=hour_offset)
+            for hour_offset in range(hours_ahead)
+        ]
+    
+    @staticmethod
+    def _store_predictions(predictions):
+        """
+        Upsert predictions on (user, predicted_for), keeping recorded actuals.
+        
+        A prediction freezes once its hour starts, so it is never rewritten
+        after readings for it may have been logged: rows for hours that have
+        started (e.g. when the clock turned mid-sweep) are only inserted if
+        missing, never updated.
+        """
+        now = timezone.now()
+        frozen = [prediction for prediction in predictions if prediction.predicted_for <= now]
+        upcoming = [prediction for prediction in predictions if prediction.predicted_for > now]
         
-        for hour_offset in range(hours_ahead):
-            prediction_time = current_datetime + timedelta(hours=hour_offset)
-            predicted_energy = EnergyManagementService._get_default_energy_for_hour(
-                prediction_time.hour
+        if frozen:
+            EnergyPrediction.objects.bulk_create(
+                frozen,
+                batch_size=EnergyManagementService.WRITE_BATCH_SIZE,
+                ignore_conflicts=True
             )
+        
+        return frozen + EnergyPrediction.objects.bulk_create(
+            upcoming,
+            batch_size=EnergyManagementService.WRITE_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['user', 'predicted_for'],
+            update_fields=['predicted_energy', 'confidence_score', 'updated_at']
+        )
+    
+    @staticmethod
+    def _get_day_schedules(user, dates):
+        """Load the active period's activities for the given dates, keyed by date"""
+        return EnergyManagementService._get_day_schedules_for_users([user.id], dates).get(user.id, {})
+    
+    @staticmethod
+    def _get_day_schedules_for_users(user_ids, dates):
+        """Day schedules for many users in two queries, keyed by user id then date"""
+        try:
+            if not user_ids:
+                return {}
+            
+            period_by_user = {}
+            for period in MonkModePeriod.objects.filter(
+                goal__user_id__in=user_ids,
+                goal__current_status='active',
+                is_active=True
+            ).select_related('goal').order_by('-goal__created_at', '-created_at'):
+                period_by_user.setdefault(period.goal.user_id, period)
+            
+            if not period_by_user:
+                return {}
+            
+            # Periods sharing a start date share the same day_of_period values
+            period_ids_by_start = {}
+            for period in period_by_user.values():
+                period_ids_by_start.setdefault(period.start_date, []).append(period.id)
+            
+            day_filter = Q()
+            for start_date, period_ids in period_ids_by_start.items():
+                day_filter |= Q(
+                    monk_mode_period_id__in=period_ids,
+                    day_of_period__in=[(day - start_date).days + 1 for day in dates]
+                )
             
-            prediction = EnergyPrediction.objects.create(
-                user=user,
-                predicted_for=prediction_time,
-                predicted_energy=predicted_energy,
-                confidence_score=0.4  # Moderate confidence for defaults
-            )
+            period_by_id = {period.id: (user_id, period) for user_id, period in period_by_user.items()}
+            schedules = {}
+            for activity in ScheduledActivity.objects.filter(day_filter).select_related('activity_type'):
+                user_id, period = period_by_id[activity.monk_mode_period_id]
+                activity_date = period.start_date + timedelta(days=activity.day_of_period - 1)
+                schedules.setdefault(user_id, {}).setdefault(activity_date, []).append(activity)
             
-            predictions.append(prediction)
+            return schedules
         
-        return predictions
+        except Exception as e:
+            logger.warning(f"Error loading day schedules: {str(e)}")
+            return {}
     
     @staticmethod
     def _get_default_energy_for_hour(hour):
@@ -320,33 +664,31 @@ class EnergyManagementService:
         return energy_map.get(hour, 5)
     
     @staticmethod
-    def _adjust_for_context(user, base_energy, prediction_time):
-        """Adjust energy prediction based on context factors"""
+    def _adjust_for_context(user, base_energy, prediction_time, day_schedule=None):
+        """
+        Adjust energy prediction based on context factors.
+        
+        day_schedule is the prediction day's preloaded activities; when it is
+        omitted the day's schedule is loaded here.
+        """
+        if day_schedule is None:
+            day_schedule = EnergyManagementService._get_day_schedules(
+                user, [prediction_time.date()]
+            ).get(prediction_time.date(), [])
+        
+        intervals = ScheduleContextService.build_intervals({prediction_time.date(): day_schedule})
+        return EnergyManagementService._apply_context_adjustments(
+            base_energy,
+            prediction_time,
+            ScheduleContextService.schedule_effects(intervals, [prediction_time])[prediction_time]
+        )
+    
+    @staticmethod
+    def _apply_context_adjustments(base_energy, prediction_time, schedule_effect):
+        """Apply schedule, weekday and time-of-day adjustments to a base prediction"""
         try:
-            adjusted_energy = float(base_energy)
-            
-            # Check for scheduled activities that might affect energy
-            try:
-                scheduled_activities = ScheduledActivity.objects.filter(
-                    monk_mode_period__goal__user=user,
-                    start_time__lte=prediction_time.time(),
-                    end_time__gte=(prediction_time - timedelta(hours=2)).time()
-                )
-                
-                for activity in scheduled_activities:
-                    # Exercise typically boosts energy for a few hours
-                    if 'exercise' in activity.activity_type.name.lower():
-                        adjusted_energy += 1.0
-                    
-                    # Deep work can be draining
-                    elif 'deep work' in activity.activity_type.name.lower():
-                        adjusted_energy -= 0.5
-                    
-                    # Rest activities restore energy
-                    elif activity.activity_type.name.lower() in ['break', 'mindfulness', 'meditation']:
-                        adjusted_energy += 0.5
-            except Exception as e:
-                logger.warning(f"Error adjusting for scheduled activities: {str(e)}")
+            # Scheduled activities in the preceding hours (see ScheduleContextService)
+            adjusted_energy = float(base_energy) + schedule_effect
             
             # Weekend vs weekday adjustment
             if prediction_time.weekday() >= 5:  # Weekend
@@ -366,8 +708,18 @@ class EnergyManagementService:
     
     @staticmethod
     def get_energy_insights(user, days_back=30):
-        """Get comprehensive energy insights for the user"""
+        """
+        Get comprehensive energy insights for the user.
+        
+        Summary, hour-of-day and day-of-week breakdowns and the trend are
+        computed as GROUP BY aggregates in the database, so days_back can
+        scale to a year without loading every log into the web process.
+        When the window reaches past raw retention, the same aggregates are
+        taken over the compacted rollups and added in.
+        """
         try:
+            days_back = max(1, min(EnergyManagementService.MAX_INSIGHT_DAYS, int(days_back)))
+            
             # Get energy logs from the specified period
             end_date = timezone.now()
             start_date = end_date - timedelta(days=days_back)
@@ -375,9 +727,35 @@ class EnergyManagementService:
             energy_logs = EnergyLog.objects.filter(
                 user=user,
                 timestamp__gte=start_date
-            ).order_by('timestamp')
+            ).order_by()
+            
+            summary = energy_logs.aggregate(
+                energy_sum=Sum('energy_level'),
+                min_energy=Min('energy_level'),
+                max_energy=Max('energy_level'),
+                total_logs=Count('id')
+            )
             
-            if not energy_logs.exists():
+            # Older readings live in hourly/daily rollups rather than raw logs
+            rollups = None
+            if EnergyRollupService.covers(start_date, end_date):
+                rollups = EnergyRollupService.get_rollups(user, start_date)
+                rollup_summary = EnergyRollupService.get_summary(rollups)
+                if rollup_summary['total_logs']:
+                    summary['total_logs'] += rollup_summary['total_logs']
+                    summary['energy_sum'] = (summary['energy_sum'] or 0) + rollup_summary['energy_sum']
+                    summary['min_energy'] = min(
+                        value for value in (summary['min_energy'], rollup_summary['min_energy'])
+                        if value is not None
+                    )
+                    summary['max_energy'] = max(
+                        value for value in (summary['max_energy'], rollup_summary['max_energy'])
+                        if value is not None
+                    )
+                else:
+                    rollups = None
+            
+            if not summary['total_logs']:
                 return {
                     'message': 'Not enough energy data available. Start logging your energy levels!',
                     'recommendations': [
@@ -387,38 +765,23 @@ class EnergyManagementService:
                     ]
                 }
             
-            # Calculate basic statistics with type validation
-            energy_values = []
-            for log in energy_logs:
-                try:
-                    energy_values.append(float(log.energy_level))
-                except (ValueError, TypeError):
-                    logger.warning(f"Invalid energy level in log {log.id}: {log.energy_level}")
-                    continue
-            
-            if not energy_values:
-                return {'error': 'No valid energy data found'}
-            
-            avg_energy = sum(energy_values) / len(energy_values)
-            min_energy = min(energy_values)
-            max_energy = max(energy_values)
+            avg_energy = summary['energy_sum'] / summary['total_logs']
+            min_energy = float(summary['min_energy'])
+            max_energy = float(summary['max_energy'])
             
             # Find peak energy hours
-            hourly_energy = {}
-            for log in energy_logs:
-                try:
-                    hour = log.timestamp.hour
-                    energy_val = float(log.energy_level)
-                    if hour not in hourly_energy:
-                        hourly_energy[hour] = []
-                    hourly_energy[hour].append(energy_val)
-                except (ValueError, TypeError):
-                    continue
-            
+            hourly_totals = {
+                row['hour']: (row['count'], row['energy_sum'])
+                for row in energy_logs.annotate(
+                    hour=ExtractHour('timestamp')
+                ).values('hour').annotate(count=Count('id'), energy_sum=Sum('energy_level')).order_by('hour')
+            }
+            if rollups is not None:
+                EnergyManagementService._add_totals(
+                    hourly_totals, EnergyRollupService.get_hourly_totals(rollups)
+                )
             hourly_averages = {
-                hour: sum(values) / len(values) 
-                for hour, values in hourly_energy.items()
-                if values  # Only include hours with valid data
+                hour: energy_sum / count for hour, (count, energy_sum) in sorted(hourly_totals.items())
             }
             
             if hourly_averages:
@@ -428,26 +791,24 @@ class EnergyManagementService:
                 peak_hours = []
                 low_hours = []
             
-            # Analyze energy patterns by day of week
-            daily_energy = {}
-            for log in energy_logs:
-                try:
-                    day = log.timestamp.strftime('%A')
-                    energy_val = float(log.energy_level)
-                    if day not in daily_energy:
-                        daily_energy[day] = []
-                    daily_energy[day].append(energy_val)
-                except (ValueError, TypeError):
-                    continue
-            
+            # Analyze energy patterns by day of week (ExtractWeekDay: 1 = Sunday)
+            weekday_totals = {
+                row['weekday']: (row['count'], row['energy_sum'])
+                for row in energy_logs.annotate(
+                    weekday=ExtractWeekDay('timestamp')
+                ).values('weekday').annotate(count=Count('id'), energy_sum=Sum('energy_level')).order_by('weekday')
+            }
+            if rollups is not None:
+                EnergyManagementService._add_totals(
+                    weekday_totals, EnergyRollupService.get_weekday_totals(rollups)
+                )
             daily_averages = {
-                day: sum(values) / len(values) 
-                for day, values in daily_energy.items()
-                if values
+                WEEKDAY_NAMES[weekday - 1]: energy_sum / count
+                for weekday, (count, energy_sum) in sorted(weekday_totals.items())
             }
             
-            # Find energy drains and boosters
-            context_analysis = EnergyManagementService._analyze_context_factors(energy_logs)
+            # Find energy drains and boosters from the indexed factor rows
+            context_analysis = EnergyFactorService.analyze_boosters_and_drains(user, start_date)
             
             # Generate recommendations
             recommendations = EnergyManagementService._generate_energy_recommendations(
@@ -458,7 +819,7 @@ class EnergyManagementService:
                 'summary': {
                     'average_energy': round(avg_energy, 1),
                     'energy_range': f"{min_energy} - {max_energy}",
-                    'total_logs': len(energy_logs),
+                    'total_logs': summary['total_logs'],
                     'days_tracked': days_back
                 },
                 'peak_hours': [f"{hour:02d}:00 ({avg:.1f}/10)" for hour, avg in peak_hours],
@@ -467,7 +828,9 @@ class EnergyManagementService:
                 'energy_boosters': context_analysis['boosters'],
                 'energy_drains': context_analysis['drains'],
                 'recommendations': recommendations,
-                'trends': EnergyManagementService._calculate_energy_trends(energy_logs)
+                'trends': EnergyManagementService._calculate_energy_trends(
+                    energy_logs, summary['total_logs'], rollups
+                )
             }
             
         except Exception as e:
@@ -475,50 +838,11 @@ class EnergyManagementService:
             return {'error': 'Unable to generate energy insights'}
     
     @staticmethod
-    def _analyze_context_factors(energy_logs):
-        """Analyze context factors that affect energy"""
-        try:
-            boosters = {}
-            drains = {}
-            
-            for log in energy_logs:
-                try:
-                    energy_level = float(log.energy_level)
-                    factors = log.context_factors or {}
-                    
-                    # Analyze activities before energy logging
-                    if 'activity_before' in factors:
-                        activity = str(factors['activity_before'])
-                        
-                        if energy_level >= 7:
-                            boosters[activity] = boosters.get(activity, 0) + 1
-                        elif energy_level <= 4:
-                            drains[activity] = drains.get(activity, 0) + 1
-                    
-                    # Analyze other context factors
-                    for factor, value in factors.items():
-                        if factor != 'activity_before' and value is not None:
-                            factor_str = f"{factor}: {str(value)}"
-                            if energy_level >= 7:
-                                boosters[factor_str] = boosters.get(factor_str, 0) + 1
-                            elif energy_level <= 4:
-                                drains[factor_str] = drains.get(factor_str, 0) + 1
-                                
-                except (ValueError, TypeError):
-                    continue
-            
-            # Sort by frequency
-            top_boosters = sorted(boosters.items(), key=lambda x: x[1], reverse=True)[:5]
-            top_drains = sorted(drains.items(), key=lambda x: x[1], reverse=True)[:5]
-            
-            return {
-                'boosters': [f"{factor} ({count}x)" for factor, count in top_boosters],
-                'drains': [f"{factor} ({count}x)" for factor, count in top_drains]
-            }
-            
-        except Exception as e:
-            logger.error(f"Error analyzing context factors: {str(e)}")
-            return {'boosters': [], 'drains': []}
+    def _add_totals(totals, extra):
+        """Add {key: (count, energy sum)} pairs into totals in place"""
+        for key, (count, energy_sum) in extra.items():
+            current_count, current_sum = totals.get(key, (0, 0))
+            totals[key] = (current_count + count, current_sum + energy_sum)
     
     @staticmethod
     def _generate_energy_recommendations(hourly_avg, daily_avg, context_analysis, avg_energy):
@@ -584,38 +908,34 @@ class EnergyManagementService:
         return recommendations
     
     @staticmethod
-    def _calculate_energy_trends(energy_logs):
+    def _calculate_energy_trends(energy_logs, total_logs, rollups=None):
         """Calculate energy trends over time"""
         try:
-            if len(energy_logs) < 7:
+            if total_logs < 7:
                 return "Not enough data for trend analysis"
             
             # Split logs into two halves for comparison
-            mid_point = len(energy_logs) // 2
-            first_half = energy_logs[:mid_point]
-            second_half = energy_logs[mid_point:]
-            
-            # Calculate averages with type validation
-            first_values = []
-            second_values = []
-            
-            for log in first_half:
-                try:
-                    first_values.append(float(log.energy_level))
-                except (ValueError, TypeError):
-                    continue
-            
-            for log in second_half:
-                try:
-                    second_values.append(float(log.energy_level))
-                except (ValueError, TypeError):
-                    continue
+            mid_point = total_logs // 2
+            if rollups is None:
+                total_energy = energy_logs.aggregate(total=Sum('energy_level'))['total']
+                first_energy = energy_logs.order_by('timestamp', 'id')[:mid_point].aggregate(
+                    total=Sum('energy_level')
+                )['total']
+            else:
+                total_energy, first_energy = EnergyManagementService._split_bucket_series(
+                    EnergyRollupService.get_series(rollups) + list(
+                        energy_logs.values_list(TruncHour('timestamp')).annotate(
+                            count=Count('id'), energy_sum=Sum('energy_level')
+                        ).order_by()
+                    ),
+                    mid_point
+                )
             
-            if not first_values or not second_values:
+            if total_energy is None or first_energy is None:
                 return "Insufficient valid data for trend analysis"
             
-            first_avg = sum(first_values) / len(first_values)
-            second_avg = sum(second_values) / len(second_values)
+            first_avg = first_energy / mid_point
+            second_avg = (total_energy - first_energy) / (total_logs - mid_point)
             
             difference = second_avg - first_avg
             
@@ -630,22 +950,42 @@ class EnergyManagementService:
             logger.error(f"Error calculating energy trends: {str(e)}")
             return "Unable to calculate trends"
     
+    @staticmethod
+    def _split_bucket_series(buckets, mid_point):
+        """
+        Total energy and energy of the first mid_point readings across
+        (period, count, energy sum) buckets. The bucket holding the midpoint
+        is split in proportion to its count, i.e. at its mean.
+        """
+        total_energy = 0
+        first_energy = 0
+        remaining = mid_point
+        for _, count, energy_sum in sorted(buckets, key=lambda bucket: bucket[0]):
+            total_energy += energy_sum
+            if remaining >= count:
+                first_energy += energy_sum
+                remaining -= count
+            elif remaining > 0:
+                first_energy += energy_sum * remaining / count
+                remaining = 0
+        return total_energy, first_energy
+    
     @staticmethod
     def get_recovery_recommendations(user):
         """Get personalized recovery recommendations with enhanced validation"""
         try:
             # Get recent energy levels
-            recent_logs = EnergyLog.objects.filter(
+            recent_logs = list(EnergyLog.objects.filter(
                 user=user,
                 timestamp__gte=timezone.now() - timedelta(days=3)
-            ).order_by('-timestamp')
+            ).only('energy_level', 'context_factors').order_by('-timestamp')[:5])
             
-            if not recent_logs.exists():
+            if not recent_logs:
                 return ["Start tracking your energy levels to get personalized recovery recommendations"]
             
             # Validate and calculate recent energy
             recent_energy = []
-            for log in recent_logs[:5]:
+            for log in recent_logs:
                 try:
                     energy_val = float(log.energy_level)
                     if 1 <= energy_val <= 10:  # Validate range
@@ -683,8 +1023,8 @@ class EnergyManagementService:
                 ])
             
             # Add context-specific recommendations
-            if recent_logs.exists():
-                last_log = recent_logs.first()
+            if recent_logs:
+                last_log = recent_logs[0]
                 if last_log and last_log.context_factors:
                     factors = last_log.context_factors
                     
@@ -0,0 +1,122 @@
+from django.core.cache import cache
+from django.utils import timezone
+from apps.core.models import EnergyLog
+import logging
+
+logger = logging.getLogger(__name__)
+
+class EnergyTrendService:
+    """
+    Rolling per-user energy trend kept in the cache: the last few readings,
+    an exponentially weighted moving average of the level and the
+    least-squares slope (points per hour) over those readings. Each new
+    reading updates the state in constant time, so alert rules can be
+    evaluated without querying recent logs. The state is rebuilt from the
+    latest logs only when the cache entry is missing.
+    
+    Updates are a plain get and set of one cache entry, so two readings
+    saved at the same instant for the same user are last-writer-wins: the
+    losing reading can be missing from the rolling state until newer
+    readings push it out. Both are still in EnergyLog, and the state is
+    rebuilt from there whenever the entry is missing. The trend only feeds
+    alert rules, so this is cheaper than locking every energy write.
+    """
+    
+    RECENT_READINGS = 3
+    RECENT_WINDOW_SECONDS = 6 * 60 * 60  # Readings older than 6 hours don't count as recent
+    EWMA_ALPHA = 0.3
+    CACHE_TIMEOUT = 60 * 60 * 24 * 7  # 1 week
+    
+    @staticmethod
+    def _cache_key(user_id):
+        return f"energy_trend:{user_id}"
+    
+    @staticmethod
+    def record_readings(user, readings):
+        """
+        Fold saved (timestamp, energy_level) readings into the user's trend
+        state and return the updated state.
+        """
+        key = EnergyTrendService._cache_key(user.id)
+        
+        state = None
+        try:
+            state = cache.get(key)
+        except Exception as e:
+            logger.warning(f"Error reading energy trend for user {user.id}: {str(e)}")
+        
+        if state is None:
+            # The readings are already saved, so a rebuilt state includes them
+            state = EnergyTrendService._build_state(user)
+        else:
+            for timestamp, energy_level in sorted(readings, key=lambda reading: reading[0]):
+                EnergyTrendService._fold(state, timestamp, energy_level)
+        
+        try:
+            cache.set(key, state, EnergyTrendService.CACHE_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Error caching energy trend for user {user.id}: {str(e)}")
+        
+        return state
+    
+    @staticmethod
+    def _build_state(user):
+        """Seed the state from the user's latest logs"""
+        state = {'recent': [], 'ewma': None, 'slope': 0.0, 'updated_to': None}
+        latest = EnergyLog.objects.filter(user=user).order_by('-timestamp').values_list(
+            'timestamp', 'energy_level'
+        )[:EnergyTrendService.RECENT_READINGS]
+        for timestamp, energy_level in reversed(list(latest)):
+            EnergyTrendService._fold(state, timestamp, energy_level)
+        return state
+    
+    @staticmethod
+    def _fold(state, timestamp, energy_level):
+        """Add one reading to the state in place"""
+        seconds = timestamp.timestamp()
+        energy_level = float(energy_level)
+        
+        # Late readings still take their place among the most recent ones
+        recent = state['recent']
+        recent.append([seconds, energy_level])
+        recent.sort(key=lambda reading: reading[0])
+        del recent[:-EnergyTrendService.RECENT_READINGS]
+        
+        # The moving average only advances forward in time
+        if state['updated_to'] is None or seconds >= state['updated_to']:
+            if state['ewma'] is None:
+                state['ewma'] = energy_level
+            else:
+                alpha = EnergyTrendService.EWMA_ALPHA
+                state['ewma'] = alpha * energy_level + (1 - alpha) * state['ewma']
+            state['updated_to'] = seconds
+        
+        state['slope'] = EnergyTrendService._slope(recent)
+    
+    @staticmethod
+    def _slope(recent):
+        """Least-squares slope of energy against time in hours"""
+        if len(recent) < 2:
+            return 0.0
+        
+        hours = [seconds / 3600.0 for seconds, _ in recent]
+        levels = [energy_level for _, energy_level in recent]
+        mean_hour = sum(hours) / len(hours)
+        mean_level = sum(levels) / len(levels)
+        
+        variance = sum((hour - mean_hour) ** 2 for hour in hours)
+        if variance == 0:
+            return 0.0
+        return sum(
+            (hour - mean_hour) * (level - mean_level) for hour, level in zip(hours, levels)
+        ) / variance
+    
+    @staticmethod
+    def recent_levels(state, now=None):
+        """Levels of the tracked readings from the last six hours, newest first"""
+        now_seconds = (now or timezone.now()).timestamp()
+        return [
+            energy_level
+            for seconds, energy_level in reversed(state['recent'])
+            if seconds >= now_seconds - EnergyTrendService.RECENT_WINDOW_SECONDS
+        ]
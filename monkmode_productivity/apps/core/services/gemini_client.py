@@ -0,0 +1,241 @@
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import asyncio
+import json
+import logging
+import os
+import requests
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class GeminiBusyError(requests.exceptions.RequestException):
+    """No request slot became free within the acquire timeout"""
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`"""
+    
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self, timeout):
+        """Take one token, waiting up to timeout seconds; returns False on timeout"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(wait, remaining))
+
+class GeminiClient:
+    """
+    Process-wide Gemini HTTP client.
+    
+    Calls share one requests.Session whose keep-alive pool holds up to
+    GEMINI_MAX_CONCURRENCY connections, so repeated calls reuse TCP/TLS
+    connections. A semaphore caps in-flight requests at the same number and
+    a token bucket caps the request rate at GEMINI_REQUESTS_PER_MINUTE, so
+    bursts from web workers and batch tasks stay inside the API quota. The
+    state is created lazily and again after a fork (Celery prefork workers).
+    
+    generate_async runs the same pooled call for ASGI views and async batch
+    code on a dedicated thread pool sized to the concurrency limit, so
+    waiting calls don't tie up the event loop's default executor.
+    
+    Web requests wait at most REQUEST_ACQUIRE_TIMEOUT for a token and a slot
+    together and then get GeminiBusyError; background callers (Celery tasks,
+    batches, streamed chat turns) pass BACKGROUND_ACQUIRE_TIMEOUT.
+    """
+    
+    DEFAULT_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+    DEFAULT_MAX_CONCURRENCY = 8
+    DEFAULT_REQUESTS_PER_MINUTE = 60
+    DEFAULT_TIMEOUT = 30
+    # How long a caller waits for a token and a free slot before giving up
+    REQUEST_ACQUIRE_TIMEOUT = 2
+    BACKGROUND_ACQUIRE_TIMEOUT = 30
+    
+    _state = None
+    _state_lock = threading.Lock()
+    
+    @staticmethod
+    def _setting(name, default):
+        return getattr(settings, name, None) or default
+    
+    @staticmethod
+    def _get_state():
+        """Session and limiters for this process, built on first use"""
+        state = GeminiClient._state
+        if state is not None and state['pid'] == os.getpid():
+            return state
+        
+        with GeminiClient._state_lock:
+            state = GeminiClient._state
+            if state is None or state['pid'] != os.getpid():
+                state = GeminiClient._build_state()
+                GeminiClient._state = state
+            return state
+    
+    @staticmethod
+    def _build_state():
+        max_concurrency = int(GeminiClient._setting('GEMINI_MAX_CONCURRENCY', GeminiClient.DEFAULT_MAX_CONCURRENCY))
+        requests_per_minute = float(GeminiClient._setting(
+            'GEMINI_REQUESTS_PER_MINUTE', GeminiClient.DEFAULT_REQUESTS_PER_MINUTE
+        ))
+        
+        # Retry quota and transient errors with backoff, honouring Retry-After
+        retries = Retry(
+            total=2,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=['POST'],
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency, max_retries=retries)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'Content-Type': 'application/json'})
+        
+        return {
+            'pid': os.getpid(),
+            'session': session,
+            'semaphore': threading.BoundedSemaphore(max_concurrency),
+            # Allow a burst of one concurrency's worth of requests
+            'bucket': TokenBucket(requests_per_minute / 60.0, max_concurrency),
+            'executor': ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='gemini'),
+        }
+    
+    @staticmethod
+    def reset():
+        """Drop the pooled session and limiters, e.g. after settings change"""
+        with GeminiClient._state_lock:
+            state = GeminiClient._state
+            GeminiClient._state = None
+        if state is not None:
+            state['session'].close()
+            state['executor'].shutdown(wait=False)
+    
+    @staticmethod
+    def _acquire(state, acquire_timeout):
+        """Take a rate-limit token and a request slot within one overall timeout"""
+        deadline = time.monotonic() + acquire_timeout
+        if not state['bucket'].acquire(acquire_timeout):
+            raise GeminiBusyError("Gemini request rate limit reached")
+        if not state['semaphore'].acquire(timeout=max(0, deadline - time.monotonic())):
+            raise GeminiBusyError("Too many Gemini requests in flight")
+    
+    @staticmethod
+    def generate(payload, acquire_timeout=None):
+        """
+        POST a generateContent payload and return the decoded response.
+        acquire_timeout defaults to REQUEST_ACQUIRE_TIMEOUT, for web requests.
+        """
+        if acquire_timeout is None:
+            acquire_timeout = GeminiClient.REQUEST_ACQUIRE_TIMEOUT
+        state = GeminiClient._get_state()
+        GeminiClient._acquire(state, acquire_timeout)
+        
+        try:
+            response = state['session'].post(
+                GeminiClient._setting('GEMINI_API_URL', GeminiClient.DEFAULT_API_URL),
+                json=payload,
+                headers={'x-goog-api-key': settings.GEMINI_API_KEY},
+                timeout=GeminiClient._setting('GEMINI_TIMEOUT', GeminiClient.DEFAULT_TIMEOUT)
+            )
+            response.raise_for_status()
+            return response.json()
+        finally:
+            state['semaphore'].release()
+    
+    @staticmethod
+    async def generate_async(payload):
+        """Async generate for ASGI views and batch code; shares the process-wide limits"""
+        executor = GeminiClient._get_state()['executor']
+        return await sync_to_async(GeminiClient.generate, thread_sensitive=False, executor=executor)(
+            payload, GeminiClient.BACKGROUND_ACQUIRE_TIMEOUT
+        )
+    
+    @staticmethod
+    async def generate_many(payloads):
+        """
+        Run several payloads concurrently; results (or exceptions) in input order.
+        From sync code such as Celery tasks, call it via async_to_sync.
+        """
+        return await asyncio.gather(
+            *(GeminiClient.generate_async(payload) for payload in payloads),
+            return_exceptions=True
+        )
+    
+    @staticmethod
+    def stream_url():
+        """streamGenerateContent endpoint for the configured model, as server-sent events"""
+        url = GeminiClient._setting('GEMINI_API_URL', GeminiClient.DEFAULT_API_URL)
+        return url.replace(':generateContent', ':streamGenerateContent') + '?alt=sse'
+    
+    @staticmethod
+    @contextmanager
+    def stream(payload, acquire_timeout=None):
+        """
+        POST a payload to the streaming endpoint and yield an iterator of text
+        chunks as they arrive:
+        
+            with GeminiClient.stream(payload) as chunks:
+                for text in chunks:
+                    ...
+        
+        The token and request slot are taken on entering the block, and the
+        slot is freed on leaving it, however far the chunks were read.
+        acquire_timeout defaults to BACKGROUND_ACQUIRE_TIMEOUT; streams are
+        read by workers.
+        """
+        if acquire_timeout is None:
+            acquire_timeout = GeminiClient.BACKGROUND_ACQUIRE_TIMEOUT
+        state = GeminiClient._get_state()
+        GeminiClient._acquire(state, acquire_timeout)
+        
+        try:
+            response = state['session'].post(
+                GeminiClient.stream_url(),
+                json=payload,
+                headers={'x-goog-api-key': settings.GEMINI_API_KEY},
+                timeout=GeminiClient._setting('GEMINI_TIMEOUT', GeminiClient.DEFAULT_TIMEOUT),
+                stream=True
+            )
+            with response:
+                response.raise_for_status()
+                yield GeminiClient._stream_text(response)
+        finally:
+            state['semaphore'].release()
+    
+    @staticmethod
+    def _stream_text(response):
+        """Text chunks from a streaming response's server-sent events"""
+        # Take each chunk as it arrives; event lines are UTF-8 whatever the headers claim
+        for line in response.iter_lines(chunk_size=None):
+            if not line.startswith(b'data:'):
+                continue
+            
+            chunk = json.loads(line[len(b'data:'):].decode('utf-8'))
+            for candidate in chunk.get('candidates', [])[:1]:
+                for part in candidate.get('content', {}).get('parts', []):
+                    if part.get('text'):
+                        yield part['text']
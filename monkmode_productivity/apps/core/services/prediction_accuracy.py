@@ -0,0 +1,164 @@
+from django.db.models import Avg, Count, F, IntegerField
+from django.db.models.functions import Abs, Cast, ExtractHour, Floor
+from django.utils import timezone
+from apps.core.models import EnergyLog, EnergyPrediction
+from datetime import timedelta
+import bisect
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PredictionAccuracyService:
+    """
+    Scores stored energy predictions against what users actually logged:
+    fills EnergyPrediction.actual_energy / prediction_accuracy in bulk and
+    reports error by hour and calibration of confidence_score.
+    
+    Only predictions last written before their hour began are scored; a row
+    written later could already reflect the readings it is scored against.
+    """
+    
+    # A reading counts as the actual for a prediction slot within this distance
+    MATCH_WINDOW = timedelta(minutes=30)
+    # Predictions are matched one window of this size at a time
+    BATCH_WINDOW = timedelta(days=1)
+    DEFAULT_LOOKBACK = timedelta(days=7)
+    # Largest possible error on the 1-10 scale, used to normalise accuracy
+    MAX_ERROR = 9.0
+    WRITE_BATCH_SIZE = 1000
+    
+    @staticmethod
+    def backfill(since=None, user_ids=None):
+        """
+        Fill actuals for unscored predictions from since (default 7 days ago)
+        until readings can no longer arrive for them. Returns rows updated.
+        """
+        now = timezone.now()
+        if since is None:
+            since = now - PredictionAccuracyService.DEFAULT_LOOKBACK
+        until = now - PredictionAccuracyService.MATCH_WINDOW
+        
+        updated = 0
+        window_start = since
+        while window_start < until:
+            window_end = min(window_start + PredictionAccuracyService.BATCH_WINDOW, until)
+            try:
+                updated += PredictionAccuracyService._backfill_window(window_start, window_end, user_ids)
+            except Exception as e:
+                logger.error(f"Error backfilling prediction accuracy for {window_start}: {str(e)}")
+            window_start = window_end
+        
+        return updated
+    
+    @staticmethod
+    def _backfill_window(window_start, window_end, user_ids=None):
+        """Match one window's predictions to the nearest readings with two reads and one bulk write"""
+        predictions = EnergyPrediction.objects.filter(
+            predicted_for__gte=window_start,
+            predicted_for__lt=window_end,
+            updated_at__lt=F('predicted_for'),
+            actual_energy__isnull=True
+        ).only('id', 'user_id', 'predicted_for', 'predicted_energy')
+        if user_ids is not None:
+            predictions = predictions.filter(user_id__in=user_ids)
+        predictions = list(predictions)
+        
+        if not predictions:
+            return 0
+        
+        readings_by_user = {}
+        for user_id, timestamp, energy_level in EnergyLog.objects.filter(
+            user_id__in={prediction.user_id for prediction in predictions},
+            timestamp__gte=window_start - PredictionAccuracyService.MATCH_WINDOW,
+            timestamp__lte=window_end + PredictionAccuracyService.MATCH_WINDOW
+        ).order_by('user_id', 'timestamp').values_list('user_id', 'timestamp', 'energy_level'):
+            times, levels = readings_by_user.setdefault(user_id, ([], []))
+            times.append(timestamp)
+            levels.append(energy_level)
+        
+        matched = []
+        for prediction in predictions:
+            if prediction.user_id not in readings_by_user:
+                continue
+            
+            times, levels = readings_by_user[prediction.user_id]
+            position = bisect.bisect_left(times, prediction.predicted_for)
+            nearest = min(
+                (index for index in (position - 1, position) if 0 <= index < len(times)),
+                key=lambda index: abs(times[index] - prediction.predicted_for)
+            )
+            if abs(times[nearest] - prediction.predicted_for) > PredictionAccuracyService.MATCH_WINDOW:
+                continue
+            
+            prediction.actual_energy = float(levels[nearest])
+            prediction.prediction_accuracy = 1.0 - min(
+                1.0, abs(prediction.predicted_energy - prediction.actual_energy) / PredictionAccuracyService.MAX_ERROR
+            )
+            matched.append(prediction)
+        
+        EnergyPrediction.objects.bulk_update(
+            matched,
+            ['actual_energy', 'prediction_accuracy'],
+            batch_size=PredictionAccuracyService.WRITE_BATCH_SIZE
+        )
+        return len(matched)
+    
+    @staticmethod
+    def get_accuracy_report(user=None, since=None):
+        """
+        Accuracy of scored predictions, for one user or everyone:
+        overall MAE and bias, MAE by hour of day, and calibration of
+        confidence_score in tenths against observed accuracy.
+        """
+        scored = EnergyPrediction.objects.filter(
+            actual_energy__isnull=False,
+            updated_at__lt=F('predicted_for')
+        ).order_by()
+        if user is not None:
+            scored = scored.filter(user=user)
+        if since is not None:
+            scored = scored.filter(predicted_for__gte=since)
+        
+        scored = scored.annotate(
+            abs_error=Abs(F('predicted_energy') - F('actual_energy'))
+        )
+        
+        overall = scored.aggregate(
+            scored_predictions=Count('id'),
+            mae=Avg('abs_error'),
+            bias=Avg(F('predicted_energy') - F('actual_energy')),
+            mean_accuracy=Avg('prediction_accuracy')
+        )
+        
+        mae_by_hour = [
+            {'hour': row['hour'], 'mae': round(row['mae'], 3), 'count': row['count']}
+            for row in scored.annotate(hour=ExtractHour('predicted_for')).values('hour').annotate(
+                mae=Avg('abs_error'), count=Count('id')
+            ).order_by('hour')
+        ]
+        
+        # Well-calibrated buckets have mean accuracy close to mean confidence
+        calibration = [
+            {
+                'confidence_bucket': row['bucket'] / 10.0,
+                'mean_confidence': round(row['mean_confidence'], 3),
+                'mean_accuracy': round(row['mean_accuracy'], 3),
+                'count': row['count']
+            }
+            for row in scored.annotate(
+                bucket=Cast(Floor(F('confidence_score') * 10), IntegerField())
+            ).values('bucket').annotate(
+                mean_confidence=Avg('confidence_score'),
+                mean_accuracy=Avg('prediction_accuracy'),
+                count=Count('id')
+            ).order_by('bucket')
+        ]
+        
+        return {
+            'scored_predictions': overall['scored_predictions'],
+            'mae': round(overall['mae'], 3) if overall['mae'] is not None else None,
+            'bias': round(overall['bias'], 3) if overall['bias'] is not None else None,
+            'mean_accuracy': round(overall['mean_accuracy'], 3) if overall['mean_accuracy'] is not None else None,
+            'mae_by_hour': mae_by_hour,
+            'calibration': calibration
+        }
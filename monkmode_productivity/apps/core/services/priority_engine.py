@@ -1,9 +1,15 @@
 from django.utils import timezone
-from django.db.models import Avg, Count, Q
+from django.db import transaction
+from django.db.models import Avg, Count, F, Min, Q, Subquery
+from django.db.models.functions import ExtractHour, Greatest
 from apps.core.models import (
     ScheduledActivity, TaskPriorityScore, UserProductivityPattern,
-    EnergyLog, MonkModeObjective, UserDailyLog
+    MonkModeGoal, MonkModeObjective, MonkModePeriod, UserDailyLog,
+    StalePriorityDay, ActivityCompletionStats, ProductivityPatternWatermark
 )
+from apps.core.services.dependency_graph import DependencyGraphService
+from apps.core.services.energy_profile import EnergyProfileService
+from apps.core.services.schedule_context import ScheduleContextService
 from datetime import datetime, timedelta
 import math
 import logging
@@ -26,6 +32,24 @@ class PriorityEngine:
         'momentum_factor': 0.05
     }
     
+    # TaskPriorityScore columns written on every scoring pass
+    SCORE_FIELDS = [
+        'deadline_urgency', 'goal_impact', 'energy_requirement',
+        'dependency_weight', 'user_preference', 'momentum_factor', 'final_score'
+    ]
+    
+    # Rows per statement when persisting a sweep's scores
+    WRITE_BATCH_SIZE = 1000
+    
+    # Stored scores younger than this are served without recomputing
+    SCORE_FRESHNESS_TTL = timedelta(hours=2)
+    # Days ahead are precomputed by the daily sweep and otherwise change only
+    # through stale marks, so their scores last until the next sweep (with slack)
+    FUTURE_SCORE_FRESHNESS_TTL = timedelta(hours=25)
+    
+    # Completions committed up to this long after their timestamp still reach the patterns
+    PATTERN_WATERMARK_OVERLAP = timedelta(minutes=15)
+    
     @staticmethod
     def calculate_daily_priorities(user, target_date=None):
         """Calculate priority scores for all activities on a given date"""
@@ -33,105 +57,499 @@ class PriorityEngine:
             target_date = timezone.now().date()
         
         try:
-            # Get user's active monk mode period
-            active_period = user.monk_mode_goals.filter(
-                current_status='active'
-            ).first()
+            scored_at = timezone.now()
+            priorities_by_user = PriorityEngine.calculate_priorities_for_users(
+                [user.id], target_date
+            )
+            PriorityEngine.clear_stale_marks([user.id], [target_date], scored_at)
+            return priorities_by_user.get(user.id, [])
+        
+        except Exception as e:
+            logger.error(f"Error calculating daily priorities for user {user.id}: {str(e)}")
+            return []
+    
+    @staticmethod
+    def get_daily_priorities(user, target_date=None, max_age=None):
+        """
+        Read-only view of a day's ranking.
+        
+        Serves the stored TaskPriorityScore rows when every activity has a
+        score younger than max_age and the day is not marked stale; otherwise
+        falls back to calculate_daily_priorities. Days after today keep their
+        sweep-computed scores for FUTURE_SCORE_FRESHNESS_TTL instead.
+        """
+        if target_date is None:
+            target_date = timezone.now().date()
+        if max_age is None:
+            max_age = PriorityEngine.SCORE_FRESHNESS_TTL
+        
+        try:
+            period = PriorityEngine._get_active_period(user)
+            if period is None:
+                return []
+            
+            day_of_period = (target_date - period.start_date).days + 1
+            activities = list(ScheduledActivity.objects.filter(
+                monk_mode_period=period,
+                day_of_period=day_of_period
+            ).select_related('activity_type', 'task_priority_score'))
             
-            if not active_period or not active_period.periods.filter(is_active=True).exists():
+            if not activities:
                 return []
             
-            period = active_period.periods.filter(is_active=True).first()
+            is_fresh = PriorityEngine._scores_fresh(
+                activities, PriorityEngine._fresh_after(target_date, max_age)
+            ) and not StalePriorityDay.objects.filter(
+                user=user,
+                target_date=target_date
+            ).exists()
             
-            # Calculate day of period
-            day_of_period = (target_date - period.start_date).days + 1
+            if not is_fresh:
+                return PriorityEngine.calculate_daily_priorities(user, target_date)
+            
+            return PriorityEngine._stored_ranking(activities)
+        
+        except Exception as e:
+            logger.error(f"Error reading daily priorities for user {user.id}: {str(e)}")
+            return []
+    
+    @staticmethod
+    def get_priority_horizon(user, start_date=None, days=7, max_age=None):
+        """
+        Read-only view of a run of consecutive days.
+        
+        Applies get_daily_priorities' freshness rule per day: days whose
+        activities all have a score younger than max_age (or
+        FUTURE_SCORE_FRESHNESS_TTL after today) and that are not marked stale
+        are served from the stored rows, and only the remaining
+        days are rescored, together in one pass. Returns a dict of date to
+        prioritized activities (highest first).
+        """
+        if start_date is None:
+            start_date = timezone.now().date()
+        if max_age is None:
+            max_age = PriorityEngine.SCORE_FRESHNESS_TTL
+        dates = [start_date + timedelta(days=offset) for offset in range(days)]
+        
+        try:
+            period = PriorityEngine._get_active_period(user)
+            if period is None:
+                return {target_date: [] for target_date in dates}
             
-            # Get activities for this day
-            activities = ScheduledActivity.objects.filter(
+            activities_by_date = {}
+            for activity in ScheduledActivity.objects.filter(
                 monk_mode_period=period,
-                day_of_period=day_of_period
-            )
+                day_of_period__in=[(target_date - period.start_date).days + 1 for target_date in dates]
+            ).select_related('activity_type', 'task_priority_score'):
+                activity_date = period.start_date + timedelta(days=activity.day_of_period - 1)
+                activities_by_date.setdefault(activity_date, []).append(activity)
+            
+            stale_dates = set(StalePriorityDay.objects.filter(
+                user=user,
+                target_date__in=dates
+            ).values_list('target_date', flat=True))
             
-            prioritized_activities = []
+            horizon = {}
+            outdated_dates = []
+            for target_date in dates:
+                activities = activities_by_date.get(target_date, [])
+                fresh_after = PriorityEngine._fresh_after(target_date, max_age)
+                if target_date not in stale_dates and PriorityEngine._scores_fresh(activities, fresh_after):
+                    horizon[target_date] = PriorityEngine._stored_ranking(activities)
+                else:
+                    outdated_dates.append(target_date)
             
-            for activity in activities:
-                # Calculate individual factor scores
-                deadline_score = PriorityEngine._calculate_deadline_urgency(activity, target_date)
-                goal_impact_score = PriorityEngine._calculate_goal_impact(activity)
-                energy_score = PriorityEngine._calculate_energy_alignment(activity, user, target_date)
-                dependency_score = PriorityEngine._calculate_dependency_weight(activity)
-                preference_score = PriorityEngine._calculate_user_preference(activity, user)
-                momentum_score = PriorityEngine._calculate_momentum_factor(activity, user)
-                
-                # Calculate final weighted score
-                final_score = (
-                    deadline_score * PriorityEngine.WEIGHTS['deadline_urgency'] +
-                    goal_impact_score * PriorityEngine.WEIGHTS['goal_impact'] +
-                    energy_score * PriorityEngine.WEIGHTS['energy_alignment'] +
-                    dependency_score * PriorityEngine.WEIGHTS['dependency_weight'] +
-                    preference_score * PriorityEngine.WEIGHTS['user_preference'] +
-                    momentum_score * PriorityEngine.WEIGHTS['momentum_factor']
-                )
-                
-                # Store or update priority score
-                priority_score, created = TaskPriorityScore.objects.get_or_create(
-                    scheduled_activity=activity,
-                    defaults={
-                        'deadline_urgency': deadline_score,
-                        'goal_impact': goal_impact_score,
-                        'energy_requirement': energy_score,
-                        'dependency_weight': dependency_score,
-                        'user_preference': preference_score,
-                        'momentum_factor': momentum_score,
-                        'final_score': final_score
-                    }
+            if outdated_dates:
+                scored_at = timezone.now()
+                rescored = PriorityEngine.calculate_horizon_for_users([user.id], outdated_dates).get(user.id, {})
+                PriorityEngine.clear_stale_marks([user.id], outdated_dates, scored_at)
+                for target_date in outdated_dates:
+                    horizon[target_date] = rescored.get(target_date, [])
+            
+            return {target_date: horizon[target_date] for target_date in dates}
+        
+        except Exception as e:
+            logger.error(f"Error reading priority horizon for user {user.id}: {str(e)}")
+            return {target_date: [] for target_date in dates}
+    
+    @staticmethod
+    def _fresh_after(target_date, max_age):
+        """Oldest calculated_at still served for target_date"""
+        now = timezone.now()
+        if target_date > now.date():
+            max_age = max(max_age, PriorityEngine.FUTURE_SCORE_FRESHNESS_TTL)
+        return now - max_age
+    
+    @staticmethod
+    def _scores_fresh(activities, fresh_after):
+        """Whether every activity has a stored score calculated after fresh_after"""
+        return all(
+            hasattr(activity, 'task_priority_score')
+            and activity.task_priority_score.calculated_at >= fresh_after
+            for activity in activities
+        )
+    
+    @staticmethod
+    def _stored_ranking(activities):
+        """Prioritized activities (highest first) from their stored scores"""
+        prioritized_activities = [
+            {
+                'activity': activity,
+                'priority_score': activity.task_priority_score,
+                'final_score': activity.task_priority_score.final_score
+            }
+            for activity in activities
+        ]
+        prioritized_activities.sort(key=lambda x: x['final_score'], reverse=True)
+        return prioritized_activities
+    
+    @staticmethod
+    def calculate_priority_horizon(user, start_date=None, days=7):
+        """
+        Score a run of consecutive days in one pass.
+        
+        Returns a dict of date to that day's prioritized activities (highest
+        first); days without scheduled activities map to an empty list.
+        """
+        if start_date is None:
+            start_date = timezone.now().date()
+        dates = [start_date + timedelta(days=offset) for offset in range(days)]
+        
+        try:
+            scored_at = timezone.now()
+            horizon = PriorityEngine.calculate_horizon_for_users([user.id], dates).get(user.id, {})
+            PriorityEngine.clear_stale_marks([user.id], dates, scored_at)
+            return {target_date: horizon.get(target_date, []) for target_date in dates}
+        
+        except Exception as e:
+            logger.error(f"Error calculating priority horizon for user {user.id}: {str(e)}")
+            return {target_date: [] for target_date in dates}
+    
+    @staticmethod
+    def calculate_priorities_for_users(user_ids, target_date):
+        """
+        Score a shard of users for one day.
+        
+        Returns a dict of user id to that user's prioritized activities
+        (highest first).
+        """
+        horizon_by_user = PriorityEngine.calculate_horizon_for_users(user_ids, [target_date])
+        return {
+            user_id: horizon[target_date]
+            for user_id, horizon in horizon_by_user.items()
+            if target_date in horizon
+        }
+    
+    @staticmethod
+    def calculate_horizon_for_users(user_ids, dates):
+        """
+        Score a shard of users over several days in one sweep.
+        
+        Periods, activities and every scoring signal are loaded once for the
+        whole shard and date range in a fixed number of grouped queries; only
+        deadline urgency is re-derived per day. Scores are persisted with one
+        upsert and one bulk update. Returns a dict of user id to a dict of
+        date to prioritized activities (highest first).
+        """
+        periods_by_user = PriorityEngine._get_active_periods(user_ids)
+        if not periods_by_user:
+            return {}
+        
+        activities = PriorityEngine._get_range_activities(
+            periods_by_user.values(), dates
+        )
+        if not activities:
+            return {}
+        
+        signals_by_user = PriorityEngine._load_scoring_signals(periods_by_user, activities)
+        
+        period_by_id = {period.id: (user_id, period) for user_id, period in periods_by_user.items()}
+        activities_by_user_day = {}
+        for activity in activities:
+            user_id, period = period_by_id[activity.monk_mode_period_id]
+            activity_date = period.start_date + timedelta(days=activity.day_of_period - 1)
+            activities_by_user_day.setdefault((user_id, activity_date), []).append(activity)
+        
+        horizon_by_user = {}
+        for (user_id, activity_date), day_activities in activities_by_user_day.items():
+            horizon_by_user.setdefault(user_id, {})[activity_date] = PriorityEngine._score_activities(
+                day_activities, signals_by_user[user_id], activity_date
+            )
+        
+        PriorityEngine._persist_scores([
+            item
+            for horizon in horizon_by_user.values()
+            for prioritized in horizon.values()
+            for item in prioritized
+        ])
+        
+        # Sort by final score (highest first)
+        for horizon in horizon_by_user.values():
+            for prioritized in horizon.values():
+                prioritized.sort(key=lambda x: x['final_score'], reverse=True)
+        
+        return horizon_by_user
+    
+    @staticmethod
+    def mark_priorities_stale(user, target_date=None):
+        """Flag a user-day so the next incremental sweep rescores it"""
+        if target_date is None:
+            target_date = timezone.now().date()
+        
+        try:
+            # Re-marking refreshes marked_at so an in-flight sweep keeps the mark
+            StalePriorityDay.objects.bulk_create(
+                [StalePriorityDay(user=user, target_date=target_date)],
+                update_conflicts=True,
+                unique_fields=['user', 'target_date'],
+                update_fields=['marked_at']
+            )
+        except Exception as e:
+            logger.warning(f"Error marking priorities stale for user {user.id}: {str(e)}")
+    
+    @staticmethod
+    def get_stale_user_ids(target_date):
+        """Users whose priorities for target_date are waiting to be rescored"""
+        return list(StalePriorityDay.objects.filter(
+            target_date=target_date
+        ).order_by('user_id').values_list('user_id', flat=True))
+    
+    @staticmethod
+    def clear_stale_marks(user_ids, target_dates, scored_at):
+        """Drop marks settled by a sweep, keeping any re-marked after scored_at"""
+        StalePriorityDay.objects.filter(
+            user_id__in=user_ids,
+            target_date__in=target_dates,
+            marked_at__lte=scored_at
+        ).delete()
+    
+    @staticmethod
+    def _get_active_period(user):
+        """Get the active period of the user's active goal, or None"""
+        return PriorityEngine._get_active_periods([user.id]).get(user.id)
+    
+    @staticmethod
+    def _get_active_periods(user_ids):
+        """Map each user to the active period of their most recent active goal"""
+        goal_by_user = {}
+        for goal_id, user_id in MonkModeGoal.objects.filter(
+            user_id__in=user_ids,
+            current_status='active'
+        ).order_by('-created_at').values_list('id', 'user_id'):
+            goal_by_user.setdefault(user_id, goal_id)
+        
+        if not goal_by_user:
+            return {}
+        
+        period_by_goal = {}
+        for period in MonkModePeriod.objects.filter(
+            goal_id__in=goal_by_user.values(),
+            is_active=True
+        ).order_by('-created_at'):
+            period_by_goal.setdefault(period.goal_id, period)
+        
+        return {
+            user_id: period_by_goal[goal_id]
+            for user_id, goal_id in goal_by_user.items()
+            if goal_id in period_by_goal
+        }
+    
+    @staticmethod
+    def _get_range_activities(periods, dates):
+        """Load a date range's activities for many periods in one query"""
+        first_date, last_date = min(dates), max(dates)
+        wanted_dates = set(dates)
+        
+        # Periods sharing a start date share the same day_of_period range
+        period_ids_by_start = {}
+        for period in periods:
+            period_ids_by_start.setdefault(period.start_date, []).append(period.id)
+        
+        range_filter = Q()
+        for start_date, period_ids in period_ids_by_start.items():
+            range_filter |= Q(
+                monk_mode_period_id__in=period_ids,
+                day_of_period__range=(
+                    (first_date - start_date).days + 1,
+                    (last_date - start_date).days + 1
                 )
-                
-                if not created:
-                    priority_score.deadline_urgency = deadline_score
-                    priority_score.goal_impact = goal_impact_score
-                    priority_score.energy_requirement = energy_score
-                    priority_score.dependency_weight = dependency_score
-                    priority_score.user_preference = preference_score
-                    priority_score.momentum_factor = momentum_score
-                    priority_score.final_score = final_score
-                    priority_score.save()
-                
-                # Update activity priority score
-                activity.priority_score = final_score
-                activity.save()
-                
-                prioritized_activities.append({
-                    'activity': activity,
-                    'priority_score': priority_score,
-                    'final_score': final_score
-                })
+            )
+        
+        start_by_period = {period.id: period.start_date for period in periods}
+        return [
+            activity
+            for activity in ScheduledActivity.objects.filter(range_filter).select_related('activity_type')
+            if start_by_period[activity.monk_mode_period_id]
+            + timedelta(days=activity.day_of_period - 1) in wanted_dates
+        ]
+    
+    @staticmethod
+    def _load_scoring_signals(periods_by_user, activities):
+        """Load all user-level scoring inputs for a shard, keyed by user id"""
+        user_ids = list(periods_by_user)
+        activity_type_ids = {activity.activity_type_id for activity in activities}
+        now = timezone.now()
+        
+        signals = {
+            user_id: {
+                'nearest_deadline': None,
+                'dependency_graph': None,
+                'energy_profile': None,
+                'pattern_energy': {},
+                'type_performance': {},
+                'completion_counts': {},
+                'recent_by_type': {},
+                'recent_by_name': {},
+            }
+            for user_id in user_ids
+        }
+        
+        # Nearest open deadline on each user's goal
+        user_by_goal = {period.goal_id: user_id for user_id, period in periods_by_user.items()}
+        for row in MonkModeObjective.objects.filter(
+            goal_id__in=user_by_goal,
+            due_date__isnull=False,
+            is_completed=False
+        ).order_by().values('goal_id').annotate(nearest=Min('due_date')):
+            signals[user_by_goal[row['goal_id']]]['nearest_deadline'] = row['nearest']
+        
+        # Objective dependency graphs per goal, served from cache where possible
+        for goal_id, graph in DependencyGraphService.get_graphs(list(user_by_goal)).items():
+            signals[user_by_goal[goal_id]]['dependency_graph'] = graph
+        
+        # Hour-of-day energy profiles, served from cache where possible
+        for user_id, profile in EnergyProfileService.get_profiles(user_ids).items():
+            signals[user_id]['energy_profile'] = profile
+        
+        # Productivity patterns, folded per hour (energy) and per type (performance)
+        pattern_energy_totals = {}
+        type_performance_totals = {}
+        for row in UserProductivityPattern.objects.filter(user_id__in=user_ids).values(
+            'user_id', 'hour_of_day', 'activity_type_id', 'energy_level', 'average_performance'
+        ):
+            hour_total = pattern_energy_totals.setdefault(
+                (row['user_id'], row['hour_of_day']), [0.0, 0]
+            )
+            hour_total[0] += row['energy_level']
+            hour_total[1] += 1
+            
+            type_total = type_performance_totals.setdefault(
+                (row['user_id'], row['activity_type_id']), [0.0, 0]
+            )
+            type_total[0] += row['average_performance']
+            type_total[1] += 1
+        
+        for (user_id, hour), (total, count) in pattern_energy_totals.items():
+            signals[user_id]['pattern_energy'][hour] = total / count
+        for (user_id, type_id), (total, count) in type_performance_totals.items():
+            signals[user_id]['type_performance'][type_id] = total / count
+        
+        # Historical completion counts per activity type, from the rollup
+        for row in ActivityCompletionStats.objects.filter(
+            user_id__in=user_ids,
+            activity_type_id__in=activity_type_ids
+        ).values('user_id', 'activity_type_id', 'completed_count', 'scheduled_count'):
+            signals[row['user_id']]['completion_counts'][row['activity_type_id']] = (
+                row['completed_count'], row['scheduled_count']
+            )
+        
+        # Completions in the last two days, for momentum
+        for row in ScheduledActivity.objects.filter(
+            monk_mode_period__goal__user_id__in=user_ids,
+            completed_at__gte=now - timedelta(days=2),
+            is_completed=True
+        ).order_by().values(
+            'monk_mode_period__goal__user_id', 'activity_type_id', 'activity_type__name'
+        ).annotate(count=Count('id')):
+            user_signals = signals[row['monk_mode_period__goal__user_id']]
+            user_signals['recent_by_type'][row['activity_type_id']] = row['count']
+            user_signals['recent_by_name'][row['activity_type__name']] = row['count']
+        
+        return signals
+    
+    @staticmethod
+    def _score_activities(activities, signals, target_date):
+        """Score activities in memory against preloaded signals"""
+        weights = PriorityEngine.WEIGHTS
+        deadline_score = PriorityEngine._calculate_deadline_urgency(
+            signals['nearest_deadline'], target_date
+        )
+        
+        prioritized_activities = []
+        
+        # Energy effect of what is scheduled before each activity
+        effect_by_activity = ScheduleContextService.preceding_effects(
+            ScheduleContextService.build_intervals({target_date: activities})
+        )
+        
+        for activity in activities:
+            # Calculate individual factor scores
+            goal_impact_score = PriorityEngine._calculate_goal_impact(activity)
+            energy_score = PriorityEngine._calculate_energy_alignment(
+                activity, signals, effect_by_activity.get(activity.id, 0.0)
+            )
+            dependency_score = PriorityEngine._calculate_dependency_weight(activity, signals)
+            preference_score = PriorityEngine._calculate_user_preference(activity, signals)
+            momentum_score = PriorityEngine._calculate_momentum_factor(activity, signals)
             
-            # Sort by final score (highest first)
-            prioritized_activities.sort(key=lambda x: x['final_score'], reverse=True)
+            # Calculate final weighted score
+            final_score = (
+                deadline_score * weights['deadline_urgency'] +
+                goal_impact_score * weights['goal_impact'] +
+                energy_score * weights['energy_alignment'] +
+                dependency_score * weights['dependency_weight'] +
+                preference_score * weights['user_preference'] +
+                momentum_score * weights['momentum_factor']
+            )
             
-            return prioritized_activities
+            priority_score = TaskPriorityScore(
+                scheduled_activity=activity,
+                deadline_urgency=deadline_score,
+                goal_impact=goal_impact_score,
+                energy_requirement=energy_score,
+                dependency_weight=dependency_score,
+                user_preference=preference_score,
+                momentum_factor=momentum_score,
+                final_score=final_score
+            )
             
-        except Exception as e:
-            logger.error(f"Error calculating daily priorities for user {user.id}: {str(e)}")
-            return []
+            activity.priority_score = final_score
+            
+            prioritized_activities.append({
+                'activity': activity,
+                'priority_score': priority_score,
+                'final_score': final_score
+            })
+        
+        return prioritized_activities
+    
+    @staticmethod
+    def _persist_scores(prioritized_activities):
+        """Write scores back with one upsert and one bulk update"""
+        if not prioritized_activities:
+            return
+        
+        with transaction.atomic():
+            TaskPriorityScore.objects.bulk_create(
+                [item['priority_score'] for item in prioritized_activities],
+                batch_size=PriorityEngine.WRITE_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['scheduled_activity'],
+                update_fields=PriorityEngine.SCORE_FIELDS + ['calculated_at']
+            )
+            ScheduledActivity.objects.bulk_update(
+                [item['activity'] for item in prioritized_activities],
+                ['priority_score'],
+                batch_size=PriorityEngine.WRITE_BATCH_SIZE
+            )
     
     @staticmethod
-    def _calculate_deadline_urgency(activity, target_date):
-        """Calculate urgency based on deadlines (0.0 - 1.0)"""
+    def _calculate_deadline_urgency(nearest_deadline, target_date):
+        """Calculate urgency based on the goal's nearest open deadline (0.0 - 1.0)"""
         try:
-            # Get related objectives with deadlines
-            goal = activity.monk_mode_period.goal
-            objectives_with_deadlines = goal.objectives.filter(
-                due_date__isnull=False,
-                is_completed=False
-            ).order_by('due_date')
-            
-            if not objectives_with_deadlines.exists():
+            if nearest_deadline is None:
                 return 0.5  # Neutral score if no deadlines
             
-            # Find the most urgent deadline
-            nearest_deadline = objectives_with_deadlines.first().due_date
             days_until_deadline = (nearest_deadline - target_date).days
             
             if days_until_deadline <= 0:
@@ -146,7 +564,7 @@ class PriorityEngine:
                 return 0.4  # Some urgency (due within 2 weeks)
             else:
                 return 0.2  # Low urgency (due later)
-                
+        
         except Exception as e:
             logger.error(f"Error calculating deadline urgency: {str(e)}")
             return 0.5
@@ -174,19 +592,27 @@ class PriorityEngine:
             # Everything else
             else:
                 return 0.5
-                
+        
         except Exception as e:
             logger.error(f"Error calculating goal impact: {str(e)}")
             return 0.5
     
     @staticmethod
-    def _calculate_energy_alignment(activity, user, target_date):
-        """Calculate how well activity aligns with user's energy patterns (0.0 - 1.0)"""
+    def _calculate_energy_alignment(activity, signals, schedule_effect=0.0):
+        """
+        Calculate how well activity aligns with user's energy patterns (0.0 - 1.0).
+        
+        The predicted energy at the activity's start is shifted by
+        schedule_effect, the summed effect of activities that started before
+        it within ScheduleContextService.LOOKBACK (e.g. +1 after exercise),
+        and clamped to the 1-10 scale. Activities starting at the same time
+        don't affect each other.
+        """
         try:
-            # Get user's energy prediction for this time
-            predicted_energy = PriorityEngine._predict_user_energy(
-                user, target_date, activity.start_time
-            )
+            # Get user's energy prediction for this time, adjusted for what is scheduled before it
+            predicted_energy = max(1.0, min(10.0, PriorityEngine._predict_energy_from_signals(
+                signals, activity.start_time.hour
+            ) + schedule_effect))
             
             # Get activity's energy requirement
             required_energy = activity.energy_required
@@ -201,11 +627,25 @@ class PriorityEngine:
                 energy_deficit = required_energy - predicted_energy
                 penalty = energy_deficit / 10.0
                 return max(0.1, 0.5 - penalty)  # Penalize energy mismatches
-                
+        
         except Exception as e:
             logger.error(f"Error calculating energy alignment: {str(e)}")
             return 0.5
     
+    @staticmethod
+    def _predict_energy_from_signals(signals, hour):
+        """Predict energy for an hour from preloaded signals"""
+        profile_energy = EnergyProfileService.energy_at(signals['energy_profile'], hour)
+        if profile_energy is not None:
+            return profile_energy
+        
+        # Fallback to general energy patterns if no specific data
+        if signals['pattern_energy'].get(hour):
+            return signals['pattern_energy'][hour]
+        
+        # Default energy pattern if no data available
+        return PriorityEngine._get_default_energy_pattern(hour)
+    
     @staticmethod
     def _predict_user_energy(user, date, time):
         """Predict user's energy level at specific date/time"""
@@ -213,14 +653,11 @@ class PriorityEngine:
             hour = time.hour
             
             # Get historical energy data for this hour
-            energy_logs = EnergyLog.objects.filter(
-                user=user,
-                timestamp__hour=hour,
-                timestamp__gte=timezone.now() - timedelta(days=30)
+            avg_energy = EnergyProfileService.energy_at(
+                EnergyProfileService.get_profile(user), hour
             )
             
-            if energy_logs.exists():
-                avg_energy = energy_logs.aggregate(avg=Avg('energy_level'))['avg']
+            if avg_energy is not None:
                 return avg_energy
             
             # Fallback to general energy patterns if no specific data
@@ -234,7 +671,7 @@ class PriorityEngine:
             
             # Default energy pattern if no data available
             return PriorityEngine._get_default_energy_pattern(hour)
-            
+        
         except Exception as e:
             logger.error(f"Error predicting user energy: {str(e)}")
             return 5.0  # Default energy level
@@ -256,16 +693,20 @@ class PriorityEngine:
             return 4.0  # Night/very early morning
     
     @staticmethod
-    def _calculate_dependency_weight(activity):
+    def _calculate_dependency_weight(activity, signals):
         """Calculate weight based on task dependencies (0.0 - 1.0)"""
         try:
-            # Check if this activity blocks other tasks
-            goal = activity.monk_mode_period.goal
+            graph = signals['dependency_graph']
             
-            # Look for objectives that might depend on this activity
-            # This is a simplified version - in a more complex system,
-            # you'd have explicit dependency mapping
+            if graph and graph['has_dependencies']:
+                # Goal work is what unblocks waiting objectives: the larger the
+                # share of open objectives stuck behind prerequisites, the more
+                # that work matters today
+                if PriorityEngine._calculate_goal_impact(activity) >= 0.8:
+                    return 0.5 + 0.5 * DependencyGraphService.blocking_pressure(graph)
+                return 0.5
             
+            # No modeled dependencies on this goal - infer from the description
             activity_description = activity.description.lower()
             
             # Activities that typically block others get higher priority
@@ -288,67 +729,46 @@ class PriorityEngine:
                     return 0.3
             
             return 0.5  # Neutral dependency weight
-            
+        
         except Exception as e:
             logger.error(f"Error calculating dependency weight: {str(e)}")
             return 0.5
     
     @staticmethod
-    def _calculate_user_preference(activity, user):
+    def _calculate_user_preference(activity, signals):
         """Calculate user preference based on historical performance (0.0 - 1.0)"""
         try:
             # Get user's historical performance with this activity type
-            productivity_patterns = UserProductivityPattern.objects.filter(
-                user=user,
-                activity_type=activity.activity_type
-            )
+            avg_performance = signals['type_performance'].get(activity.activity_type_id)
             
-            if productivity_patterns.exists():
-                avg_performance = productivity_patterns.aggregate(
-                    avg=Avg('average_performance')
-                )['avg']
+            if avg_performance is not None:
                 return min(1.0, max(0.0, avg_performance))
             
             # Check completion rates for similar activities
-            similar_activities = ScheduledActivity.objects.filter(
-                monk_mode_period__goal__user=user,
-                activity_type=activity.activity_type,
-                is_completed=True
+            completed, total_similar = signals['completion_counts'].get(
+                activity.activity_type_id, (0, 0)
             )
             
-            total_similar = ScheduledActivity.objects.filter(
-                monk_mode_period__goal__user=user,
-                activity_type=activity.activity_type
-            ).count()
-            
             if total_similar > 0:
-                completion_rate = similar_activities.count() / total_similar
+                completion_rate = completed / total_similar
                 return completion_rate
             
             return 0.5  # Neutral preference if no history
-            
+        
         except Exception as e:
             logger.error(f"Error calculating user preference: {str(e)}")
             return 0.5
     
     @staticmethod
-    def _calculate_momentum_factor(activity, user):
+    def _calculate_momentum_factor(activity, signals):
         """Calculate momentum bonus for continuing similar work (0.0 - 1.0)"""
         try:
             # Check recent activity completions
-            recent_activities = ScheduledActivity.objects.filter(
-                monk_mode_period__goal__user=user,
-                completed_at__gte=timezone.now() - timedelta(days=2),
-                is_completed=True
-            ).order_by('-completed_at')
-            
-            if not recent_activities.exists():
+            if not signals['recent_by_type']:
                 return 0.5
             
             # Check for similar activity types in recent completions
-            same_type_recent = recent_activities.filter(
-                activity_type=activity.activity_type
-            ).count()
+            same_type_recent = signals['recent_by_type'].get(activity.activity_type_id, 0)
             
             if same_type_recent > 0:
                 # Bonus for continuing similar work
@@ -360,15 +780,15 @@ class PriorityEngine:
                 activity.activity_type.name
             )
             
-            complementary_recent = recent_activities.filter(
-                activity_type__name__in=complementary_types
-            ).count()
+            complementary_recent = sum(
+                signals['recent_by_name'].get(name, 0) for name in complementary_types
+            )
             
             if complementary_recent > 0:
                 return 0.6  # Small bonus for complementary momentum
             
             return 0.4  # Slight penalty for context switching
-            
+        
         except Exception as e:
             logger.error(f"Error calculating momentum factor: {str(e)}")
             return 0.5
@@ -392,7 +812,8 @@ class PriorityEngine:
     def get_focus_recommendations(user, target_date=None):
         """Get intelligent focus recommendations for the user"""
         try:
-            prioritized_activities = PriorityEngine.calculate_daily_priorities(user, target_date)
+            # Read path: reuse stored scores while fresh instead of rewriting them
+            prioritized_activities = PriorityEngine.get_daily_priorities(user, target_date)
             
             if not prioritized_activities:
                 return {
@@ -418,7 +839,7 @@ class PriorityEngine:
                 'recommendations': recommendations,
                 'generated_at': timezone.now()
             }
-            
+        
         except Exception as e:
             logger.error(f"Error getting focus recommendations: {str(e)}")
             return {
@@ -495,55 +916,225 @@ class PriorityEngine:
         return recommendations
     
     @staticmethod
-    def update_productivity_patterns(user):
-        """Update user's productivity patterns based on completed activities"""
+    def record_activities_scheduled(user, activity_type_counts):
+        """Add newly scheduled activities ({activity_type_id: count}) to the completion rollup"""
         try:
-            # Get completed activities from the last 30 days
-            completed_activities = ScheduledActivity.objects.filter(
-                monk_mode_period__goal__user=user,
-                is_completed=True,
-                completed_at__gte=timezone.now() - timedelta(days=30)
+            ActivityCompletionStats.objects.bulk_create(
+                [
+                    ActivityCompletionStats(user=user, activity_type_id=activity_type_id)
+                    for activity_type_id in activity_type_counts
+                ],
+                ignore_conflicts=True
             )
             
-            patterns_updated = 0
+            for activity_type_id, count in activity_type_counts.items():
+                ActivityCompletionStats.objects.filter(
+                    user=user,
+                    activity_type_id=activity_type_id
+                ).update(
+                    scheduled_count=F('scheduled_count') + count,
+                    last_updated=timezone.now()
+                )
+        
+        except Exception as e:
+            logger.warning(f"Error recording scheduled activities for user {user.id}: {str(e)}")
+    
+    @staticmethod
+    def record_activity_completed(user, activity):
+        """Count a newly completed activity in the completion rollup"""
+        try:
+            updated = ActivityCompletionStats.objects.filter(
+                user=user,
+                activity_type_id=activity.activity_type_id
+            ).update(
+                completed_count=F('completed_count') + 1,
+                last_updated=timezone.now()
+            )
             
-            for activity in completed_activities:
-                if not activity.completed_at:
-                    continue
+            if not updated:
+                # No rollup row yet for this type; seed it from the activities table
+                PriorityEngine.rebuild_completion_stats(user)
+        
+        except Exception as e:
+            logger.warning(f"Error recording activity completion for user {user.id}: {str(e)}")
+    
+    @staticmethod
+    def record_activity_uncompleted(activity):
+        """Take an activity that is no longer completed out of the completed count"""
+        PriorityEngine._discount_completion_stats(activity, scheduled=0, completed=1)
+    
+    @staticmethod
+    def record_activity_deleted(activity):
+        """Take a deleted activity out of the completion rollup; call before the row goes"""
+        PriorityEngine._discount_completion_stats(
+            activity, scheduled=1, completed=1 if activity.is_completed else 0
+        )
+    
+    @staticmethod
+    def _discount_completion_stats(activity, scheduled, completed):
+        """Decrement the activity's rollup row, never below zero"""
+        try:
+            # The owner is resolved in the same UPDATE, so no extra queries per activity
+            owner = ScheduledActivity.objects.filter(pk=activity.pk).values(
+                'monk_mode_period__goal__user_id'
+            )[:1]
+            ActivityCompletionStats.objects.filter(
+                user_id=Subquery(owner),
+                activity_type_id=activity.activity_type_id
+            ).update(
+                scheduled_count=Greatest(F('scheduled_count') - scheduled, 0),
+                completed_count=Greatest(F('completed_count') - completed, 0),
+                last_updated=timezone.now()
+            )
+        
+        except Exception as e:
+            logger.warning(f"Error discounting activity {activity.pk} from completion stats: {str(e)}")
+    
+    @staticmethod
+    def rebuild_completion_stats(user):
+        """Recount the user's completion rollup from their scheduled activities"""
+        rows = ScheduledActivity.objects.filter(
+            monk_mode_period__goal__user=user
+        ).order_by().values('activity_type_id').annotate(
+            scheduled=Count('id'),
+            completed=Count('id', filter=Q(is_completed=True))
+        )
+        
+        ActivityCompletionStats.objects.bulk_create(
+            [
+                ActivityCompletionStats(
+                    user=user,
+                    activity_type_id=row['activity_type_id'],
+                    scheduled_count=row['scheduled'],
+                    completed_count=row['completed']
+                )
+                for row in rows
+            ],
+            update_conflicts=True,
+            unique_fields=['user', 'activity_type'],
+            update_fields=['scheduled_count', 'completed_count', 'last_updated']
+        )
+    
+    @staticmethod
+    def update_productivity_patterns(user):
+        """
+        Fold completions newer than the user's watermark into their productivity
+        patterns. Each completion is counted exactly once, so work per call is
+        proportional to new completions rather than history.
+        
+        The watermark is the latest folded completed_at. Completions committed
+        a little late with an earlier timestamp are still picked up: each run
+        rereads PATTERN_WATERMARK_OVERLAP before the watermark and skips the
+        activities already folded there, whose ids the watermark keeps.
+        """
+        try:
+            with transaction.atomic():
+                # Row lock serialises concurrent updates for the same user
+                watermark, _ = ProductivityPatternWatermark.objects.select_for_update().get_or_create(
+                    user=user
+                )
                 
-                hour = activity.completed_at.hour
-                activity_type = activity.activity_type
+                completed_activities = ScheduledActivity.objects.filter(
+                    monk_mode_period__goal__user=user,
+                    is_completed=True,
+                    completed_at__isnull=False
+                )
                 
-                # Calculate performance score based on completion quality and timing
-                performance_score = PriorityEngine._calculate_performance_score(activity)
+                already_folded = set(watermark.overlap_activity_ids)
+                if watermark.processed_through:
+                    completed_activities = completed_activities.filter(
+                        completed_at__gt=watermark.processed_through - PriorityEngine.PATTERN_WATERMARK_OVERLAP
+                    )
+                else:
+                    # First run: seed from the last 30 days
+                    completed_activities = completed_activities.filter(
+                        completed_at__gte=timezone.now() - timedelta(days=30)
+                    )
                 
-                # Get or create productivity pattern
-                pattern, created = UserProductivityPattern.objects.get_or_create(
-                    user=user,
-                    hour_of_day=hour,
-                    activity_type=activity_type,
-                    defaults={
-                        'average_performance': performance_score,
-                        'energy_level': activity.energy_required,
-                        'completion_rate': 1.0,
-                        'sample_size': 1
-                    }
-                )
+                completed_activities = completed_activities.annotate(
+                    hour=ExtractHour('completed_at')
+                ).only(
+                    'activity_type_id', 'completed_at', 'completion_quality', 'duration_minutes',
+                    'actual_start_time', 'actual_end_time', 'energy_required'
+                ).order_by()
                 
-                if not created:
-                    # Update existing pattern using weighted average
-                    total_samples = pattern.sample_size + 1
-                    pattern.average_performance = (
-                        (pattern.average_performance * pattern.sample_size + performance_score) / total_samples
+                # Group new completions by (hour, activity type)
+                groups = {}
+                processed_through = watermark.processed_through
+                completions = 0
+                read_completions = []
+                for activity in completed_activities:
+                    read_completions.append((activity.id, activity.completed_at))
+                    if activity.id in already_folded:
+                        continue
+                    
+                    group = groups.setdefault(
+                        (activity.hour, activity.activity_type_id), [0.0, 0.0, 0]
                     )
-                    pattern.sample_size = total_samples
-                    pattern.save()
+                    group[0] += PriorityEngine._calculate_performance_score(activity)
+                    group[1] += activity.energy_required
+                    group[2] += 1
+                    completions += 1
+                    if processed_through is None or activity.completed_at > processed_through:
+                        processed_through = activity.completed_at
                 
-                patterns_updated += 1
-            
-            logger.info(f"Updated {patterns_updated} productivity patterns for user {user.id}")
-            return patterns_updated
+                if not groups:
+                    return 0
+                
+                existing_patterns = {
+                    (pattern.hour_of_day, pattern.activity_type_id): pattern
+                    for pattern in UserProductivityPattern.objects.filter(
+                        user=user,
+                        hour_of_day__in={hour for hour, _ in groups},
+                        activity_type_id__in={activity_type_id for _, activity_type_id in groups}
+                    )
+                }
+                
+                patterns = []
+                for (hour, activity_type_id), (performance_total, energy_total, count) in groups.items():
+                    pattern = existing_patterns.get((hour, activity_type_id))
+                    
+                    if pattern is None:
+                        pattern = UserProductivityPattern(
+                            user=user,
+                            hour_of_day=hour,
+                            activity_type_id=activity_type_id,
+                            average_performance=performance_total / count,
+                            energy_level=energy_total / count,
+                            completion_rate=1.0,
+                            sample_size=count
+                        )
+                    else:
+                        # Update existing pattern using weighted average
+                        total_samples = pattern.sample_size + count
+                        pattern.average_performance = (
+                            (pattern.average_performance * pattern.sample_size + performance_total) / total_samples
+                        )
+                        pattern.energy_level = (
+                            (pattern.energy_level * pattern.sample_size + energy_total) / total_samples
+                        )
+                        pattern.sample_size = total_samples
+                    
+                    patterns.append(pattern)
+                
+                UserProductivityPattern.objects.bulk_create(
+                    patterns,
+                    update_conflicts=True,
+                    unique_fields=['user', 'hour_of_day', 'activity_type'],
+                    update_fields=['average_performance', 'energy_level', 'sample_size', 'last_updated']
+                )
+                
+                watermark.processed_through = processed_through
+                watermark.overlap_activity_ids = [
+                    activity_id
+                    for activity_id, completed_at in read_completions
+                    if completed_at > processed_through - PriorityEngine.PATTERN_WATERMARK_OVERLAP
+                ]
+                watermark.save()
             
+            logger.info(f"Folded {completions} completions into {len(patterns)} productivity patterns for user {user.id}")
+            return completions
+        
         except Exception as e:
             logger.error(f"Error updating productivity patterns: {str(e)}")
             return 0
@@ -571,7 +1162,7 @@ class PriorityEngine:
                         score -= 0.2
             
             return max(0.0, min(1.0, score))
-            
+        
         except Exception as e:
             logger.error(f"Error calculating performance score: {str(e)}")
             return 0.5
\ No newline at end of file
@@ -0,0 +1,104 @@
+from django.utils import timezone
+from datetime import datetime, timedelta
+
+class ScheduleContextService:
+    """
+    Energy effects of scheduled activities, computed from a preloaded
+    interval list instead of per-hour queries.
+    
+    A day's activities become (start, end, effect, activity_id, is_break)
+    tuples sorted by start. An activity affects energy at a moment when it
+    overlaps the two hours leading up to it, so the effects for any number of
+    moments come from a single sweep over the intervals.
+    """
+    
+    LOOKBACK = timedelta(hours=2)
+    REST_ACTIVITIES = ['break', 'mindfulness', 'meditation']
+    
+    @staticmethod
+    def activity_effect(activity_name):
+        """Energy points an activity adds (or drains) in the hours after it"""
+        name = activity_name.lower()
+        
+        # Exercise typically boosts energy for a few hours
+        if 'exercise' in name:
+            return 1.0
+        
+        # Deep work can be draining
+        elif 'deep work' in name:
+            return -0.5
+        
+        # Rest activities restore energy
+        elif name in ScheduleContextService.REST_ACTIVITIES:
+            return 0.5
+        
+        return 0.0
+    
+    @staticmethod
+    def build_intervals(day_schedules):
+        """Interval list for {date: [activities]}, sorted by start"""
+        intervals = []
+        for day, activities in day_schedules.items():
+            for activity in activities:
+                start = timezone.make_aware(datetime.combine(day, activity.start_time))
+                end = timezone.make_aware(datetime.combine(day, activity.end_time))
+                if end < start:  # Runs past midnight
+                    end += timedelta(days=1)
+                
+                name = activity.activity_type.name
+                intervals.append((
+                    start,
+                    end,
+                    ScheduleContextService.activity_effect(name),
+                    activity.id,
+                    'break' in name.lower()
+                ))
+        
+        intervals.sort(key=lambda interval: interval[0])
+        return intervals
+    
+    @staticmethod
+    def schedule_effects(intervals, moments):
+        """Summed activity effect at each moment, keyed by moment"""
+        effects = {}
+        active = []
+        position = 0
+        
+        for moment in sorted(moments):
+            # Activities that have started by this moment...
+            while position < len(intervals) and intervals[position][0] <= moment:
+                active.append(intervals[position])
+                position += 1
+            
+            # ...and had not ended before its lookback window opened
+            window_start = moment - ScheduleContextService.LOOKBACK
+            active = [interval for interval in active if interval[1] >= window_start]
+            effects[moment] = sum(interval[2] for interval in active)
+        
+        return effects
+    
+    @staticmethod
+    def preceding_effects(intervals):
+        """
+        Effect on each activity of the ones started before it, keyed by
+        activity id. Activities starting at the same moment run in parallel,
+        so neither counts toward the other (nor does an activity count itself).
+        """
+        effects = ScheduleContextService.schedule_effects(
+            intervals, [interval[0] for interval in intervals]
+        )
+        starting_effects = {}
+        for start, _, effect, _, _ in intervals:
+            starting_effects[start] = starting_effects.get(start, 0.0) + effect
+        return {
+            activity_id: effects[start] - starting_effects[start]
+            for start, _, _, activity_id, _ in intervals
+        }
+    
+    @staticmethod
+    def has_break_between(intervals, start, end):
+        """Whether a break activity starts within [start, end]"""
+        return any(
+            is_break and start <= interval_start <= end
+            for interval_start, _, _, _, is_break in intervals
+        )
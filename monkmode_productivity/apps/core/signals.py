@@ -0,0 +1,36 @@
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from apps.core.models import MonkModeObjective, ScheduledActivity
+from apps.core.services.dependency_graph import DependencyGraphService
+from apps.core.services.priority_engine import PriorityEngine
+
+@receiver(m2m_changed, sender=MonkModeObjective.dependencies.through)
+def invalidate_graph_on_dependency_change(sender, instance, action, **kwargs):
+    """Rebuild the goal's dependency graph after edges are added or removed"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        DependencyGraphService.invalidate(instance.goal_id)
+
+@receiver(post_save, sender=MonkModeObjective)
+@receiver(post_delete, sender=MonkModeObjective)
+def invalidate_graph_on_objective_change(sender, instance, **kwargs):
+    """Objectives joining, leaving or completing change the goal's graph"""
+    DependencyGraphService.invalidate(instance.goal_id)
+
+@receiver(post_init, sender=ScheduledActivity)
+def remember_completion_state(sender, instance, **kwargs):
+    """Keep the loaded completion flag so saves can spot an un-completion"""
+    # Read from __dict__ so deferred loads don't fetch the field
+    instance._loaded_is_completed = instance.__dict__.get('is_completed')
+
+@receiver(post_save, sender=ScheduledActivity)
+def discount_uncompleted_activity(sender, instance, created, **kwargs):
+    """An activity saved as no longer completed leaves the completed count"""
+    if not created and instance._loaded_is_completed and not instance.is_completed:
+        PriorityEngine.record_activity_uncompleted(instance)
+    instance._loaded_is_completed = instance.is_completed
+
+@receiver(pre_delete, sender=ScheduledActivity)
+def discount_deleted_activity(sender, instance, **kwargs):
+    """Deleted activities leave the completion rollup"""
+    # pre_delete, because a cascade may already have removed the period and goal by post_delete
+    PriorityEngine.record_activity_deleted(instance)
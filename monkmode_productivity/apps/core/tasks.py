@@ -85,33 +85,128 @@ def deliver_scheduled_letters():
         return f"Error: {str(e)}"
 
 @shared_task
-def generate_daily_energy_predictions():
-    """Generate energy predictions for all active users"""
+def generate_daily_energy_predictions(chunk_size=1000):
+    """Fan energy predictions for all active users out over chunked worker tasks"""
     try:
-        from apps.core.services.energy_service import EnergyManagementService
-        from apps.core.models import MonkModeGoal
-        
-        predictions_generated = 0
+        from celery import group
         
         # Get users with active goals
-        active_users = User.objects.filter(
+        active_user_ids = list(User.objects.filter(
             monk_mode_goals__current_status='active'
-        ).distinct()
+        ).distinct().order_by('id').values_list('id', flat=True))
+        
+        chunks = [
+            active_user_ids[offset:offset + chunk_size]
+            for offset in range(0, len(active_user_ids), chunk_size)
+        ]
+        if chunks:
+            group(generate_energy_predictions_chunk.s(chunk) for chunk in chunks).apply_async()
+        
+        logger.info(f"Dispatched energy predictions for {len(active_user_ids)} users in {len(chunks)} chunks")
+        return f"Dispatched energy predictions for {len(active_user_ids)} users in {len(chunks)} chunks"
         
-        for user in active_users:
+    except Exception as e:
+        logger.error(f"Error in generate_daily_energy_predictions: {str(e)}")
+        return f"Error: {str(e)}"
+
+@shared_task
+def generate_energy_predictions_chunk(user_ids, hours_ahead=24):
+    """Generate energy predictions for one chunk of users with a single bulk write"""
+    try:
+        from apps.core.services.energy_service import EnergyManagementService
+        
+        predictions_by_user = EnergyManagementService.predict_energy_levels_for_users(
+            user_ids, hours_ahead=hours_ahead
+        )
+        predictions_generated = sum(len(predictions) for predictions in predictions_by_user.values())
+        
+        logger.info(f"Generated {predictions_generated} energy predictions for {len(user_ids)} users")
+        return f"Generated {predictions_generated} energy predictions"
+        
+    except Exception as e:
+        logger.error(f"Error in generate_energy_predictions_chunk starting at user {user_ids[0] if user_ids else None}: {str(e)}")
+        return f"Error: {str(e)}"
+
+@shared_task
+def backfill_prediction_accuracy():
+    """Score recent energy predictions against the readings users logged"""
+    try:
+        from apps.core.services.prediction_accuracy import PredictionAccuracyService
+        
+        predictions_scored = PredictionAccuracyService.backfill()
+        
+        logger.info(f"Scored {predictions_scored} energy predictions against logged readings")
+        return f"Scored {predictions_scored} energy predictions against logged readings"
+        
+    except Exception as e:
+        logger.error(f"Error in backfill_prediction_accuracy: {str(e)}")
+        return f"Error: {str(e)}"
+
+@shared_task
+def fit_circadian_models(shard_size=500):
+    """Refit harmonic energy models for users who logged energy recently"""
+    try:
+        from apps.core.services.circadian_model import CircadianModelService
+        from apps.core.models import EnergyLog
+        
+        models_fitted = 0
+        
+        # Users with a reading in the last day have new data to fit
+        recent_user_ids = list(EnergyLog.objects.filter(
+            timestamp__gte=timezone.now() - timedelta(days=1)
+        ).order_by('user_id').values_list('user_id', flat=True).distinct())
+        
+        for offset in range(0, len(recent_user_ids), shard_size):
+            shard = recent_user_ids[offset:offset + shard_size]
             try:
-                predictions = EnergyManagementService.predict_energy_levels(user, hours_ahead=24)
-                if predictions:
-                    predictions_generated += len(predictions)
+                models_fitted += CircadianModelService.fit_users(shard)
             except Exception as e:
-                logger.warning(f"Failed to generate predictions for user {user.id}: {str(e)}")
+                logger.warning(f"Failed to fit circadian models for shard starting at user {shard[0]}: {str(e)}")
                 continue
         
-        logger.info(f"Generated {predictions_generated} energy predictions")
-        return f"Generated {predictions_generated} energy predictions"
+        logger.info(f"Fitted circadian models for {models_fitted} users")
+        return f"Fitted circadian models for {models_fitted} users"
         
     except Exception as e:
-        logger.error(f"Error in generate_daily_energy_predictions: {str(e)}")
+        logger.error(f"Error in fit_circadian_models: {str(e)}")
+        return f"Error: {str(e)}"
+
+@shared_task
+def rollup_energy_logs():
+    """Compact aged energy logs into hourly and then daily rollups"""
+    try:
+        from apps.core.services.energy_rollup import EnergyRollupService
+        
+        compacted = EnergyRollupService.compact()
+        
+        logger.info(
+            f"Rolled up {compacted['logs']} energy logs and "
+            f"{compacted['hourly_rollups']} hourly rollups"
+        )
+        return (
+            f"Rolled up {compacted['logs']} energy logs and "
+            f"{compacted['hourly_rollups']} hourly rollups"
+        )
+        
+    except Exception as e:
+        logger.error(f"Error in rollup_energy_logs: {str(e)}")
+        return f"Error: {str(e)}"
+
+@shared_task
+def process_ai_chat_turn(turn_id, user_id, goal_id, message_text):
+    """Stream the reply to one AI chat message into its turn state"""
+    try:
+        from apps.core.services.chat_stream import ChatStreamService
+        
+        state = ChatStreamService.run_turn(turn_id, user_id, goal_id, message_text)
+        return f"AI chat turn {turn_id} finished: {state['status']}"
+        
+    except Exception as e:
+        logger.error(f"Error in process_ai_chat_turn: {str(e)}")
+        try:
+            ChatStreamService.fail_turn(turn_id, user_id)
+        except Exception:
+            pass
         return f"Error: {str(e)}"
 
 @shared_task
@@ -120,7 +215,7 @@ def update_productivity_patterns():
     try:
         from apps.core.services.priority_engine import PriorityEngine
         
-        patterns_updated = 0
+        completions_folded = 0
         
         # Get users with completed activities in the last 30 days
         recent_date = timezone.now() - timedelta(days=30)
@@ -131,19 +226,45 @@ def update_productivity_patterns():
         
         for user in users_with_activities:
             try:
-                updated = PriorityEngine.update_productivity_patterns(user)
-                patterns_updated += updated
+                # Only completions newer than the user's watermark are processed
+                completions_folded += PriorityEngine.update_productivity_patterns(user)
             except Exception as e:
                 logger.warning(f"Failed to update patterns for user {user.id}: {str(e)}")
                 continue
         
-        logger.info(f"Updated {patterns_updated} productivity patterns")
-        return f"Updated {patterns_updated} productivity patterns"
+        logger.info(f"Folded {completions_folded} new completions into productivity patterns")
+        return f"Folded {completions_folded} new completions into productivity patterns"
         
     except Exception as e:
         logger.error(f"Error in update_productivity_patterns: {str(e)}")
         return f"Error: {str(e)}"
 
+@shared_task
+def rebuild_completion_stats():
+    """Recount completion rollups from scheduled activities to correct drift"""
+    try:
+        from apps.core.services.priority_engine import PriorityEngine
+        
+        # Counters are kept by views and signals; queryset updates and deletes
+        # bypass those, so a periodic recount keeps the rollup honest
+        users_rebuilt = 0
+        users_with_stats = User.objects.filter(activity_completion_stats__isnull=False).distinct()
+        
+        for user in users_with_stats:
+            try:
+                PriorityEngine.rebuild_completion_stats(user)
+                users_rebuilt += 1
+            except Exception as e:
+                logger.warning(f"Failed to rebuild completion stats for user {user.id}: {str(e)}")
+                continue
+        
+        logger.info(f"Rebuilt completion stats for {users_rebuilt} users")
+        return f"Rebuilt completion stats for {users_rebuilt} users"
+        
+    except Exception as e:
+        logger.error(f"Error in rebuild_completion_stats: {str(e)}")
+        return f"Error: {str(e)}"
+
 @shared_task
 def send_daily_motivation():
     """Send daily motivation to users who have it enabled"""
@@ -186,14 +307,10 @@ def cleanup_old_data():
     """Clean up old data to prevent database bloat"""
     try:
         from apps.core.models import (
-            AIPromptHistory, EnergyLog, EnergyPrediction, 
+            AIPromptHistory, EnergyPrediction, 
             SupportNotification, UserProductivityPattern
         )
         
-        # Define cleanup thresholds
-        old_threshold = timezone.now() - timedelta(days=365)  # 1 year
-        very_old_threshold = timezone.now() - timedelta(days=730)  # 2 years
-        
         cleaned_items = 0
         
         # Clean up old AI prompt history (keep 6 months)
@@ -204,12 +321,7 @@ def cleanup_old_data():
         cleaned_items += count
         logger.info(f"Deleted {count} old AI prompt history records")
         
-        # Clean up old energy logs (keep 1 year)
-        old_energy_logs = EnergyLog.objects.filter(timestamp__lt=old_threshold)
-        count = old_energy_logs.count()
-        old_energy_logs.delete()
-        cleaned_items += count
-        logger.info(f"Deleted {count} old energy log records")
+        # Old energy logs are compacted into rollups by rollup_energy_logs, not deleted
         
         # Clean up old energy predictions (keep 30 days)
         prediction_threshold = timezone.now() - timedelta(days=30)
@@ -246,29 +358,37 @@ def cleanup_old_data():
         return f"Error: {str(e)}"
 
 @shared_task
-def calculate_daily_priorities_for_active_users():
-    """Calculate daily priorities for all users with active goals"""
+def calculate_daily_priorities_for_active_users(shard_size=500, horizon_days=2):
+    """Calculate priorities for all users with active goals, today and the days ahead"""
     try:
         from apps.core.services.priority_engine import PriorityEngine
-        from apps.core.models import MonkModeGoal
         
         calculations_performed = 0
         
         # Get users with active goals
-        active_users = User.objects.filter(
+        active_user_ids = list(User.objects.filter(
             monk_mode_goals__current_status='active'
-        ).distinct()
+        ).distinct().order_by('id').values_list('id', flat=True))
         
-        today = timezone.now().date()
+        sweep_started = timezone.now()
+        today = sweep_started.date()
+        # Tomorrow is precomputed in the same pass, sharing the loaded signals
+        dates = [today + timedelta(days=offset) for offset in range(horizon_days)]
         
-        for user in active_users:
+        # Score users a shard at a time so query count scales with shards, not users
+        for offset in range(0, len(active_user_ids), shard_size):
+            shard = active_user_ids[offset:offset + shard_size]
             try:
-                priorities = PriorityEngine.calculate_daily_priorities(user, today)
-                if priorities:
-                    calculations_performed += 1
-                    logger.debug(f"Calculated priorities for user {user.id}: {len(priorities)} activities")
+                priorities_by_user = PriorityEngine.calculate_horizon_for_users(shard, dates)
+                calculations_performed += len(priorities_by_user)
+                # The stale sweep need not rescore what this pass just covered
+                PriorityEngine.clear_stale_marks(shard, dates, sweep_started)
+                logger.debug(
+                    f"Calculated priorities for {len(priorities_by_user)} users "
+                    f"in shard starting at user {shard[0]}"
+                )
             except Exception as e:
-                logger.warning(f"Failed to calculate priorities for user {user.id}: {str(e)}")
+                logger.warning(f"Failed to calculate priorities for shard starting at user {shard[0]}: {str(e)}")
                 continue
         
         logger.info(f"Calculated daily priorities for {calculations_performed} users")
@@ -278,6 +398,40 @@ def calculate_daily_priorities_for_active_users():
         logger.error(f"Error in calculate_daily_priorities_for_active_users: {str(e)}")
         return f"Error: {str(e)}"
 
+@shared_task
+def recalculate_stale_priorities(shard_size=500):
+    """Rescore only the user-days whose inputs changed since the last sweep"""
+    try:
+        from apps.core.services.priority_engine import PriorityEngine
+        from apps.core.models import StalePriorityDay
+        
+        calculations_performed = 0
+        
+        today = timezone.now().date()
+        sweep_started = timezone.now()
+        stale_user_ids = PriorityEngine.get_stale_user_ids(today)
+        
+        for offset in range(0, len(stale_user_ids), shard_size):
+            shard = stale_user_ids[offset:offset + shard_size]
+            try:
+                priorities_by_user = PriorityEngine.calculate_priorities_for_users(shard, today)
+                calculations_performed += len(priorities_by_user)
+                PriorityEngine.clear_stale_marks(shard, [today], sweep_started)
+            except Exception as e:
+                # Marks are kept so the shard is retried on the next run
+                logger.warning(f"Failed to recalculate stale shard starting at user {shard[0]}: {str(e)}")
+                continue
+        
+        # Marks for past days can never be served again
+        StalePriorityDay.objects.filter(target_date__lt=today).delete()
+        
+        logger.info(f"Recalculated stale priorities for {calculations_performed} of {len(stale_user_ids)} users")
+        return f"Recalculated stale priorities for {calculations_performed} of {len(stale_user_ids)} users"
+        
+    except Exception as e:
+        logger.error(f"Error in recalculate_stale_priorities: {str(e)}")
+        return f"Error: {str(e)}"
+
 @shared_task
 def check_milestone_achievements():
     """Check for milestone achievements and trigger celebrations"""
@@ -327,6 +481,7 @@ def generate_weekly_insights():
     """Generate weekly insights for users"""
     try:
         from apps.core.services.ai_service import AIService
+        from apps.core.services.gemini_client import GeminiClient
         from apps.core.models import UserDailyLog
         
         insights_generated = 0
@@ -343,7 +498,10 @@ def generate_weekly_insights():
             
             for user in users_with_recent_logs:
                 try:
-                    insights = AIService.generate_weekly_review_insights(user)
+                    # A worker can wait out the rate limit that web requests give up on
+                    insights = AIService.generate_weekly_review_insights(
+                        user, acquire_timeout=GeminiClient.BACKGROUND_ACQUIRE_TIMEOUT
+                    )
                     if insights and "Unable to generate" not in insights:
                         insights_generated += 1
                         
@@ -1,3 +1,666 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+import math
+import time as time_module
+from unittest import mock
 
-# Create your tests here.
+from apps.core.models import (
+    ActivityCompletionStats, ActivityType, EnergyCircadianModel, EnergyLog, EnergyLogRollup,
+    EnergyPrediction, MonkModeGoal, MonkModePeriod, ScheduledActivity, StalePriorityDay,
+    TaskPriorityScore, UserProductivityPattern
+)
+from apps.core.services.ai_response_cache import AIResponseCacheService
+from apps.core.services.circadian_model import CircadianModelService
+from apps.core.services.dependency_graph import DependencyGraphService
+from apps.core.services.energy_rollup import EnergyRollupService
+from apps.core.services.energy_service import EnergyManagementService
+from apps.core.services.energy_trend import EnergyTrendService
+from apps.core.services.gemini_client import GeminiBusyError, GeminiClient
+from apps.core.services.prediction_accuracy import PredictionAccuracyService
+from apps.core.services.priority_engine import PriorityEngine
+from apps.core.services.schedule_context import ScheduleContextService
+from apps.core.tasks import calculate_daily_priorities_for_active_users, rebuild_completion_stats
+
+
+def create_schedule(user, days=3):
+    """An active goal and period starting today with two activities per day"""
+    today = timezone.now().date()
+    goal = MonkModeGoal.objects.create(
+        user=user,
+        title='Ship it',
+        description='Focus',
+        start_date=today,
+        end_date=today + timedelta(days=30),
+        target_outcome='Shipped',
+        current_status='active'
+    )
+    period = MonkModePeriod.objects.create(
+        goal=goal,
+        period_name='Sprint',
+        start_date=today,
+        end_date=today + timedelta(days=30),
+        is_active=True
+    )
+    activity_types = [
+        ActivityType.objects.get_or_create(name=name)[0] for name in ('Deep Work', 'Exercise')
+    ]
+    for day in range(1, days + 1):
+        for hour, activity_type in zip((9, 17), activity_types):
+            ScheduledActivity.objects.create(
+                monk_mode_period=period,
+                activity_type=activity_type,
+                day_of_period=day,
+                start_time=time(hour),
+                end_time=time(hour + 1),
+                duration_minutes=60
+            )
+    return period
+
+
+class StorePredictionsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('predictor', password='x')
+        self.this_hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+
+    def _prediction(self, predicted_for, predicted_energy):
+        return EnergyPrediction(
+            user=self.user,
+            predicted_for=predicted_for,
+            predicted_energy=predicted_energy,
+            confidence_score=0.5
+        )
+
+    def test_prediction_times_start_after_current_hour(self):
+        times = EnergyManagementService._get_prediction_times(timezone.now().date(), 3)
+        self.assertEqual(times, [self.this_hour + timedelta(hours=offset) for offset in (1, 2, 3)])
+
+    def test_store_is_idempotent_per_user_hour(self):
+        upcoming = [self.this_hour + timedelta(hours=offset) for offset in (1, 2)]
+        EnergyManagementService._store_predictions([self._prediction(t, 5.0) for t in upcoming])
+        EnergyManagementService._store_predictions([self._prediction(t, 7.0) for t in upcoming])
+
+        stored = EnergyPrediction.objects.filter(user=self.user)
+        self.assertEqual(stored.count(), 2)
+        self.assertEqual(set(stored.values_list('predicted_energy', flat=True)), {7.0})
+
+    def test_started_hours_are_frozen(self):
+        EnergyManagementService._store_predictions([self._prediction(self.this_hour, 5.0)])
+        EnergyManagementService._store_predictions([
+            self._prediction(self.this_hour, 9.0),
+            self._prediction(self.this_hour - timedelta(hours=1), 9.0),
+        ])
+
+        stored = EnergyPrediction.objects.get(user=self.user, predicted_for=self.this_hour)
+        self.assertEqual(stored.predicted_energy, 5.0)
+        # A missing started hour is still inserted once
+        self.assertTrue(EnergyPrediction.objects.filter(
+            user=self.user, predicted_for=self.this_hour - timedelta(hours=1)
+        ).exists())
+
+
+class PredictionAccuracyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('scored', password='x')
+        self.hour = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+        EnergyLog.objects.create(user=self.user, timestamp=self.hour + timedelta(minutes=5), energy_level=8)
+
+    def _prediction(self, predicted_for, updated_at):
+        prediction = EnergyPrediction.objects.create(
+            user=self.user,
+            predicted_for=predicted_for,
+            predicted_energy=6.0,
+            confidence_score=0.5
+        )
+        EnergyPrediction.objects.filter(id=prediction.id).update(updated_at=updated_at)
+        return prediction
+
+    def test_prediction_frozen_before_its_hour_is_scored(self):
+        prediction = self._prediction(self.hour, self.hour - timedelta(minutes=10))
+
+        self.assertEqual(PredictionAccuracyService.backfill(since=self.hour - timedelta(hours=1)), 1)
+        prediction.refresh_from_db()
+        self.assertEqual(prediction.actual_energy, 8.0)
+
+    def test_prediction_rewritten_after_its_hour_began_is_not_scored(self):
+        prediction = self._prediction(self.hour, self.hour + timedelta(minutes=10))
+
+        self.assertEqual(PredictionAccuracyService.backfill(since=self.hour - timedelta(hours=1)), 0)
+        prediction.refresh_from_db()
+        self.assertIsNone(prediction.actual_energy)
+
+        # Rows scored before the rule existed are left out of the report too
+        EnergyPrediction.objects.filter(id=prediction.id).update(actual_energy=8.0, prediction_accuracy=0.8)
+        self.assertEqual(PredictionAccuracyService.get_accuracy_report(user=self.user)['scored_predictions'], 0)
+
+
+class DedupePredictionsMigrationTests(TransactionTestCase):
+    migrate_from = [('core', '0005_productivitypatternwatermark')]
+    migrate_to = [('core', '0006_energyprediction_unique_hour')]
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self._migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_keeps_latest_row_per_user_hour(self):
+        apps = self._migrate(self.migrate_from)
+        user = apps.get_model('auth', 'User').objects.create(username='dupes')
+        EnergyPrediction = apps.get_model('core', 'EnergyPrediction')
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+        for predicted_energy in (4.0, 5.0, 6.0):
+            EnergyPrediction.objects.create(
+                user=user, predicted_for=hour, predicted_energy=predicted_energy, confidence_score=0.5
+            )
+        other = EnergyPrediction.objects.create(
+            user=user, predicted_for=hour + timedelta(hours=1), predicted_energy=7.0, confidence_score=0.5
+        )
+
+        apps = self._migrate(self.migrate_to)
+        EnergyPrediction = apps.get_model('core', 'EnergyPrediction')
+        self.assertEqual(
+            sorted(EnergyPrediction.objects.values_list('predicted_for', 'predicted_energy')),
+            [(hour, 6.0), (other.predicted_for, 7.0)]
+        )
+
+
+class PriorityHorizonTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('planner', password='x')
+        self.period = create_schedule(self.user, days=3)
+        self.today = timezone.now().date()
+
+    def test_fresh_days_are_served_without_rescoring(self):
+        PriorityEngine.calculate_priority_horizon(self.user, self.today, 3)
+        scored_at = dict(TaskPriorityScore.objects.values_list('id', 'calculated_at'))
+
+        horizon = PriorityEngine.get_priority_horizon(self.user, self.today, 3)
+
+        self.assertEqual([len(horizon[day]) for day in sorted(horizon)], [2, 2, 2])
+        self.assertEqual(dict(TaskPriorityScore.objects.values_list('id', 'calculated_at')), scored_at)
+
+    def test_only_missing_and_stale_days_are_rescored(self):
+        PriorityEngine.calculate_priority_horizon(self.user, self.today, 2)
+        tomorrow = self.today + timedelta(days=1)
+        StalePriorityDay.objects.create(user=self.user, target_date=tomorrow)
+        first_day_scores = dict(TaskPriorityScore.objects.filter(
+            scheduled_activity__day_of_period=1
+        ).values_list('id', 'calculated_at'))
+
+        horizon = PriorityEngine.get_priority_horizon(self.user, self.today, 3)
+
+        self.assertEqual(TaskPriorityScore.objects.count(), 6)
+        self.assertEqual(dict(TaskPriorityScore.objects.filter(
+            scheduled_activity__day_of_period=1
+        ).values_list('id', 'calculated_at')), first_day_scores)
+        self.assertFalse(StalePriorityDay.objects.filter(user=self.user).exists())
+        self.assertEqual(len(horizon[self.today + timedelta(days=2)]), 2)
+
+
+    def test_swept_future_days_outlive_the_score_ttl(self):
+        StalePriorityDay.objects.create(user=self.user, target_date=self.today)
+        calculate_daily_priorities_for_active_users()
+        # The sweep settles the marks of the days it covered
+        self.assertFalse(StalePriorityDay.objects.filter(user=self.user).exists())
+
+        TaskPriorityScore.objects.update(
+            calculated_at=timezone.now() - PriorityEngine.SCORE_FRESHNESS_TTL - timedelta(hours=1)
+        )
+        with mock.patch.object(
+            PriorityEngine, 'calculate_horizon_for_users',
+            wraps=PriorityEngine.calculate_horizon_for_users
+        ) as rescore:
+            PriorityEngine.get_priority_horizon(self.user, self.today, 2)
+
+        # Only today is past the TTL; tomorrow is still served from the sweep
+        rescore.assert_called_once_with([self.user.id], [self.today])
+
+
+class DailyPrioritiesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('focus', password='x')
+        self.period = create_schedule(self.user, days=1)
+        self.today = timezone.now().date()
+        PriorityEngine.calculate_daily_priorities(self.user, self.today)
+
+    def _read(self, **kwargs):
+        with mock.patch.object(
+            PriorityEngine, 'calculate_priorities_for_users',
+            wraps=PriorityEngine.calculate_priorities_for_users
+        ) as rescore:
+            priorities = PriorityEngine.get_daily_priorities(self.user, self.today, **kwargs)
+        return priorities, rescore.called
+
+    def test_fresh_scores_are_served_from_storage(self):
+        priorities, rescored = self._read()
+        self.assertEqual(len(priorities), 2)
+        self.assertFalse(rescored)
+
+    def test_stale_mark_forces_rescore_and_is_cleared(self):
+        PriorityEngine.mark_priorities_stale(self.user, self.today)
+
+        priorities, rescored = self._read()
+        self.assertEqual(len(priorities), 2)
+        self.assertTrue(rescored)
+        self.assertFalse(StalePriorityDay.objects.filter(user=self.user).exists())
+
+        _, rescored = self._read()
+        self.assertFalse(rescored)
+
+    def test_mark_newer_than_the_rescore_survives(self):
+        scored_at = timezone.now()
+        PriorityEngine.mark_priorities_stale(self.user, self.today)
+        StalePriorityDay.objects.filter(user=self.user).update(marked_at=scored_at + timedelta(seconds=1))
+
+        PriorityEngine.clear_stale_marks([self.user.id], [self.today], scored_at)
+        self.assertTrue(StalePriorityDay.objects.filter(user=self.user).exists())
+
+    def test_scores_older_than_max_age_are_rescored(self):
+        TaskPriorityScore.objects.update(calculated_at=timezone.now() - timedelta(hours=2))
+
+        _, rescored = self._read(max_age=timedelta(hours=1))
+        self.assertTrue(rescored)
+
+
+class AIResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def _payload(self, index):
+        return {'contents': [{'role': 'user', 'parts': [{'text': f'prompt {index}'}]}]}
+
+    def _live_entries(self, count):
+        # Checking must not promote what it reads
+        with mock.patch.object(AIResponseCacheService, '_promote'):
+            return [
+                index for index in range(count)
+                if AIResponseCacheService.get(self._payload(index), 'motivation') is not None
+            ]
+
+    def test_entry_count_is_bounded(self):
+        with mock.patch.object(AIResponseCacheService, 'MAX_ENTRIES', 3):
+            for index in range(6):
+                AIResponseCacheService.set(self._payload(index), 'motivation', {'candidates': [index]})
+
+            self.assertEqual(self._live_entries(6), [3, 4, 5])
+
+    def test_bound_holds_under_concurrent_writers(self):
+        with mock.patch.object(AIResponseCacheService, 'MAX_ENTRIES', 20):
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(
+                    lambda index: AIResponseCacheService.set(self._payload(index), 'motivation', {'candidates': [index]}),
+                    range(200)
+                ))
+
+            self.assertEqual(len(self._live_entries(200)), 20)
+
+    def test_hits_on_old_entries_are_promoted(self):
+        with mock.patch.object(AIResponseCacheService, 'MAX_ENTRIES', 4):
+            for index in range(4):
+                AIResponseCacheService.set(self._payload(index), 'motivation', {'candidates': [index]})
+            # Entry 0 is next in line for eviction until it is read
+            self.assertIsNotNone(AIResponseCacheService.get(self._payload(0), 'motivation'))
+            for index in range(4, 6):
+                AIResponseCacheService.set(self._payload(index), 'motivation', {'candidates': [index]})
+
+            self.assertEqual(self._live_entries(6), [0, 3, 4, 5])
+
+    def test_recent_hits_write_nothing(self):
+        with mock.patch.object(AIResponseCacheService, 'MAX_ENTRIES', 4):
+            AIResponseCacheService.set(self._payload(0), 'motivation', {'candidates': [0]})
+            AIResponseCacheService.get(self._payload(0), 'motivation')
+            self.assertEqual(cache.get(AIResponseCacheService.SEQUENCE_KEY), 1)
+
+    def test_promotion_keeps_the_original_expiry(self):
+        with mock.patch.object(AIResponseCacheService, 'MAX_ENTRIES', 2):
+            key = AIResponseCacheService.make_key(self._payload(0), 'motivation')
+            AIResponseCacheService.set(self._payload(1), 'motivation', {'candidates': [1]})
+            AIResponseCacheService.set(self._payload(2), 'motivation', {'candidates': [2]})
+
+            # An entry past its original expiry is not rewritten
+            AIResponseCacheService._promote(key, (0, {'candidates': [0]}, time_module.time() - 1))
+            self.assertEqual(cache.get(AIResponseCacheService.SEQUENCE_KEY), 2)
+
+            expires_at = time_module.time() + 30
+            AIResponseCacheService._promote(key, (0, {'candidates': [0]}, expires_at))
+            self.assertEqual(cache.get(AIResponseCacheService.SEQUENCE_KEY), 3)
+            self.assertEqual(cache.get(AIResponseCacheService.SLOT_KEY.format(slot=1))[2], expires_at)
+
+    def test_volatile_clock_line_does_not_change_the_key(self):
+        first = {'contents': [{'role': 'user', 'parts': [{'text': 'a\n  Current time: 10:00\n b'}]}]}
+        second = {'contents': [{'role': 'user', 'parts': [{'text': 'a\n b\nCurrent time: 11:30'}]}]}
+        self.assertEqual(
+            AIResponseCacheService.make_key(first, 'motivation'),
+            AIResponseCacheService.make_key(second, 'motivation')
+        )
+
+
+class ProductivityPatternWatermarkTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('finisher', password='x')
+        create_schedule(self.user, days=1)
+        self.client.force_login(self.user)
+
+    def _sample_size(self):
+        return sum(UserProductivityPattern.objects.filter(user=self.user).values_list('sample_size', flat=True))
+
+    def _complete(self, activity, completed_at):
+        ScheduledActivity.objects.filter(id=activity.id).update(is_completed=True, completed_at=completed_at)
+
+    def test_recompleting_an_activity_is_counted_once(self):
+        activity = ScheduledActivity.objects.filter(monk_mode_period__goal__user=self.user).first()
+        url = reverse('dashboard:api_quick_complete', args=[activity.id])
+
+        first = self.client.post(url).json()
+        second = self.client.post(url).json()
+
+        self.assertEqual(first['completed_at'], second['completed_at'])
+        self.assertEqual(self._sample_size(), 1)
+
+    def test_late_commit_inside_overlap_is_folded_once(self):
+        early, late = ScheduledActivity.objects.filter(monk_mode_period__goal__user=self.user)
+        now = timezone.now()
+        self._complete(early, now)
+        PriorityEngine.update_productivity_patterns(self.user)
+
+        # Committed after the watermark moved, stamped a little before it
+        self._complete(late, now - timedelta(minutes=5))
+        self.assertEqual(PriorityEngine.update_productivity_patterns(self.user), 1)
+        self.assertEqual(PriorityEngine.update_productivity_patterns(self.user), 0)
+        self.assertEqual(self._sample_size(), 2)
+
+
+class CircadianModelTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('circadian', password='x')
+        self.now = timezone.now()
+
+    def _log(self, hours_ago, energy_fn):
+        timestamp = self.now - timedelta(hours=hours_ago)
+        local = timezone.localtime(timestamp)
+        day_phase = 2 * math.pi * (local.hour + local.minute / 60.0) / 24.0
+        return EnergyLog(user=self.user, timestamp=timestamp, energy_level=energy_fn(day_phase))
+
+    def test_fit_recovers_daily_sinusoid(self):
+        # Hourly readings for two weeks; integer levels, so the fit is approximate
+        EnergyLog.objects.bulk_create([
+            self._log(hours_ago, lambda phase: round(6 + 3 * math.sin(phase)))
+            for hours_ago in range(1, 14 * 24)
+        ])
+
+        self.assertEqual(CircadianModelService.fit_users([self.user.id]), 1)
+        model = CircadianModelService.get_model(self.user)
+        intercept, day_sin, day_cos = model.coefficients[:3]
+        self.assertAlmostEqual(intercept, 6.0, delta=0.2)
+        self.assertAlmostEqual(day_sin, 3.0, delta=0.3)
+        self.assertAlmostEqual(day_cos, 0.0, delta=0.3)
+        self.assertGreater(model.r_squared, 0.9)
+        self.assertEqual(len(model.covered_hours), 24)
+
+    def test_sparse_hours_fit_cautiously(self):
+        # Two weeks of readings, all within the same two hours of the day
+        EnergyLog.objects.bulk_create([
+            self._log(day * 24 + offset, lambda phase, level=level: level)
+            for day in range(14)
+            for offset, level in ((1, 9), (2, 7))
+        ])
+        CircadianModelService.fit_users([self.user.id])
+        model = CircadianModelService.get_model(self.user)
+
+        far_away = self.now + timedelta(hours=12)
+        self.assertLess(
+            CircadianModelService.confidence(model, far_away),
+            CircadianModelService.confidence(model, self.now - timedelta(hours=1))
+        )
+        # The ridge keeps unobserved hours near the observed levels instead of swinging away
+        for hours_ahead in range(24):
+            predicted = CircadianModelService.evaluate(model.coefficients, self.now + timedelta(hours=hours_ahead))
+            self.assertTrue(6.5 <= predicted <= 9.5, predicted)
+
+    def test_stale_models_are_not_served(self):
+        EnergyCircadianModel.objects.create(user=self.user, coefficients=[5.0] + [0.0] * 6, covered_hours=[9])
+        self.assertIsNotNone(CircadianModelService.get_model(self.user))
+
+        EnergyCircadianModel.objects.filter(user=self.user).update(
+            fitted_at=self.now - CircadianModelService.MAX_MODEL_AGE - timedelta(days=1)
+        )
+        self.assertIsNone(CircadianModelService.get_model(self.user))
+        self.assertEqual(CircadianModelService.get_models([self.user.id]), {})
+
+
+class EnergyTrendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('trend', password='x')
+        self.now = timezone.now()
+
+    def _record(self, minutes_ago, energy_level):
+        log = EnergyLog.objects.create(
+            user=self.user, timestamp=self.now - timedelta(minutes=minutes_ago), energy_level=energy_level
+        )
+        return EnergyTrendService.record_readings(self.user, [(log.timestamp, energy_level)])
+
+    def test_readings_fold_into_cached_state(self):
+        self._record(120, 8)
+        self._record(60, 6)
+        state = self._record(0, 4)
+        self.assertEqual(EnergyTrendService.recent_levels(state, self.now), [4.0, 6.0, 8.0])
+        self.assertAlmostEqual(state['slope'], -2.0)
+        self.assertEqual(cache.get(EnergyTrendService._cache_key(self.user.id)), state)
+
+    def test_cache_miss_rebuilds_from_logs(self):
+        self._record(120, 8)
+        self._record(60, 6)
+        cache.delete(EnergyTrendService._cache_key(self.user.id))
+
+        state = self._record(0, 4)
+        self.assertEqual(EnergyTrendService.recent_levels(state, self.now), [4.0, 6.0, 8.0])
+        self.assertAlmostEqual(state['slope'], -2.0)
+
+
+class CompletionStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('stats', password='x')
+        self.period = create_schedule(self.user, days=2)
+        PriorityEngine.rebuild_completion_stats(self.user)
+        self.activity = ScheduledActivity.objects.filter(
+            monk_mode_period=self.period, activity_type__name='Deep Work'
+        ).first()
+
+    def _counts(self):
+        row = ActivityCompletionStats.objects.get(user=self.user, activity_type=self.activity.activity_type)
+        return row.scheduled_count, row.completed_count
+
+    def _complete(self, activity):
+        activity.is_completed = True
+        activity.completed_at = timezone.now()
+        activity.save()
+        PriorityEngine.record_activity_completed(self.user, activity)
+
+    def test_uncompleting_takes_the_completion_back(self):
+        self._complete(self.activity)
+        self.assertEqual(self._counts(), (2, 1))
+
+        activity = ScheduledActivity.objects.get(pk=self.activity.pk)
+        activity.is_completed = False
+        activity.save()
+        self.assertEqual(self._counts(), (2, 0))
+
+        # Saving again without a transition changes nothing
+        activity.save()
+        self.assertEqual(self._counts(), (2, 0))
+
+    def test_deleting_activities_and_periods_discounts_them(self):
+        self._complete(self.activity)
+        ScheduledActivity.objects.get(pk=self.activity.pk).delete()
+        self.assertEqual(self._counts(), (1, 0))
+
+        self.period.goal.delete()
+        self.assertEqual(self._counts(), (0, 0))
+
+    def test_periodic_rebuild_corrects_drift(self):
+        # Queryset updates bypass the signals
+        ScheduledActivity.objects.filter(pk=self.activity.pk).update(is_completed=True)
+        ActivityCompletionStats.objects.filter(user=self.user).update(scheduled_count=9)
+
+        rebuild_completion_stats()
+        self.assertEqual(self._counts(), (2, 1))
+
+
+class EnergyRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('rollup', password='x')
+        self.now = timezone.now()
+
+    def _log(self, timestamp, energy_level):
+        EnergyLog.objects.create(user=self.user, timestamp=timestamp, energy_level=energy_level)
+
+    def _rollups(self, granularity):
+        return list(EnergyLogRollup.objects.filter(
+            user=self.user, granularity=granularity
+        ).order_by('period_start').values_list('period_start', 'count', 'total'))
+
+    def test_raw_logs_compact_at_raw_retention(self):
+        raw_cutoff = EnergyRollupService.raw_cutoff(self.now)
+        self.assertEqual(
+            raw_cutoff, (self.now - timedelta(days=180)).replace(minute=0, second=0, microsecond=0)
+        )
+        self._log(raw_cutoff - timedelta(minutes=30), 4)
+        self._log(raw_cutoff - timedelta(minutes=10), 6)
+        self._log(raw_cutoff, 8)
+
+        compacted = EnergyRollupService.compact(self.now)
+
+        self.assertEqual(compacted, {'logs': 2, 'hourly_rollups': 0})
+        self.assertEqual(list(EnergyLog.objects.values_list('timestamp', flat=True)), [raw_cutoff])
+        self.assertEqual(self._rollups('hour'), [(raw_cutoff - timedelta(hours=1), 2, 10)])
+
+    def test_hourly_rollups_fold_into_days_at_hourly_retention(self):
+        hourly_cutoff = EnergyRollupService.hourly_cutoff(self.now)
+        self.assertEqual(hourly_cutoff.date(), timezone.localtime(self.now - timedelta(days=365)).date())
+        self._log(hourly_cutoff - timedelta(hours=2), 3)
+        self._log(hourly_cutoff - timedelta(hours=1), 5)
+        self._log(hourly_cutoff, 7)
+
+        compacted = EnergyRollupService.compact(self.now)
+
+        self.assertEqual(compacted, {'logs': 3, 'hourly_rollups': 2})
+        self.assertFalse(EnergyLog.objects.exists())
+        self.assertEqual(self._rollups('day'), [(hourly_cutoff - timedelta(days=1), 2, 8)])
+        self.assertEqual(self._rollups('hour'), [(hourly_cutoff, 1, 7)])
+
+
+class ScheduleContextTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('context', password='x')
+        self.period = create_schedule(self.user, days=0)
+        self.today = timezone.now().date()
+
+    def _add(self, name, hour, minute=0, day=1):
+        return ScheduledActivity.objects.create(
+            monk_mode_period=self.period,
+            activity_type=ActivityType.objects.get_or_create(name=name)[0],
+            day_of_period=day,
+            start_time=time(hour, minute),
+            end_time=time((hour + 1) % 24, minute),
+            duration_minutes=60
+        )
+
+    def test_parallel_activities_do_not_affect_each_other(self):
+        exercise = self._add('Exercise', 9)
+        parallel = self._add('Deep Work', 9)
+        later = self._add('Deep Work', 11)
+
+        effects = ScheduleContextService.preceding_effects(
+            ScheduleContextService.build_intervals({self.today: [exercise, parallel, later]})
+        )
+        self.assertEqual(effects, {exercise.id: 0.0, parallel.id: 0.0, later.id: 0.5})
+
+    def test_energy_alignment_ignores_parallel_activities(self):
+        deep_work = self._add('Deep Work', 9)
+        deep_work.energy_required = 8
+        deep_work.save()
+
+        def energy_score():
+            PriorityEngine.calculate_priorities_for_users([self.user.id], self.today)
+            return TaskPriorityScore.objects.get(scheduled_activity=deep_work).energy_requirement
+
+        alone = energy_score()
+        self._add('Exercise', 9)
+        self.assertEqual(energy_score(), alone)
+        self._add('Exercise', 7, 30)
+        self.assertGreater(energy_score(), alone)
+
+    def test_low_energy_protocol_sees_breaks_after_midnight(self):
+        late_evening = timezone.make_aware(datetime.combine(self.today, time(23, 30)))
+        with mock.patch('django.utils.timezone.now', return_value=late_evening):
+            tip = "📅 Consider scheduling a break in your next hour."
+            self.assertIn(tip, EnergyManagementService._trigger_low_energy_protocol(self.user, 2))
+
+            self._add('Break', 0, 30, day=2)
+            self.assertNotIn(tip, EnergyManagementService._trigger_low_energy_protocol(self.user, 2))
+
+
+@override_settings(GEMINI_API_KEY='test-key', GEMINI_MAX_CONCURRENCY=1)
+class GeminiClientTests(TestCase):
+    def setUp(self):
+        GeminiClient.reset()
+        self.addCleanup(GeminiClient.reset)
+        self.state = GeminiClient._get_state()
+
+    def _slot_free(self):
+        if not self.state['semaphore'].acquire(blocking=False):
+            return False
+        self.state['semaphore'].release()
+        return True
+
+    def test_abandoned_stream_frees_its_slot(self):
+        response = mock.MagicMock()
+        response.iter_lines.return_value = iter([
+            b'data: {"candidates": [{"content": {"parts": [{"text": "Hello"}]}}]}',
+            b'data: {"candidates": [{"content": {"parts": [{"text": " there"}]}}]}',
+        ])
+        with mock.patch.object(self.state['session'], 'post', return_value=response):
+            stream = GeminiClient.stream({'contents': []})
+            # The slot is taken on entering the block, before any chunk is read
+            with stream as chunks:
+                self.assertFalse(self._slot_free())
+                self.assertEqual(next(chunks), 'Hello')
+
+        self.assertTrue(self._slot_free())
+
+    def test_request_path_gives_up_quickly_when_busy(self):
+        self.state['semaphore'].acquire()
+        self.addCleanup(self.state['semaphore'].release)
+
+        started = time_module.monotonic()
+        with mock.patch.object(GeminiClient, 'REQUEST_ACQUIRE_TIMEOUT', 0.1):
+            with self.assertRaises(GeminiBusyError):
+                GeminiClient.generate({'contents': []})
+        self.assertLess(time_module.monotonic() - started, 1)
+
+
+class DependencyGraphTests(TestCase):
+    def test_blocked_counts(self):
+        # 1 <- 2 (1 open), 3 done <- 4, 5 <-> 6 cycle, 7 behind the cycle
+        graph = DependencyGraphService.analyze(
+            {1: False, 2: False, 3: True, 4: False, 5: False, 6: False, 7: False},
+            [(2, 1), (4, 3), (5, 6), (6, 5), (7, 6)]
+        )
+        self.assertEqual(graph, {'has_dependencies': True, 'open_count': 6, 'blocked_open_count': 4})
+        self.assertAlmostEqual(DependencyGraphService.blocking_pressure(graph), 4 / 6)
+
+    def test_edges_outside_the_goal_are_ignored(self):
+        graph = DependencyGraphService.analyze({1: False}, [(1, 99), (1, 1)])
+        self.assertEqual(graph, {'has_dependencies': False, 'open_count': 1, 'blocked_open_count': 0})
@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta, time
 from .models import MonkModePeriod, ScheduledActivity, ActivityType
+from .services.priority_engine import PriorityEngine
 
 def generate_basic_schedule(goal):
     """Generate a basic MonkMode schedule for a goal"""
@@ -89,4 +90,9 @@ def generate_basic_schedule(goal):
                 description=f"Day {day} - {activity_name}"
             )
 
+    PriorityEngine.record_activities_scheduled(goal.user, {
+        activity_types[activity_name].id: total_days * sum(1 for name, _, _ in daily_schedule if name == activity_name)
+        for activity_name in activity_types
+    })
+
     return period
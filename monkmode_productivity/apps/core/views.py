@@ -98,6 +98,7 @@ def goal_detail(request, goal_id):
                     estimated_hours=int(request.POST['estimated_hours']) if request.POST.get('estimated_hours') else None,
                     difficulty_level=int(request.POST.get('difficulty_level', 3))
                 )
+                PriorityEngine.mark_priorities_stale(request.user)
                 messages.success(request, f'Objective "{objective.description}" added successfully!')
                 return redirect('core:goal_detail', goal_id=goal.id)
                 
@@ -109,6 +110,7 @@ def goal_detail(request, goal_id):
                 objective_id = request.POST.get('objective_id')
                 objective = get_object_or_404(MonkModeObjective, id=objective_id, goal=goal)
                 objective.mark_completed()
+                PriorityEngine.mark_priorities_stale(request.user)
                 messages.success(request, 'Objective marked as completed!')
                 return redirect('core:goal_detail', goal_id=goal.id)
                 
@@ -413,8 +415,11 @@ def mark_activity_complete(request, activity_id):
     activity = get_object_or_404(ScheduledActivity, id=activity_id, monk_mode_period__goal__user=request.user)
     
     try:
+        was_completed = activity.is_completed
         activity.is_completed = True
-        activity.completed_at = timezone.now()
+        if not was_completed or activity.completed_at is None:
+            # Re-completing keeps the original time; pattern folding keys on it
+            activity.completed_at = timezone.now()
         
         # Get additional data from request
         quality_rating = request.POST.get('quality_rating')
@@ -441,6 +446,9 @@ def mark_activity_complete(request, activity_id):
             )
         
         activity.save()
+        if not was_completed:
+            PriorityEngine.record_activity_completed(request.user, activity)
+        PriorityEngine.mark_priorities_stale(request.user)
         
         # Update productivity patterns
         try:
@@ -1,3 +1,127 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+from unittest import mock
+import json
 
-# Create your tests here.
+from apps.core.models import EnergyLog, MonkModeGoal, MonkModePeriod
+from apps.core.services.chat_stream import ChatStreamService
+from apps.core.services.energy_service import EnergyManagementService
+from apps.dashboard.views import AI_CHAT_PENDING_TURN_KEY
+
+
+@mock.patch('apps.core.tasks.process_ai_chat_turn.delay')
+class AIChatTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('chat', password='x')
+        self.client.force_login(self.user)
+        self.url = reverse('dashboard:ai_chat')
+
+    def _finish_turn(self, turn_id, period_id=None):
+        state = ChatStreamService.get_turn(turn_id, self.user.id)
+        state.update({
+            'status': ChatStreamService.DONE,
+            'text': 'Here is your plan',
+            'plan_generated': period_id is not None,
+            'monk_mode_period_id': period_id,
+        })
+        cache.set(ChatStreamService._cache_key(turn_id), state)
+
+    def _period(self):
+        today = timezone.now().date()
+        goal = MonkModeGoal.objects.create(
+            user=self.user,
+            title='Ship it',
+            description='Focus',
+            start_date=today,
+            end_date=today + timedelta(days=30),
+            target_outcome='Shipped'
+        )
+        return MonkModePeriod.objects.create(
+            goal=goal,
+            period_name='Sprint',
+            start_date=today,
+            end_date=today + timedelta(days=30)
+        )
+
+    def test_xhr_post_returns_poll_url(self, delay):
+        response = self.client.post(self.url, {'message': 'Plan my week'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        self.assertEqual(data['poll_url'], reverse('dashboard:api_ai_chat_turn', args=[data['turn_id']]))
+        self.assertNotIn('stream_url', data)
+        delay.assert_called_once()
+
+    def test_form_post_redirects_to_generated_plan(self, delay):
+        response = self.client.post(self.url, {'message': 'Plan my week'})
+        self.assertRedirects(response, self.url)
+        turn_id = self.client.session[AI_CHAT_PENDING_TURN_KEY]
+
+        # Still replying: the page reloads itself until the turn finishes
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'http-equiv="refresh"')
+
+        period = self._period()
+        self._finish_turn(turn_id, period.id)
+        response = self.client.get(self.url)
+        self.assertRedirects(response, reverse('dashboard:schedule_view', args=[period.id]), fetch_redirect_response=False)
+        self.assertNotIn(AI_CHAT_PENDING_TURN_KEY, self.client.session)
+
+    def test_form_post_without_plan_stays_on_chat(self, delay):
+        self.client.post(self.url, {'message': 'How am I doing?'})
+        self._finish_turn(self.client.session[AI_CHAT_PENDING_TURN_KEY])
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'http-equiv="refresh"')
+        self.assertNotIn(AI_CHAT_PENDING_TURN_KEY, self.client.session)
+
+
+class EnergyLogBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('batch', password='x')
+        self.client.force_login(self.user)
+        self.url = reverse('dashboard:api_energy_log_batch')
+        self.now = timezone.now()
+
+    def _post(self, readings):
+        return self.client.post(self.url, json.dumps({'readings': readings}), content_type='application/json')
+
+    def test_batch_size_is_limited(self):
+        limit = EnergyManagementService.MAX_BATCH_READINGS
+        reading = {'energy_level': 6, 'timestamp': (self.now - timedelta(hours=1)).isoformat()}
+
+        response = self._post([reading] * (limit + 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(EnergyLog.objects.exists())
+
+        response = self._post([reading] * limit)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], limit)
+
+    def test_readings_beyond_clock_skew_are_rejected(self):
+        skew = EnergyManagementService.MAX_CLOCK_SKEW
+        response = self._post([
+            {'energy_level': 5, 'timestamp': (self.now + skew - timedelta(minutes=1)).isoformat()},
+            {'energy_level': 7, 'timestamp': (self.now + skew + timedelta(minutes=1)).isoformat()},
+        ])
+
+        data = response.json()
+        self.assertEqual(data['created'], 1)
+        self.assertEqual(data['errors'], [{'index': 1, 'error': 'Timestamp is in the future'}])
+        self.assertEqual(list(EnergyLog.objects.values_list('energy_level', flat=True)), [5])
+
+    def test_impossible_timestamp_rejects_only_that_reading(self):
+        response = self._post([{'energy_level': 5}, {'energy_level': 6, 'timestamp': '2024-02-30T10:00:00'}])
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['created'], 1)
+        self.assertEqual(data['errors'], [{'index': 1, 'error': 'Invalid timestamp'}])
+        self.assertEqual(list(EnergyLog.objects.values_list('energy_level', flat=True)), [5])
@@ -42,5 +42,9 @@ urlpatterns = [
     
     # API endpoints
     path('api/energy-log/', views.api_energy_log, name='api_energy_log'),
+    path('api/energy-log/batch/', views.api_energy_log_batch, name='api_energy_log_batch'),
+    path('api/energy/factors/', views.api_energy_factor, name='api_energy_factor'),
     path('api/activities/<int:activity_id>/quick-complete/', views.api_quick_complete, name='api_quick_complete'),
+    path('api/ai-chat/turns/<str:turn_id>/', views.api_ai_chat_turn, name='api_ai_chat_turn'),
+    path('api/priorities/horizon/', views.api_priority_horizon, name='api_priority_horizon'),
 ]
\ No newline at end of file
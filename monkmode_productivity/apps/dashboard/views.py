@@ -3,6 +3,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth import logout
 from django.contrib import messages
 from django.http import JsonResponse
+from django.urls import reverse
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
@@ -20,13 +21,18 @@ from apps.core.models import (
 )
 
 from apps.core.services.ai_service import AIService
+from apps.core.services.chat_stream import ChatStreamService
 from apps.core.services.support_service import SupportNetworkService
 from apps.core.services.motivation_service import MotivationService
 from apps.core.services.priority_engine import PriorityEngine
 from apps.core.services.energy_service import EnergyManagementService
+from apps.core.services.energy_factors import EnergyFactorService
 
 logger = logging.getLogger(__name__)
 
+# Session key for the chat turn a non-JavaScript form post is waiting on
+AI_CHAT_PENDING_TURN_KEY = 'ai_chat_pending_turn'
+
 @login_required
 def dashboard(request):
     """Main dashboard view with comprehensive overview and enhanced error handling"""
@@ -81,7 +87,7 @@ def dashboard(request):
         energy_prediction = []
         try:
             latest_energy = EnergyLog.objects.filter(user=user).order_by('-timestamp').first()
-            energy_prediction = EnergyManagementService.predict_energy_levels(user, hours_ahead=12)
+            energy_prediction = EnergyManagementService.get_energy_predictions(user, hours_ahead=12)
         except Exception as e:
             logger.warning(f"Error getting energy data for user {user.id}: {str(e)}")
             latest_energy = None
@@ -201,6 +207,7 @@ def goal_detail(request, goal_id):
                     estimated_hours=estimated_hours,
                     difficulty_level=difficulty_level
                 )
+                PriorityEngine.mark_priorities_stale(request.user)
                 messages.success(request, f'Objective "{objective.description}" added successfully!')
                 
             except ValueError as e:
@@ -218,6 +225,7 @@ def goal_detail(request, goal_id):
                 
                 objective = get_object_or_404(MonkModeObjective, id=objective_id, goal=goal)
                 objective.mark_completed()
+                PriorityEngine.mark_priorities_stale(request.user)
                 messages.success(request, 'Objective marked as completed!')
                 
             except Exception as e:
@@ -345,22 +353,40 @@ def ai_chat(request, goal_id=None):
         chat_history = list(chat_history_qs)
         chat_history.reverse()
         
+        pending_turn = None
+        if request.method == 'GET':
+            pending_turn = request.session.get(AI_CHAT_PENDING_TURN_KEY)
+            if pending_turn:
+                state = ChatStreamService.get_turn(pending_turn, request.user.id)
+                if state is None or state['status'] in ChatStreamService.FINISHED:
+                    request.session.pop(AI_CHAT_PENDING_TURN_KEY, None)
+                    pending_turn = None
+                if state and state['plan_generated'] and state['monk_mode_period_id']:
+                    messages.success(request, 'AI has generated a new Monk Mode plan for you!')
+                    return redirect('dashboard:schedule_view', period_id=state['monk_mode_period_id'])
+        
         if request.method == 'POST':
             message = request.POST.get('message', '').strip()
             if message:
+                # The reply is generated by a worker; the page polls for it
                 try:
-                    response = AIService.send_message_to_gemini(
+                    turn_id = ChatStreamService.start_turn(
                         request.user.id,
                         goal.id if goal else None,
                         message
                     )
                     
                     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                        return JsonResponse(response)
+                        return JsonResponse({
+                            'status': 'accepted',
+                            'turn_id': turn_id,
+                            'poll_url': reverse('dashboard:api_ai_chat_turn', args=[turn_id]),
+                        }, status=202)
                     else:
-                        if response.get('plan_generated'):
-                            messages.success(request, 'AI has generated a new Monk Mode plan for you!')
-                            return redirect('dashboard:schedule_view', period_id=response['monk_mode_period_id'])
+                        # The page reloads until the turn finishes, then follows a new plan
+                        request.session[AI_CHAT_PENDING_TURN_KEY] = turn_id
+                        messages.info(request, 'Your AI coach is replying. The answer will appear in a moment.')
+                        return redirect(request.path)
                         
                 except Exception as e:
                     logger.error(f'Error in AI chat for user {request.user.id}: {str(e)}')
@@ -373,6 +399,7 @@ def ai_chat(request, goal_id=None):
         context = {
             'goal': goal,
             'chat_history': chat_history,
+            'pending_turn': pending_turn,
         }
         
     except Exception as e:
@@ -385,6 +412,49 @@ def ai_chat(request, goal_id=None):
     
     return render(request, 'dashboard/ai_chat.html', context)
 
+def _ai_chat_turn_payload(state, offset=0):
+    """Client view of a chat turn: text from offset onwards and, when done, the plan link"""
+    payload = {
+        'status': state['status'],
+        'text': state['text'][offset:],
+        'offset': len(state['text']),
+        'plan_generated': state['plan_generated'],
+    }
+    if state['plan_generated'] and state['monk_mode_period_id']:
+        payload['schedule_url'] = reverse('dashboard:schedule_view', args=[state['monk_mode_period_id']])
+    return payload
+
+@login_required
+def api_ai_chat_turn(request, turn_id):
+    """API endpoint for polling a chat turn's reply as the worker receives it"""
+    if request.method == 'GET':
+        try:
+            offset = max(0, int(request.GET.get('offset', 0)))
+        except ValueError:
+            return JsonResponse({
+                'success': False,
+                'error': 'Invalid offset provided'
+            }, status=400)
+        
+        try:
+            state = ChatStreamService.get_turn(turn_id, request.user.id)
+            if state is None:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Chat turn not found'
+                }, status=404)
+            
+            return JsonResponse({'success': True, **_ai_chat_turn_payload(state, offset)})
+            
+        except Exception as e:
+            logger.error(f'Error in API AI chat turn: {str(e)}')
+            return JsonResponse({
+                'success': False,
+                'error': 'Internal server error'
+            }, status=500)
+    
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
+
 @login_required
 def schedule_view(request, period_id):
     """View and manage schedule for a specific period"""
@@ -434,8 +504,11 @@ def complete_activity(request, activity_id):
     activity = get_object_or_404(ScheduledActivity, id=activity_id, monk_mode_period__goal__user=request.user)
     
     try:
+        was_completed = activity.is_completed
         activity.is_completed = True
-        activity.completed_at = timezone.now()
+        if not was_completed or activity.completed_at is None:
+            # Re-completing keeps the original time; pattern folding keys on it
+            activity.completed_at = timezone.now()
         
         # Get additional data from request with validation
         quality_rating = request.POST.get('quality_rating')
@@ -473,6 +546,9 @@ def complete_activity(request, activity_id):
                 pass
         
         activity.save()
+        if not was_completed:
+            PriorityEngine.record_activity_completed(request.user, activity)
+        PriorityEngine.mark_priorities_stale(request.user)
         
         # Update productivity patterns
         try:
@@ -839,7 +915,7 @@ def priority_focus(request):
         
         # Get prioritized activities for today
         today = timezone.now().date()
-        prioritized_activities = PriorityEngine.calculate_daily_priorities(user, today)
+        prioritized_activities = PriorityEngine.get_daily_priorities(user, today)
         
         if request.method == 'POST':
             action = request.POST.get('action')
@@ -929,13 +1005,17 @@ def energy_tracking(request):
     
     try:
         # Get energy insights
-        energy_insights = EnergyManagementService.get_energy_insights(user)
+        try:
+            days_back = int(request.GET.get('days', 30))
+        except ValueError:
+            days_back = 30
+        energy_insights = EnergyManagementService.get_energy_insights(user, days_back=days_back)
         
         # Get recent energy logs
         recent_logs = EnergyLog.objects.filter(user=user).order_by('-timestamp')[:20]
         
         # Get energy predictions
-        predictions = EnergyManagementService.predict_energy_levels(user, hours_ahead=24)
+        predictions = EnergyManagementService.get_energy_predictions(user, hours_ahead=24)
         
         # Get recovery recommendations
         recovery_recommendations = EnergyManagementService.get_recovery_recommendations(user)
@@ -1126,6 +1206,51 @@ def api_energy_log(request):
     
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
+@login_required
+def api_energy_log_batch(request):
+    """API endpoint for logging a batch of timestamped energy readings"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            readings = data.get('readings') if isinstance(data, dict) else None
+            
+            if not isinstance(readings, list) or not readings:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'A non-empty readings array is required'
+                }, status=400)
+            
+            if len(readings) > EnergyManagementService.MAX_BATCH_READINGS:
+                return JsonResponse({
+                    'success': False,
+                    'error': f'At most {EnergyManagementService.MAX_BATCH_READINGS} readings per batch'
+                }, status=400)
+            
+            energy_logs, errors = EnergyManagementService.log_energy_levels_batch(
+                request.user, readings
+            )
+            
+            return JsonResponse({
+                'success': bool(energy_logs),
+                'created': len(energy_logs),
+                'energy_log_ids': [energy_log.id for energy_log in energy_logs],
+                'errors': errors
+            }, status=200 if energy_logs else 400)
+            
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'success': False,
+                'error': 'Invalid JSON format'
+            }, status=400)
+        except Exception as e:
+            logger.error(f'Error in API energy log batch: {str(e)}')
+            return JsonResponse({
+                'success': False,
+                'error': 'Server error occurred'
+            }, status=500)
+    
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
+
 @login_required
 def api_quick_complete(request, activity_id):
     """API endpoint for quickly completing activities"""
@@ -1137,9 +1262,15 @@ def api_quick_complete(request, activity_id):
                 monk_mode_period__goal__user=request.user
             )
             
+            was_completed = activity.is_completed
             activity.is_completed = True
-            activity.completed_at = timezone.now()
+            if not was_completed or activity.completed_at is None:
+                # Re-completing keeps the original time; pattern folding keys on it
+                activity.completed_at = timezone.now()
             activity.save()
+            if not was_completed:
+                PriorityEngine.record_activity_completed(request.user, activity)
+            PriorityEngine.mark_priorities_stale(request.user)
             
             # Update patterns
             try:
@@ -1221,6 +1352,95 @@ def api_dashboard_refresh(request):
     
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
+@login_required
+def api_priority_horizon(request):
+    """API endpoint for the week-ahead priority ranking"""
+    if request.method == 'GET':
+        try:
+            days = max(1, min(14, int(request.GET.get('days', 7))))
+            start_date = timezone.now().date()
+            if request.GET.get('start'):
+                start_date = datetime.strptime(request.GET['start'], '%Y-%m-%d').date()
+            
+            horizon = PriorityEngine.get_priority_horizon(request.user, start_date, days)
+            
+            return JsonResponse({
+                'success': True,
+                'days': [
+                    {
+                        'date': day.isoformat(),
+                        'activities': [
+                            {
+                                'id': item['activity'].id,
+                                'activity_type': item['activity'].activity_type.name,
+                                'start_time': item['activity'].start_time.strftime('%H:%M'),
+                                'end_time': item['activity'].end_time.strftime('%H:%M'),
+                                'is_completed': item['activity'].is_completed,
+                                'final_score': round(item['final_score'], 3)
+                            }
+                            for item in prioritized
+                        ]
+                    }
+                    for day, prioritized in horizon.items()
+                ]
+            })
+            
+        except ValueError:
+            return JsonResponse({
+                'success': False,
+                'error': 'Invalid date or days provided'
+            }, status=400)
+        except Exception as e:
+            logger.error(f'Error in API priority horizon: {str(e)}')
+            return JsonResponse({
+                'success': False,
+                'error': 'Error calculating priorities'
+            }, status=500)
+    
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+@login_required
+def api_energy_factor(request):
+    """API endpoint for average energy when a context factor takes a value"""
+    if request.method == 'GET':
+        factor = request.GET.get('factor')
+        if not factor:
+            return JsonResponse({
+                'success': False,
+                'error': 'Factor is required'
+            }, status=400)
+        
+        try:
+            # Optional inclusive date window, e.g. ?start=2025-01-01&end=2025-03-31
+            start = end = None
+            if request.GET.get('start'):
+                start = timezone.make_aware(datetime.strptime(request.GET['start'], '%Y-%m-%d'))
+            if request.GET.get('end'):
+                end = timezone.make_aware(datetime.strptime(request.GET['end'], '%Y-%m-%d')) + timedelta(days=1)
+            
+            results = EnergyFactorService.get_factor_energy(
+                request.user, factor, request.GET.get('value'), start, end
+            )
+            
+            return JsonResponse({
+                'success': True,
+                'results': results
+            })
+            
+        except ValueError:
+            return JsonResponse({
+                'success': False,
+                'error': 'Dates must be in YYYY-MM-DD format'
+            }, status=400)
+        except Exception as e:
+            logger.error(f'Error in API energy factor: {str(e)}')
+            return JsonResponse({
+                'success': False,
+                'error': 'Error querying energy factors'
+            }, status=500)
+    
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
+
 # Helper functions with enhanced error handling
 
 def _calculate_current_streak(user):
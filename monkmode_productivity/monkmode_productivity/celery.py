@@ -32,10 +32,26 @@ app.conf.beat_schedule = {
         'task': 'apps.core.tasks.generate_daily_energy_predictions',
         'schedule': 60.0 * 60.0 * 6.0,  # Every 6 hours
     },
+    'backfill-prediction-accuracy': {
+        'task': 'apps.core.tasks.backfill_prediction_accuracy',
+        'schedule': 60.0 * 60.0 * 6.0,  # Every 6 hours
+    },
+    'fit-circadian-models': {
+        'task': 'apps.core.tasks.fit_circadian_models',
+        'schedule': 60.0 * 60.0 * 24.0,  # Every 24 hours
+    },
+    'rollup-energy-logs': {
+        'task': 'apps.core.tasks.rollup_energy_logs',
+        'schedule': 60.0 * 60.0 * 24.0,  # Every 24 hours
+    },
     'update-productivity-patterns': {
         'task': 'apps.core.tasks.update_productivity_patterns',
         'schedule': 60.0 * 60.0 * 24.0,  # Every 24 hours
     },
+    'rebuild-completion-stats': {
+        'task': 'apps.core.tasks.rebuild_completion_stats',
+        'schedule': 60.0 * 60.0 * 24.0 * 7.0,  # Every week
+    },
     'send-daily-motivation': {
         'task': 'apps.core.tasks.send_daily_motivation',
         'schedule': 60.0 * 30.0,  # Every 30 minutes
@@ -46,7 +62,11 @@ app.conf.beat_schedule = {
     },
     'calculate-daily-priorities': {
         'task': 'apps.core.tasks.calculate_daily_priorities_for_active_users',
-        'schedule': 60.0 * 60.0 * 2.0,  # Every 2 hours
+        'schedule': 60.0 * 60.0 * 24.0,  # Every 24 hours (full sweep)
+    },
+    'recalculate-stale-priorities': {
+        'task': 'apps.core.tasks.recalculate_stale_priorities',
+        'schedule': 60.0 * 60.0 * 2.0,  # Every 2 hours (changed user-days only)
     },
     'check-milestone-achievements': {
         'task': 'apps.core.tasks.check_milestone_achievements',
@@ -115,6 +115,22 @@ DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL')
 
 # Gemini AI API
 GEMINI_API_KEY = config('GEMINI_API_KEY')
+GEMINI_API_URL = config(
+    'GEMINI_API_URL',
+    default='https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent'
+)  # Point at a local stand-in server to benchmark the client
+GEMINI_MAX_CONCURRENCY = config('GEMINI_MAX_CONCURRENCY', default=8, cast=int)
+GEMINI_REQUESTS_PER_MINUTE = config('GEMINI_REQUESTS_PER_MINUTE', default=60, cast=int)
+GEMINI_TIMEOUT = config('GEMINI_TIMEOUT', default=30, cast=int)
+
+# Cache (shared by web processes and Celery workers)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('REDIS_URL'),
+        'KEY_PREFIX': 'monkmode',
+    }
+}
 
 # Celery Configuration
 CELERY_BROKER_URL = config('REDIS_URL')